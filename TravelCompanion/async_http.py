@@ -0,0 +1,49 @@
+import os
+import asyncio
+import weakref
+
+import httpx
+
+# Responses worth retrying, as for the pooled requests session
+RETRY_STATUSES = frozenset((429, 500, 502, 503, 504))
+RETRY_ATTEMPTS = 3
+RETRY_BACKOFF = 0.3
+
+# Connections kept open per event loop, shared by every outbound call
+ASYNC_HTTP_MAX_CONNECTIONS = int(os.getenv("ASYNC_HTTP_MAX_CONNECTIONS", 100))
+
+_clients = weakref.WeakKeyDictionary()
+
+def get_async_http_client():
+    """Return the async HTTP client of the running event loop.
+
+    An httpx client can't be shared across event loops, so there is one per
+    loop; under an ASGI server that is a single pool for the whole worker.
+    Connect failures are retried by the transport.
+    """
+    loop = asyncio.get_running_loop()
+    client = _clients.get(loop)
+    if client is None or client.is_closed:
+        client = _clients[loop] = httpx.AsyncClient(
+            limits=httpx.Limits(
+                max_connections=ASYNC_HTTP_MAX_CONNECTIONS,
+                max_keepalive_connections=min(20, ASYNC_HTTP_MAX_CONNECTIONS),
+            ),
+            timeout=httpx.Timeout(60.0, connect=5.0),
+            transport=httpx.AsyncHTTPTransport(retries=2),
+        )
+    return client
+
+async def request_with_retries(method, url, **kwargs):
+    """Send a request on the shared client, retrying 429 and 5xx responses.
+
+    Waits with exponential backoff between attempts and returns the last
+    response; raising for its status is left to the caller.
+    """
+    client = get_async_http_client()
+    for attempt in range(RETRY_ATTEMPTS + 1):
+        response = await client.request(method, url, **kwargs)
+        if response.status_code not in RETRY_STATUSES or attempt == RETRY_ATTEMPTS:
+            return response
+        await response.aclose()
+        await asyncio.sleep(RETRY_BACKOFF * 2 ** attempt)
@@ -0,0 +1,171 @@
+"""Benchmark place extraction on large synthetic itineraries.
+
+Compares ``utils.extract_places_from_itinerary`` with the previous
+multi-pass implementation, kept below for reference.
+
+Usage: python -m benchmarks.extract_places [--sizes 10000 100000 1000000]
+"""
+import argparse
+import contextlib
+import io
+import random
+import re
+import time
+
+import utils
+
+def legacy_extract_places(itinerary_text):
+    """Previous implementation: many regex passes and a quadratic dedupe."""
+    places = []
+    
+    # Common words that aren't places
+    non_place_words = ["the", "your", "this", "that", "these", "those", 
+                       "then", "there", "here", "where", "what", "when", 
+                       "breakfast", "lunch", "dinner", "brunch", "day",
+                       "morning", "afternoon", "evening", "night", "noon"]
+    
+    # Look for patterns indicating places
+    patterns = [
+        # Places after action verbs
+        r"(?:Visit|Explore|Check out|Go to|See|Head to|Stop by|Enjoy|Experience) ([\w\s',-&]+?)(?:\.|\,|\s|$)",
+        
+        # Places with ratings
+        r"([\w\s',-&]+?) \([\d\.]+\/[\d\.]+\)",
+        
+        # Landmark pattern
+        r"([\w\s',-&]+? (?:Museum|Temple|Cathedral|Church|Palace|Castle|Park|Garden|Monument|Square|Tower|Bridge|Market|Restaurant|Café|Bistro|Hotel|Resort))",
+        
+        # Places after time
+        r"\d{1,2}(?::\d{2})?\s*(?:AM|PM|am|pm):\s*([\w\s',-&]+?)(?:\.|\,|\s|$)",
+        
+        # Quoted places
+        r'"([\w\s\',-&]+?)"',
+        
+        # Bold places in markdown
+        r'\*\*([\w\s\',-&]+?)\*\*',
+        
+        # Places after "at" or "to" or "in"
+        r"(?:at|to|in) the ([\w\s',-&]+?)(?:\.|\,|\s|$)"
+    ]
+    
+    for pattern in patterns:
+        try:
+            matches = re.finditer(pattern, itinerary_text)
+            for match in matches:
+                place = match.group(1).strip()
+                # Filter out short words and non-place words
+                if len(place) > 3 and not any(word.lower() == place.lower() for word in non_place_words):
+                    # Remove any ending punctuation
+                    place = place.rstrip('.,;:')
+                    places.append(place)
+        except Exception as e:
+            print(f"Error in pattern matching: {e}")
+    
+    # Extract locations that are in quotes or marked in some way
+    quote_patterns = [r'"([^"]+)"', r"'([^']+)'", r"\*\*([^*]+)\*\*", r"\*([^*]+)\*"]
+    for pattern in quote_patterns:
+        try:
+            matches = re.finditer(pattern, itinerary_text)
+            for match in matches:
+                place = match.group(1).strip()
+                if len(place) > 3 and not any(word.lower() == place.lower() for word in non_place_words):
+                    place = place.rstrip('.,;:')
+                    places.append(place)
+        except Exception as e:
+            print(f"Error in quote pattern matching: {e}")
+    
+    # Find locations with ratings pattern
+    ratings_pattern = r'([\w\s\']+)(?:\s*-\s*|\s*\(\s*)(?:\d(?:\.\d)?\s*\/\s*\d|\d(?:\.\d)?\s*stars?|\d(?:\.\d)?★)'
+    try:
+        ratings_matches = re.finditer(ratings_pattern, itinerary_text)
+        for match in ratings_matches:
+            place = match.group(1).strip()
+            if len(place) > 3 and not any(word.lower() == place.lower() for word in non_place_words):
+                place = place.rstrip('.,;:')
+                places.append(place)
+    except Exception as e:
+        print(f"Error in ratings pattern matching: {e}")
+    
+    # Look for locations that might be hotels or restaurants
+    hotel_patterns = [r"([\w\s',\-&]+? (?:Hotel|Resort|Inn|Suites|B&B))", r"Stay at ([\w\s',\-&]+?)(?:\.|\,|\s|$)"]
+    restaurant_patterns = [r"([\w\s',\-&]+? (?:Restaurant|Café|Bistro|Eatery|Diner))", r"Eat at ([\w\s',\-&]+?)(?:\.|\,|\s|$)"]
+    
+    for pattern in hotel_patterns + restaurant_patterns:
+        try:
+            matches = re.finditer(pattern, itinerary_text)
+            for match in matches:
+                place = match.group(1).strip()
+                if len(place) > 3 and not any(word.lower() == place.lower() for word in non_place_words):
+                    place = place.rstrip('.,;:')
+                    places.append(place)
+        except Exception as e:
+            print(f"Error in hotel/restaurant pattern matching: {e}")
+    
+    # Remove duplicates while preserving order
+    unique_places = []
+    for place in places:
+        if place not in unique_places:
+            unique_places.append(place)
+    
+    return unique_places
+
+PLACES = [
+    "Louvre Museum", "Eiffel Tower", "Notre Dame Cathedral", "Jardin du Luxembourg",
+    "Le Jules Verne Restaurant", "Sacre Coeur Basilica", "Musee d'Orsay", "Pont Neuf Bridge",
+    "Place des Vosges Square", "Cafe de Flore", "Marche des Enfants Rouges Market",
+    "Palais Garnier Palace", "Hotel Lutetia", "Sainte Chapelle Church", "Tuileries Garden",
+]
+SLOTS = ["Morning", "Afternoon", "Evening"]
+
+def synthetic_itinerary(size, seed=0):
+    """Build a markdown itinerary of roughly ``size`` characters."""
+    rng = random.Random(seed)
+    lines = []
+    length = 0
+    day = 0
+    while length < size:
+        day += 1
+        lines.append(f"# Day {day}")
+        for slot in SLOTS:
+            place = rng.choice(PLACES)
+            # Unique suffixes keep the number of distinct places growing with the text
+            name = f"{place} {rng.randint(1, size // 50 + 1)}"
+            lines.append(rng.choice([
+                f"- {slot}: Visit the {name} and enjoy the view at **{name}**",
+                f"- {slot}: Dinner at {name} (4.{rng.randint(0, 9)}/5)",
+                f'- {slot}: Explore "{name}" with a local guide',
+            ]))
+        length = sum(len(line) + 1 for line in lines)
+    return "\n".join(lines)
+
+def _time(func, text, repeat):
+    best = float('inf')
+    for _ in range(repeat):
+        # The previous implementation prints an error for each broken pattern
+        with contextlib.redirect_stdout(io.StringIO()):
+            start = time.perf_counter()
+            result = func(text)
+            best = min(best, time.perf_counter() - start)
+    return best, len(result)
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--sizes', type=int, nargs='+', default=[10_000, 100_000, 1_000_000])
+    parser.add_argument('--repeat', type=int, default=3)
+    parser.add_argument('--legacy-max-size', type=int, default=200_000,
+                        help="skip the previous implementation above this size (it is quadratic)")
+    args = parser.parse_args()
+
+    print(f"{'size':>10} {'impl':>8} {'seconds':>10} {'MB/s':>8} {'places':>8}")
+    for size in args.sizes:
+        text = synthetic_itinerary(size)
+        impls = [('current', utils.extract_places_from_itinerary)]
+        if size <= args.legacy_max_size:
+            impls.append(('legacy', legacy_extract_places))
+        for label, func in impls:
+            seconds, count = _time(func, text, args.repeat)
+            throughput = len(text) / seconds / 1e6 if seconds else float('inf')
+            print(f"{len(text):>10} {label:>8} {seconds:>10.4f} {throughput:>8.2f} {count:>8}")
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,333 @@
+"""Local stand-ins for Serper, Nominatim, Gemini and OpenAI.
+
+Each fake sleeps for a configurable latency and fails at a configurable
+rate, so the app can be load-tested without network access or API costs.
+``install_fakes`` swaps them into ``travel_agent`` and ``utils``, for both
+the sync and the async code paths.
+"""
+import json
+import asyncio
+import random
+import re
+import threading
+import time
+from contextlib import contextmanager
+from types import SimpleNamespace
+
+import httpx
+import requests
+
+import travel_agent
+import utils
+
+LANDMARKS = [
+    "Museum", "Cathedral", "Palace", "Gardens", "Tower", "Market", "Bridge",
+    "Square", "Gallery", "Basilica", "Castle", "Park",
+]
+NAMES = [
+    "Royal", "Old Town", "Grand", "Saint Mary", "Central", "Harbour", "National",
+    "Imperial", "Riverside", "Golden", "Liberty", "Victoria",
+]
+SLOTS = ["Morning", "Afternoon", "Evening"]
+
+class FakeError(Exception):
+    """Raised by a fake to simulate an upstream failure."""
+
+class FakeUpstream:
+    """Latency and failure model shared by the fakes.
+
+    ``latency`` is the mean delay in seconds, ``jitter`` its relative
+    standard deviation and ``error_rate`` the probability that a call fails.
+    """
+
+    def __init__(self, latency=0.0, jitter=0.2, error_rate=0.0, seed=None):
+        self.latency = latency
+        self.jitter = jitter
+        self.error_rate = error_rate
+        self.calls = 0
+        self.errors = 0
+        self._rng = random.Random(seed)
+        self._lock = threading.Lock()
+
+    def delay(self):
+        with self._lock:
+            seconds = max(0.0, self._rng.gauss(self.latency, self.latency * self.jitter))
+        return seconds
+
+    def _attempt(self):
+        with self._lock:
+            self.calls += 1
+            fail = self._rng.random() < self.error_rate
+            if fail:
+                self.errors += 1
+        return fail
+
+    def call(self, seconds=None):
+        """Wait like the real service would, then maybe fail."""
+        fail = self._attempt()
+        time.sleep(self.delay() if seconds is None else seconds)
+        if fail:
+            raise FakeError("simulated upstream failure")
+
+    async def acall(self, seconds=None):
+        """Async counterpart of ``call``."""
+        fail = self._attempt()
+        await asyncio.sleep(self.delay() if seconds is None else seconds)
+        if fail:
+            raise FakeError("simulated upstream failure")
+
+def _destination(prompt):
+    match = re.search(r"(?:itinerary for|trip to|in) ([A-Z][\w' -]+?)(?:[.,\n]| for | with |$)", prompt)
+    return match.group(1) if match else "the city"
+
+def fake_itinerary_days(prompt, days=3, seed=None):
+    """Build structured itinerary days for the destination named in ``prompt``."""
+    rng = random.Random(seed if seed is not None else prompt)
+    result = []
+    for day in range(1, days + 1):
+        slots = []
+        for slot in SLOTS:
+            place = f"{rng.choice(NAMES)} {rng.choice(LANDMARKS)}"
+            slots.append({
+                'time_of_day': slot,
+                'activity': f"Visit the {place}",
+                'place_name': place,
+                'rating': round(rng.uniform(3.5, 5.0), 1),
+            })
+        result.append({'day_number': day, 'slots': slots})
+    return result
+
+def fake_itinerary_text(prompt, days=3, seed=None):
+    """Render ``fake_itinerary_days`` as the Markdown the LLM is asked for."""
+    lines = []
+    for day in fake_itinerary_days(prompt, days, seed):
+        lines.append(f"# Day {day['day_number']}")
+        for slot in day['slots']:
+            lines.append(f"- {slot['time_of_day']}: {slot['activity']} at **{slot['place_name']}** ({slot['rating']}/5)")
+    return "\n".join(lines)
+
+def fake_answer_text(prompt):
+    destination = _destination(prompt)
+    return (
+        f"{destination} is best visited in spring or autumn, when the weather is mild "
+        "and the crowds are smaller. Book popular museums ahead and use public transport "
+        "to get around the centre."
+    )
+
+def _fake_reply(prompt):
+    if "itinerary" in prompt.lower():
+        return fake_itinerary_text(prompt)
+    return fake_answer_text(prompt)
+
+def _chunks(text, size=40):
+    return [text[i:i + size] for i in range(0, len(text), size)]
+
+class FakeSerperSession:
+    """Stands in for the ``requests.Session`` used by ``SerperSearch``."""
+
+    def __init__(self, upstream):
+        self.upstream = upstream
+
+    def post(self, url, headers=None, json=None, timeout=None):
+        try:
+            self.upstream.call()
+        except FakeError as e:
+            raise requests.ConnectionError(str(e))
+        return _serper_response((json or {}).get("q", ""))
+
+    async def request(self, method, url, headers=None, json=None, timeout=None, **kwargs):
+        """Stands in for ``async_http.request_with_retries``."""
+        try:
+            await self.upstream.acall()
+        except FakeError as e:
+            raise httpx.ConnectError(str(e))
+        return _serper_response((json or {}).get("q", ""))
+
+def _serper_response(query):
+    organic = [
+        {
+            "title": f"{query} - result {i}",
+            "link": f"https://example.com/{abs(hash(query)) % 10_000}/{i}",
+            "snippet": f"Things to do for {query}: museums, food markets and walks ({i}).",
+        }
+        for i in range(5)
+    ]
+    return SimpleNamespace(raise_for_status=lambda: None, json=lambda: {"organic": organic})
+
+class FakeGeolocator:
+    """Stands in for the geopy Nominatim client."""
+
+    def __init__(self, upstream, miss_rate=0.1):
+        self.upstream = upstream
+        self.miss_rate = miss_rate
+
+    def geocode(self, query, exactly_one=True, timeout=None):
+        self.upstream.call()
+        return self._location(query)
+
+    def _location(self, query):
+        rng = random.Random(query)
+        if rng.random() < self.miss_rate:
+            return None
+        return SimpleNamespace(latitude=rng.uniform(-60, 70), longitude=rng.uniform(-180, 180))
+
+class FakeAsyncGeolocator(FakeGeolocator):
+    """Stands in for ``utils.AsyncNominatim``."""
+
+    async def geocode(self, query, exactly_one=True, timeout=None):
+        await self.upstream.acall()
+        return self._location(query)
+
+class FakeGeminiChat:
+    """Stands in for ``ChatGoogleGenerativeAI`` (invoke, stream, structured output)."""
+
+    upstream = FakeUpstream()
+
+    def __init__(self, **kwargs):
+        self.kwargs = kwargs
+
+    def _usage(self, prompt, text):
+        return {'input_tokens': len(prompt.split()), 'output_tokens': len(text.split())}
+
+    def invoke(self, prompt):
+        self.upstream.call()
+        text = _fake_reply(prompt)
+        return SimpleNamespace(content=text, usage_metadata=self._usage(prompt, text))
+
+    def stream(self, prompt):
+        text = _fake_reply(prompt)
+        chunks = _chunks(text)
+        # The latency is spread over the chunks, the error comes with the first one
+        self.upstream.call(seconds=0)
+        total = self.upstream.delay()
+        for chunk in chunks:
+            time.sleep(total / len(chunks))
+            yield SimpleNamespace(content=chunk, usage_metadata=None)
+        yield SimpleNamespace(content="", usage_metadata=self._usage(prompt, text))
+
+    async def ainvoke(self, prompt):
+        await self.upstream.acall()
+        text = _fake_reply(prompt)
+        return SimpleNamespace(content=text, usage_metadata=self._usage(prompt, text))
+
+    async def astream(self, prompt):
+        text = _fake_reply(prompt)
+        chunks = _chunks(text)
+        await self.upstream.acall(seconds=0)
+        total = self.upstream.delay()
+        for chunk in chunks:
+            await asyncio.sleep(total / len(chunks))
+            yield SimpleNamespace(content=chunk, usage_metadata=None)
+        yield SimpleNamespace(content="", usage_metadata=self._usage(prompt, text))
+
+    def with_structured_output(self, schema):
+        chat = self
+
+        class Structured:
+            def invoke(self, prompt):
+                chat.upstream.call()
+                return {'days': fake_itinerary_days(prompt)}
+
+        return Structured()
+
+class FakeOpenAI:
+    """Stands in for the ``openai.OpenAI`` client's chat completions."""
+
+    upstream = FakeUpstream()
+
+    def __init__(self, api_key=None, **kwargs):
+        self.chat = SimpleNamespace(completions=SimpleNamespace(create=self._create))
+
+    def _create(self, model=None, messages=(), stream=False, response_format=None, **kwargs):
+        prompt = messages[-1]["content"] if messages else ""
+        if response_format:
+            self.upstream.call()
+            text = json.dumps({'days': fake_itinerary_days(prompt)})
+        else:
+            text = _fake_reply(prompt)
+        usage = SimpleNamespace(prompt_tokens=len(prompt.split()), completion_tokens=len(text.split()))
+        if stream:
+            return self._stream(text, usage)
+        if not response_format:
+            self.upstream.call()
+        message = SimpleNamespace(content=text)
+        return SimpleNamespace(choices=[SimpleNamespace(message=message)], usage=usage)
+
+    def _stream(self, text, usage):
+        chunks = _chunks(text)
+        self.upstream.call(seconds=0)
+        total = self.upstream.delay()
+        for chunk in chunks:
+            time.sleep(total / len(chunks))
+            delta = SimpleNamespace(delta=SimpleNamespace(content=chunk))
+            yield SimpleNamespace(choices=[delta], usage=None)
+        yield SimpleNamespace(choices=[], usage=usage)
+
+class FakeAsyncOpenAI:
+    """Stands in for the ``openai.AsyncOpenAI`` client's chat completions."""
+
+    upstream = FakeUpstream()
+
+    def __init__(self, api_key=None, **kwargs):
+        self.chat = SimpleNamespace(completions=SimpleNamespace(create=self._create))
+
+    async def _create(self, model=None, messages=(), stream=False, **kwargs):
+        prompt = messages[-1]["content"] if messages else ""
+        text = _fake_reply(prompt)
+        usage = SimpleNamespace(prompt_tokens=len(prompt.split()), completion_tokens=len(text.split()))
+        if stream:
+            await self.upstream.acall(seconds=0)
+            return self._stream(text, usage)
+        await self.upstream.acall()
+        message = SimpleNamespace(content=text)
+        return SimpleNamespace(choices=[SimpleNamespace(message=message)], usage=usage)
+
+    async def _stream(self, text, usage):
+        chunks = _chunks(text)
+        total = self.upstream.delay()
+        for chunk in chunks:
+            await asyncio.sleep(total / len(chunks))
+            delta = SimpleNamespace(delta=SimpleNamespace(content=chunk))
+            yield SimpleNamespace(choices=[delta], usage=None)
+        yield SimpleNamespace(choices=[], usage=usage)
+
+@contextmanager
+def install_fakes(serper=None, geocoder=None, llm=None, geocode_miss_rate=0.1):
+    """Route Serper, Nominatim and LLM calls to the fakes for the enclosed block.
+
+    Each argument is a FakeUpstream; None means no latency and no errors.
+    Travel agents built before are dropped so new ones pick up the fakes.
+    """
+    serper = serper or FakeUpstream()
+    geocoder = geocoder or FakeUpstream()
+    llm = llm or FakeUpstream()
+
+    saved = (
+        travel_agent._http_session, travel_agent.request_with_retries, travel_agent.ChatGoogleGenerativeAI,
+        getattr(travel_agent, 'OpenAI', None), getattr(travel_agent, 'AsyncOpenAI', None),
+        travel_agent.OPENAI_AVAILABLE, utils._geolocator, utils._async_geolocator,
+        FakeGeminiChat.upstream, FakeOpenAI.upstream, FakeAsyncOpenAI.upstream,
+    )
+    serper_session = FakeSerperSession(serper)
+    travel_agent._http_session = serper_session
+    travel_agent.request_with_retries = serper_session.request
+    travel_agent.ChatGoogleGenerativeAI = FakeGeminiChat
+    travel_agent.OpenAI = FakeOpenAI
+    travel_agent.AsyncOpenAI = FakeAsyncOpenAI
+    travel_agent.OPENAI_AVAILABLE = True
+    utils._geolocator = FakeGeolocator(geocoder, miss_rate=geocode_miss_rate)
+    utils._async_geolocator = FakeAsyncGeolocator(geocoder, miss_rate=geocode_miss_rate)
+    FakeGeminiChat.upstream = llm
+    FakeOpenAI.upstream = llm
+    FakeAsyncOpenAI.upstream = llm
+    travel_agent.clear_travel_agents()
+    try:
+        yield SimpleNamespace(serper=serper, geocoder=geocoder, llm=llm)
+    finally:
+        (
+            travel_agent._http_session, travel_agent.request_with_retries, travel_agent.ChatGoogleGenerativeAI,
+            travel_agent.OpenAI, travel_agent.AsyncOpenAI,
+            travel_agent.OPENAI_AVAILABLE, utils._geolocator, utils._async_geolocator,
+            FakeGeminiChat.upstream, FakeOpenAI.upstream, FakeAsyncOpenAI.upstream,
+        ) = saved
+        travel_agent.clear_travel_agents()
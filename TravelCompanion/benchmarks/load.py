@@ -0,0 +1,227 @@
+"""Load-test the main endpoints offline, against local fakes of every upstream.
+
+Serper, Nominatim, Gemini and OpenAI are replaced by the fakes in
+``benchmarks.fakes`` with configurable latency and error rates, and the app
+runs on a throwaway SQLite database. Each scenario is driven at the given
+concurrency and reports latency percentiles, throughput and the number of
+SQL queries per request. With ``--asgi`` the requests go through the ASGI
+handler and the async views instead, as concurrent coroutines.
+
+Usage: python -m benchmarks.load [--requests 200] [--concurrency 8] [--llm-latency 1.0] [--asgi]
+"""
+import argparse
+import asyncio
+import os
+import statistics
+import sys
+import tempfile
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+SCENARIOS = ['generate_itinerary', 'chat_message', 'get_itineraries', 'get_map_data']
+
+DESTINATIONS = [
+    "Paris", "London", "Tokyo", "Rome", "Barcelona", "Vienna", "Amsterdam",
+    "Prague", "Singapore", "Sydney", "Istanbul", "Bangkok", "Seoul", "Lisbon",
+]
+
+def percentile(values, p):
+    """Return the ``p``-th percentile (0-100) of ``values`` by linear interpolation."""
+    if not values:
+        return float('nan')
+    ordered = sorted(values)
+    k = (len(ordered) - 1) * p / 100
+    lower = int(k)
+    upper = min(lower + 1, len(ordered) - 1)
+    return ordered[lower] + (ordered[upper] - ordered[lower]) * (k - lower)
+
+def setup_django(workdir, db_profile, asgi=False):
+    """Configure Django on a fresh database in ``workdir`` and migrate it."""
+    os.environ.setdefault('DJANGO_SETTINGS_MODULE', 'travel_planner.settings')
+    os.environ['DATABASE_PROFILE'] = db_profile
+    os.environ['ASYNC_VIEWS'] = 'true' if asgi else 'false'
+    os.environ['TRAVEL_CACHE_DB'] = os.path.join(workdir, 'cache.sqlite3')
+    # The fakes stand in for the upstreams, so don't throttle calls to them
+    for name in ('NOMINATIM', 'SERPER', 'GEMINI', 'OPENAI'):
+        os.environ.setdefault(f'RATE_LIMIT_{name}', '10000,10000')
+
+    from django.conf import settings
+    settings.DATABASES['default']['NAME'] = os.path.join(workdir, 'db.sqlite3')
+    import django
+    django.setup()
+
+    from django.core.management import call_command
+    call_command('migrate', verbosity=0)
+
+    from travel_app.models import ApiKey
+    ApiKey.objects.update_or_create(name='serper', defaults={'key': 'fake-serper-key'})
+    ApiKey.objects.update_or_create(name='google', defaults={'key': 'fake-google-key'})
+
+class Scenario:
+    """Builds the request for one call of an endpoint."""
+
+    def __init__(self, name, itinerary_ids):
+        self.name = name
+        self.itinerary_ids = itinerary_ids
+
+    def request(self, client, i):
+        destination = DESTINATIONS[i % len(DESTINATIONS)]
+        if self.name == 'generate_itinerary':
+            return client.post(
+                '/api/generate-itinerary/',
+                {'query': f"Plan a {2 + i % 4} day trip to {destination}"},
+                content_type='application/json'
+            )
+        if self.name == 'chat_message':
+            return client.post(
+                '/api/chat/',
+                {'message': f"What is the best time to visit {destination}? ({i})"},
+                content_type='application/json'
+            )
+        if self.name == 'get_itineraries':
+            return client.get('/api/get-itineraries/')
+        if self.name == 'get_map_data':
+            itinerary_id = self.itinerary_ids[i % len(self.itinerary_ids)] if self.itinerary_ids else None
+            return client.get(f'/api/map-data/{itinerary_id}/' if itinerary_id else '/api/map-data/')
+        raise ValueError(f"Unknown scenario: {self.name}")
+
+def run_scenario(scenario, total, concurrency):
+    """Issue ``total`` requests from ``concurrency`` threads; return per-request samples."""
+    from django.db import close_old_connections, connection
+    from django.test import Client
+    from django.test.utils import CaptureQueriesContext
+
+    local = threading.local()
+    samples = []
+    samples_lock = threading.Lock()
+
+    def one(i):
+        client = getattr(local, 'client', None)
+        if client is None:
+            client = local.client = Client()
+        with CaptureQueriesContext(connection) as queries:
+            start = time.perf_counter()
+            response = scenario.request(client, i)
+            if getattr(response, 'streaming', False):
+                b''.join(response.streaming_content)
+            elapsed = time.perf_counter() - start
+        with samples_lock:
+            samples.append((elapsed, response.status_code, len(queries.captured_queries)))
+
+    def worker(indices):
+        try:
+            for i in indices:
+                one(i)
+        finally:
+            close_old_connections()
+
+    started = time.perf_counter()
+    with ThreadPoolExecutor(max_workers=concurrency) as pool:
+        list(pool.map(worker, [range(t, total, concurrency) for t in range(concurrency)]))
+    return samples, time.perf_counter() - started
+
+def run_scenario_async(scenario, total, concurrency):
+    """Like ``run_scenario``, through the ASGI handler with ``concurrency`` coroutines.
+
+    Queries run on Django's sync thread and can't be attributed to a
+    request, so none are counted.
+    """
+    from django.test import AsyncClient
+
+    async def run():
+        client = AsyncClient()
+        semaphore = asyncio.Semaphore(concurrency)
+        samples = []
+
+        async def one(i):
+            async with semaphore:
+                start = time.perf_counter()
+                response = await scenario.request(client, i)
+                if getattr(response, 'streaming', False):
+                    if hasattr(response.streaming_content, '__aiter__'):
+                        async for _ in response.streaming_content:
+                            pass
+                    else:
+                        b''.join(response.streaming_content)
+                samples.append((time.perf_counter() - start, response.status_code, None))
+
+        await asyncio.gather(*(one(i) for i in range(total)))
+        return samples
+
+    started = time.perf_counter()
+    samples = asyncio.run(run())
+    return samples, time.perf_counter() - started
+
+def wait_for_jobs(timeout):
+    """Wait for queued itinerary jobs; return the duration of every finished one."""
+    from travel_app.models import ItineraryJob
+    deadline = time.time() + timeout
+    while ItineraryJob.objects.filter(status__in=['pending', 'running']).exists() and time.time() < deadline:
+        time.sleep(0.1)
+    jobs = ItineraryJob.objects.filter(status__in=['completed', 'failed'])
+    return [
+        ((job.updated_at - job.created_at).total_seconds(), job.status)
+        for job in jobs
+    ]
+
+def print_row(label, latencies, errors, seconds, queries=None):
+    count = len(latencies)
+    ms = [value * 1000 for value in latencies]
+    throughput = count / seconds if seconds else float('nan')
+    queries = [q for q in queries or () if q is not None]
+    avg_queries = f"{statistics.mean(queries):>8.1f}" if queries else f"{'-':>8}"
+    print(
+        f"{label:<22} {count:>6} {errors:>6} {percentile(ms, 50):>9.1f} {percentile(ms, 95):>9.1f} "
+        f"{percentile(ms, 99):>9.1f} {throughput:>9.1f} {avg_queries}"
+    )
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--scenarios', nargs='+', choices=SCENARIOS, default=SCENARIOS)
+    parser.add_argument('--requests', type=int, default=100, help="requests per scenario")
+    parser.add_argument('--concurrency', type=int, default=8)
+    parser.add_argument('--serper-latency', type=float, default=0.3)
+    parser.add_argument('--geocode-latency', type=float, default=0.2)
+    parser.add_argument('--llm-latency', type=float, default=1.0)
+    parser.add_argument('--error-rate', type=float, default=0.0, help="failure probability of every fake")
+    parser.add_argument('--db-profile', choices=['default', 'production'], default='production')
+    parser.add_argument('--job-timeout', type=float, default=120.0,
+                        help="seconds to wait for background itinerary jobs")
+    parser.add_argument('--asgi', action='store_true', help="serve the requests with the async views")
+    args = parser.parse_args()
+
+    workdir = tempfile.mkdtemp(prefix='travel-bench-')
+    setup_django(workdir, args.db_profile, asgi=args.asgi)
+    run = run_scenario_async if args.asgi else run_scenario
+
+    from benchmarks.fakes import FakeUpstream, install_fakes
+    from travel_app.models import Itinerary
+
+    upstreams = {
+        'serper': FakeUpstream(args.serper_latency, error_rate=args.error_rate, seed=1),
+        'geocoder': FakeUpstream(args.geocode_latency, error_rate=args.error_rate, seed=2),
+        'llm': FakeUpstream(args.llm_latency, error_rate=args.error_rate, seed=3),
+    }
+    print(f"database: {workdir} ({args.db_profile} profile), concurrency {args.concurrency}, {'ASGI' if args.asgi else 'WSGI'}")
+    print(f"{'scenario':<22} {'count':>6} {'errors':>6} {'p50 ms':>9} {'p95 ms':>9} {'p99 ms':>9} {'req/s':>9} {'queries':>8}")
+
+    with install_fakes(**upstreams):
+        for name in args.scenarios:
+            itinerary_ids = list(Itinerary.objects.values_list('id', flat=True)[:50])
+            samples, seconds = run(Scenario(name, itinerary_ids), args.requests, args.concurrency)
+            errors = sum(1 for _, status, _ in samples if status >= 400)
+            print_row(name, [s[0] for s in samples], errors, seconds, [s[2] for s in samples])
+
+            if name == 'generate_itinerary':
+                # The endpoint only queues jobs: also report how long they took to finish
+                started = time.perf_counter()
+                jobs = wait_for_jobs(args.job_timeout)
+                failed = sum(1 for _, status in jobs if status == 'failed')
+                print_row('  itinerary jobs', [d for d, _ in jobs], failed, time.perf_counter() - started + seconds)
+
+    calls = ', '.join(f"{name} {u.calls} calls / {u.errors} errors" for name, u in upstreams.items())
+    print(f"upstreams: {calls}")
+
+if __name__ == '__main__':
+    sys.exit(main())
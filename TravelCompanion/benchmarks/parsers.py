@@ -0,0 +1,57 @@
+"""Micro-benchmarks for the ``utils`` parsers run on every request.
+
+Reports the best time per call over several runs, so a regression in one
+of the parsers shows up before it reaches a deploy.
+
+Usage: python -m benchmarks.parsers [--number 200] [--repeat 5] [--size 5000]
+"""
+import argparse
+import timeit
+
+import utils
+from caching import normalize_key
+
+from benchmarks.extract_places import synthetic_itinerary
+from benchmarks.fakes import fake_itinerary_days
+
+QUERIES = [
+    "Plan a 5 day trip to Paris next weekend, we love museums and food",
+    "I want to visit Tokyo from March 3 to March 10 with my kids",
+    "Romantic getaway in the Amalfi Coast for our anniversary in June",
+    "Budget backpacking itinerary for Vietnam, adventurous and outdoorsy",
+]
+
+def cases(size):
+    text = synthetic_itinerary(size)
+    structured = {'days': fake_itinerary_days("itinerary for Rome", days=5, seed=0)}
+    days = utils.parse_structured_itinerary(structured)
+    return [
+        ('extract_destination', lambda: [utils.extract_destination(q) for q in QUERIES], len(QUERIES)),
+        ('parse_natural_date', lambda: [utils.parse_natural_date(q) for q in QUERIES], len(QUERIES)),
+        ('detect_personality_prefs', lambda: [utils.detect_personality_prefs(q) for q in QUERIES], len(QUERIES)),
+        ('normalize_key', lambda: [normalize_key(q) for q in QUERIES], len(QUERIES)),
+        ('parse_itinerary_to_days', lambda: utils.parse_itinerary_to_days(text), 1),
+        ('extract_place_spans', lambda: utils.extract_place_spans(text), 1),
+        ('extract_places_by_day', lambda: utils.extract_places_by_day(text), 1),
+        ('parse_structured_itinerary', lambda: utils.parse_structured_itinerary(structured), 1),
+        ('render_itinerary_day', lambda: [utils.render_itinerary_day(day) for day in days], len(days)),
+    ]
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--number', type=int, default=200, help="calls per run")
+    parser.add_argument('--repeat', type=int, default=5, help="runs; the best one is reported")
+    parser.add_argument('--size', type=int, default=5000, help="characters of the synthetic itinerary")
+    parser.add_argument('--only', nargs='+', help="benchmark names to run")
+    args = parser.parse_args()
+
+    print(f"{'benchmark':<28} {'us/op':>10} {'ops/s':>12}")
+    for name, func, ops in cases(args.size):
+        if args.only and name not in args.only:
+            continue
+        best = min(timeit.repeat(func, number=args.number, repeat=args.repeat))
+        per_op = best / (args.number * ops)
+        print(f"{name:<28} {per_op * 1e6:>10.2f} {1 / per_op:>12.0f}")
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,291 @@
+import os
+import re
+import json
+import time
+import asyncio
+import sqlite3
+import threading
+import weakref
+from collections import OrderedDict
+
+# Location of the on-disk cache shared by every worker process
+CACHE_DB_PATH = os.getenv(
+    "TRAVEL_CACHE_DB",
+    os.path.join(os.path.dirname(os.path.abspath(__file__)), "cache.sqlite3")
+)
+
+# Sentinel returned on a cache miss, so that a cached ``None`` (negative entry)
+# can be told apart from "nothing cached"
+MISSING = object()
+
+def normalize_key(text):
+    """Normalize a lookup key so trivial spelling variations share an entry.
+
+    Lower-cases the text, collapses whitespace and normalizes the spacing
+    around commas, e.g. ``"  Eiffel Tower ,Paris "`` -> ``"eiffel tower, paris"``.
+    """
+    text = re.sub(r'\s+', ' ', str(text)).strip().lower()
+    text = re.sub(r'\s*,\s*', ', ', text)
+    return text.strip(', ')
+
+class LRUCache:
+    """Thread-safe in-process LRU cache with a per-entry expiry time."""
+
+    def __init__(self, maxsize=1024):
+        self.maxsize = maxsize
+        self._data = OrderedDict()
+        self._lock = threading.Lock()
+
+    def get(self, key):
+        """Return the cached value for ``key`` or ``MISSING``."""
+        with self._lock:
+            entry = self._data.get(key)
+            if entry is None:
+                return MISSING
+            value, expires_at = entry
+            if expires_at is not None and expires_at <= time.time():
+                del self._data[key]
+                return MISSING
+            self._data.move_to_end(key)
+            return value
+
+    def set(self, key, value, ttl=None):
+        """Store ``value`` for ``ttl`` seconds (forever if ``ttl`` is None)."""
+        expires_at = time.time() + ttl if ttl is not None else None
+        with self._lock:
+            self._data[key] = (value, expires_at)
+            self._data.move_to_end(key)
+            while len(self._data) > self.maxsize:
+                self._data.popitem(last=False)
+
+    def delete(self, key):
+        with self._lock:
+            self._data.pop(key, None)
+
+    def clear(self):
+        with self._lock:
+            self._data.clear()
+
+    def __len__(self):
+        return len(self._data)
+
+class PersistentCache:
+    """JSON key/value store kept in a SQLite table with per-entry expiry.
+
+    Every thread gets its own connection; the database file is shared by all
+    worker processes so a value resolved by one worker is reused by the others.
+    When ``max_entries`` is set, the least recently used rows are evicted once
+    the table grows past it.
+    """
+
+    # Number of writes between two checks of the table size
+    EVICT_EVERY = 32
+
+    def __init__(self, table, path=None, max_entries=None):
+        if not re.match(r'^[A-Za-z_][A-Za-z0-9_]*$', table):
+            raise ValueError(f"Invalid cache table name: {table!r}")
+        self.table = table
+        self.path = path or CACHE_DB_PATH
+        self.max_entries = max_entries
+        self._local = threading.local()
+        self._writes = 0
+
+    def _connection(self):
+        conn = getattr(self._local, 'conn', None)
+        if conn is None:
+            conn = sqlite3.connect(self.path, timeout=30, isolation_level=None)
+            # Readers don't block the writer, and vice versa, across processes
+            conn.execute("PRAGMA journal_mode=WAL")
+            conn.execute(
+                f"CREATE TABLE IF NOT EXISTS {self.table} ("
+                "key TEXT PRIMARY KEY, value TEXT NOT NULL, "
+                "expires_at REAL, accessed_at REAL NOT NULL)"
+            )
+            conn.execute(
+                f"CREATE INDEX IF NOT EXISTS {self.table}_accessed_at ON {self.table} (accessed_at)"
+            )
+            self._local.conn = conn
+        return conn
+
+    def get(self, key):
+        """Return ``(value, expires_at)`` for ``key`` or ``MISSING``."""
+        try:
+            conn = self._connection()
+            row = conn.execute(
+                f"SELECT value, expires_at FROM {self.table} WHERE key = ?", (key,)
+            ).fetchone()
+            if row is None:
+                return MISSING
+            value, expires_at = row
+            now = time.time()
+            if expires_at is not None and expires_at <= now:
+                conn.execute(f"DELETE FROM {self.table} WHERE key = ?", (key,))
+                return MISSING
+            conn.execute(
+                f"UPDATE {self.table} SET accessed_at = ? WHERE key = ?", (now, key)
+            )
+            return json.loads(value), expires_at
+        except sqlite3.Error as e:
+            print(f"Cache read error ({self.table}): {e}")
+            return MISSING
+
+    def set(self, key, value, ttl=None):
+        """Store ``value`` for ``ttl`` seconds (forever if ``ttl`` is None)."""
+        now = time.time()
+        expires_at = now + ttl if ttl is not None else None
+        try:
+            self._connection().execute(
+                f"INSERT OR REPLACE INTO {self.table} (key, value, expires_at, accessed_at) "
+                "VALUES (?, ?, ?, ?)",
+                (key, json.dumps(value), expires_at, now)
+            )
+            self._writes += 1
+            if self.max_entries and self._writes % self.EVICT_EVERY == 0:
+                self.evict()
+        except sqlite3.Error as e:
+            print(f"Cache write error ({self.table}): {e}")
+
+    def evict(self):
+        """Drop expired rows, then the least recently used ones over ``max_entries``."""
+        self.purge_expired()
+        if not self.max_entries:
+            return
+        try:
+            conn = self._connection()
+            (count,) = conn.execute(f"SELECT COUNT(*) FROM {self.table}").fetchone()
+            if count > self.max_entries:
+                conn.execute(
+                    f"DELETE FROM {self.table} WHERE key IN ("
+                    f"SELECT key FROM {self.table} ORDER BY accessed_at ASC LIMIT ?)",
+                    (count - self.max_entries,)
+                )
+        except sqlite3.Error as e:
+            print(f"Cache eviction error ({self.table}): {e}")
+
+    def delete(self, key):
+        try:
+            self._connection().execute(f"DELETE FROM {self.table} WHERE key = ?", (key,))
+        except sqlite3.Error as e:
+            print(f"Cache delete error ({self.table}): {e}")
+
+    def purge_expired(self):
+        """Delete every expired entry and return how many were removed."""
+        try:
+            cursor = self._connection().execute(
+                f"DELETE FROM {self.table} WHERE expires_at IS NOT NULL AND expires_at <= ?",
+                (time.time(),)
+            )
+            return cursor.rowcount
+        except sqlite3.Error as e:
+            print(f"Cache purge error ({self.table}): {e}")
+            return 0
+
+# Every TieredCache of the process, so their statistics can be exported
+_tiered_caches = weakref.WeakSet()
+
+def all_caches():
+    """Return the live TieredCache instances of this process."""
+    return list(_tiered_caches)
+
+class TieredCache:
+    """An in-process LRU layer in front of a persistent SQLite table.
+
+    Lookups are answered from memory when possible and fall back to the
+    on-disk table, warming the LRU with the remaining lifetime of the entry.
+    Hits and misses are counted for monitoring.
+    """
+
+    def __init__(self, table, maxsize=1024, path=None, max_entries=None):
+        self.name = table
+        self.memory = LRUCache(maxsize=maxsize)
+        self.store = PersistentCache(table, path=path, max_entries=max_entries)
+        self.hits = 0
+        self.misses = 0
+        self._stats_lock = threading.Lock()
+        _tiered_caches.add(self)
+
+    def _count(self, hit):
+        with self._stats_lock:
+            if hit:
+                self.hits += 1
+            else:
+                self.misses += 1
+
+    def get(self, key):
+        value = self.memory.get(key)
+        if value is not MISSING:
+            self._count(True)
+            return value
+        return self._get_stored(key)
+
+    async def aget(self, key):
+        """Async counterpart of ``get``.
+
+        The in-memory layer is checked on the event loop; the SQLite table,
+        whose reads also write and may wait on other processes' locks, is
+        read on a worker thread.
+        """
+        value = self.memory.get(key)
+        if value is not MISSING:
+            self._count(True)
+            return value
+        return await asyncio.to_thread(self._get_stored, key)
+
+    def _get_stored(self, key):
+        entry = self.store.get(key)
+        if entry is MISSING:
+            self._count(False)
+            return MISSING
+        self._count(True)
+        value, expires_at = entry
+        ttl = expires_at - time.time() if expires_at is not None else None
+        self.memory.set(key, value, ttl)
+        return value
+
+    def set(self, key, value, ttl=None):
+        self.memory.set(key, value, ttl)
+        self.store.set(key, value, ttl)
+
+    async def aset(self, key, value, ttl=None):
+        """Async counterpart of ``set``, writing to SQLite on a worker thread."""
+        self.memory.set(key, value, ttl)
+        await asyncio.to_thread(self.store.set, key, value, ttl)
+
+    def delete(self, key):
+        self.memory.delete(key)
+        self.store.delete(key)
+
+    def stats(self):
+        """Return hit/miss counters and the size of the in-memory layer."""
+        return {'hits': self.hits, 'misses': self.misses, 'memory_size': len(self.memory)}
+
+class VersionStamp:
+    """A version marker shared by every worker process through a small file.
+
+    ``bump()`` atomically replaces the file, and ``current()`` only needs a
+    ``stat`` call to notice it, which makes it cheap enough to check on every
+    request before trusting a process-local cache.
+    """
+
+    def __init__(self, name, directory=None):
+        if not re.match(r'^[A-Za-z0-9_.-]+$', name):
+            raise ValueError(f"Invalid version stamp name: {name!r}")
+        directory = directory or os.path.dirname(os.path.abspath(CACHE_DB_PATH))
+        self.path = os.path.join(directory, f".{name}.version")
+
+    def current(self):
+        """Return a value that changes whenever the stamp is bumped."""
+        try:
+            st = os.stat(self.path)
+        except FileNotFoundError:
+            return None
+        return (st.st_ino, st.st_mtime_ns, st.st_size)
+
+    def bump(self):
+        tmp_path = f"{self.path}.{os.getpid()}.{threading.get_ident()}"
+        try:
+            with open(tmp_path, 'w') as f:
+                f.write(f"{time.time()!r}\n")
+            os.replace(tmp_path, self.path)
+        except OSError as e:
+            print(f"Version stamp error ({self.path}): {e}")
@@ -0,0 +1,225 @@
+import io
+import os
+import math
+import bisect
+import heapq
+import zipfile
+import threading
+import unicodedata
+from array import array
+
+# GeoNames dump (e.g. cities15000.txt or allCountries.zip) used for offline geocoding
+GAZETTEER_PATH = os.getenv("GAZETTEER_PATH")
+# Also index the alternate names column (larger index, more spellings found)
+GAZETTEER_ALTERNATE_NAMES = os.getenv("GAZETTEER_ALTERNATE_NAMES", "false").lower() in ("1", "true", "yes")
+# Places further than this from the destination are not accepted for it
+GAZETTEER_SCOPE_KM = float(os.getenv("GAZETTEER_SCOPE_KM", 50))
+
+# Column positions in the GeoNames "geoname" table
+_NAME, _ASCIINAME, _ALTERNATENAMES, _LATITUDE, _LONGITUDE, _COUNTRY, _POPULATION = 1, 2, 3, 4, 5, 8, 14
+
+# Shortest query completed by prefix, and how many keys a prefix may scan
+PREFIX_MIN_LENGTH = 4
+PREFIX_SCAN_LIMIT = 256
+# Minimum Dice similarity of trigrams for a fuzzy match
+FUZZY_THRESHOLD = 0.6
+FUZZY_CANDIDATES = 32
+
+def fold_name(text):
+    """Fold a place name for indexing: no accents, punctuation or extra spaces."""
+    text = unicodedata.normalize('NFKD', str(text))
+    text = ''.join(c if c.isalnum() else ' ' for c in text if not unicodedata.combining(c))
+    return ' '.join(text.lower().split())
+
+def _trigrams(key):
+    padded = f"  {key} "
+    return {padded[i:i + 3] for i in range(len(padded) - 2)}
+
+def name_similarity(a, b):
+    """Dice coefficient of the trigrams of two folded names, from 0.0 to 1.0."""
+    grams_a, grams_b = _trigrams(a), _trigrams(b)
+    return 2.0 * len(grams_a & grams_b) / (len(grams_a) + len(grams_b))
+
+def haversine_km(lat1, lon1, lat2, lon2):
+    lat1, lon1, lat2, lon2 = map(math.radians, (lat1, lon1, lat2, lon2))
+    a = math.sin((lat2 - lat1) / 2) ** 2 + math.cos(lat1) * math.cos(lat2) * math.sin((lon2 - lon1) / 2) ** 2
+    return 6371.0 * 2 * math.asin(math.sqrt(min(1.0, a)))
+
+class Gazetteer:
+    """In-memory place name index answering lookups without any network call.
+
+    Records are stored column-wise in typed arrays. Folded names are kept in
+    one sorted list pointing at their record, so exact and prefix lookups are
+    a binary search. A trigram index over the same names, built on first use,
+    serves fuzzy lookups for misspelled names.
+    """
+
+    def __init__(self, rows):
+        """Build the index from ``(names, latitude, longitude, country, population)`` rows."""
+        self.latitudes = array('d')
+        self.longitudes = array('d')
+        self.populations = array('q')
+        self.countries = []
+        entries = []
+        for names, latitude, longitude, country, population in rows:
+            record = len(self.latitudes)
+            self.latitudes.append(latitude)
+            self.longitudes.append(longitude)
+            self.populations.append(population)
+            self.countries.append(country)
+            for key in {fold_name(name) for name in names if name}:
+                if key:
+                    entries.append((key, record))
+        entries.sort()
+        self.keys = [key for key, _ in entries]
+        self.key_records = array('I', (record for _, record in entries))
+        self._trigram_index = None
+        self._trigram_lock = threading.Lock()
+
+    @classmethod
+    def from_geonames(cls, path, alternate_names=False):
+        """Load a GeoNames TSV dump, plain or zipped."""
+        def rows(lines):
+            for line in lines:
+                fields = line.rstrip('\n').split('\t')
+                if len(fields) <= _POPULATION:
+                    continue
+                names = [fields[_NAME], fields[_ASCIINAME]]
+                if alternate_names and fields[_ALTERNATENAMES]:
+                    names.extend(fields[_ALTERNATENAMES].split(','))
+                try:
+                    yield (
+                        names, float(fields[_LATITUDE]), float(fields[_LONGITUDE]),
+                        fields[_COUNTRY], int(fields[_POPULATION] or 0)
+                    )
+                except ValueError:
+                    continue
+
+        if zipfile.is_zipfile(path):
+            with zipfile.ZipFile(path) as archive:
+                # GeoNames archives hold the dump next to a small readme
+                member = max(archive.infolist(), key=lambda info: info.file_size)
+                with io.TextIOWrapper(archive.open(member), encoding='utf-8') as f:
+                    return cls(rows(f))
+        with open(path, encoding='utf-8') as f:
+            return cls(rows(f))
+
+    def __len__(self):
+        return len(self.latitudes)
+
+    def _by_population(self, records):
+        return sorted(records, key=lambda r: self.populations[r], reverse=True)
+
+    def _exact(self, key):
+        start = bisect.bisect_left(self.keys, key)
+        end = bisect.bisect_right(self.keys, key, start)
+        return self._by_population(self.key_records[i] for i in range(start, end))
+
+    def _prefix(self, key):
+        if len(key) < PREFIX_MIN_LENGTH:
+            return []
+        start = bisect.bisect_left(self.keys, key)
+        end = min(bisect.bisect_left(self.keys, key + '\uffff', start), start + PREFIX_SCAN_LIMIT)
+        # Only complete whole words: "louvre" matches "louvre museum", not "louvres"
+        return self._by_population(
+            self.key_records[i] for i in range(start, end)
+            if len(self.keys[i]) == len(key) or self.keys[i][len(key)] == ' '
+        )
+
+    def _get_trigram_index(self):
+        with self._trigram_lock:
+            if self._trigram_index is None:
+                postings = {}
+                for i, key in enumerate(self.keys):
+                    for gram in _trigrams(key):
+                        postings.setdefault(gram, array('I')).append(i)
+                self._trigram_index = postings
+            return self._trigram_index
+
+    def _fuzzy(self, key, country=None):
+        postings = self._get_trigram_index()
+        grams = _trigrams(key)
+        # A name reaching FUZZY_THRESHOLD shares at least ``min_shared`` trigrams
+        # with the query, so it must contain one of the rarest
+        # ``len(grams) - min_shared + 1`` of them: only those postings are read.
+        min_shared = math.ceil(FUZZY_THRESHOLD * len(grams) / (2 - FUZZY_THRESHOLD))
+        rarest = sorted(grams, key=lambda gram: len(postings.get(gram, ())))
+        candidates = set()
+        for gram in rarest[:len(grams) - min_shared + 1]:
+            candidates.update(postings.get(gram, ()))
+
+        scored = []
+        for i in candidates:
+            if country is not None and self.countries[self.key_records[i]] != country:
+                continue
+            key_grams = _trigrams(self.keys[i])
+            similarity = 2.0 * len(grams & key_grams) / (len(grams) + len(key_grams))
+            if similarity >= FUZZY_THRESHOLD:
+                scored.append((similarity, self.populations[self.key_records[i]], i))
+        return [self.key_records[i] for _, _, i in heapq.nlargest(FUZZY_CANDIDATES, scored)]
+
+    def _best(self, records, scope):
+        """Return the first of ``records`` that fits the scope, or None."""
+        if scope is None:
+            return records[0] if records else None
+        latitude, longitude, country = scope
+        for r in records:
+            if (self.countries[r] == country
+                    and haversine_km(latitude, longitude, self.latitudes[r], self.longitudes[r]) <= GAZETTEER_SCOPE_KM):
+                return r
+        return None
+
+    def _find(self, name, scope=None, fuzzy=True, prefix=True):
+        key = fold_name(name)
+        if not key:
+            return None
+        record = self._best(self._exact(key), scope)
+        if record is None and prefix:
+            record = self._best(self._prefix(key), scope)
+        if record is None and fuzzy:
+            # Names in other countries can't fit the scope, so skip scoring them
+            record = self._best(self._fuzzy(key, scope[2] if scope else None), scope)
+        return record
+
+    def resolve_scope(self, context):
+        """Return the ``(latitude, longitude, country)`` of a destination, or None.
+
+        Only the part before the first comma is looked up, e.g. "Paris" for
+        "Paris, France", and the most populated match wins.
+        """
+        if not context:
+            return None
+        record = self._find(context.split(',')[0], fuzzy=False)
+        if record is None:
+            return None
+        return self.latitudes[record], self.longitudes[record], self.countries[record]
+
+    def lookup(self, name, scope=None, fuzzy=True, prefix=True):
+        """Find a place by exact, then whole-word prefix, then fuzzy name.
+
+        With a ``scope`` from ``resolve_scope`` only places in the same
+        country and within GAZETTEER_SCOPE_KM of the destination are returned.
+        ``fuzzy=False, prefix=False`` accepts exact names only.
+        Returns ``(latitude, longitude)`` or None.
+        """
+        record = self._find(name, scope, fuzzy, prefix)
+        if record is None:
+            return None
+        return self.latitudes[record], self.longitudes[record]
+
+_gazetteer = None
+_gazetteer_lock = threading.Lock()
+
+def get_gazetteer():
+    """Return the gazetteer loaded from GAZETTEER_PATH, or None if not configured."""
+    global _gazetteer
+    if not GAZETTEER_PATH:
+        return None
+    with _gazetteer_lock:
+        if _gazetteer is None:
+            try:
+                _gazetteer = Gazetteer.from_geonames(GAZETTEER_PATH, GAZETTEER_ALTERNATE_NAMES)
+            except (OSError, ValueError, zipfile.BadZipFile) as e:
+                print(f"Warning: Could not load gazetteer from '{GAZETTEER_PATH}': {e}")
+                _gazetteer = False
+        return _gazetteer or None
@@ -0,0 +1,211 @@
+import time
+import bisect
+import inspect
+import functools
+import threading
+from contextlib import contextmanager
+
+from caching import all_caches
+
+# Latency buckets in seconds, from a cache hit up to a slow LLM call
+DEFAULT_BUCKETS = (0.001, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0, 60.0)
+
+def _escape(value):
+    return str(value).replace('\\', '\\\\').replace('"', '\\"').replace('\n', '\\n')
+
+def _format_labels(labels):
+    if not labels:
+        return ''
+    return '{' + ','.join(f'{name}="{_escape(value)}"' for name, value in labels) + '}'
+
+def _format_value(value):
+    if value == float('inf'):
+        return '+Inf'
+    if isinstance(value, float) and value.is_integer():
+        return str(int(value))
+    return repr(value)
+
+class Registry:
+    """The metrics of this process, rendered in the Prometheus text format.
+
+    Besides metric objects, collectors can be registered: functions called
+    at render time that return ``(name, kind, help, [(labels, value), ...])``
+    tuples for values kept elsewhere, such as cache hit counters.
+    """
+
+    def __init__(self):
+        self._metrics = []
+        self._collectors = []
+        self._lock = threading.Lock()
+
+    def register(self, metric):
+        with self._lock:
+            self._metrics.append(metric)
+        return metric
+
+    def register_collector(self, collector):
+        with self._lock:
+            self._collectors.append(collector)
+        return collector
+
+    def render(self):
+        """Return every metric in the text exposition format (version 0.0.4)."""
+        lines = []
+        with self._lock:
+            metrics = list(self._metrics)
+            collectors = list(self._collectors)
+        families = [metric.collect() for metric in metrics]
+        for collector in collectors:
+            families.extend(collector())
+        for name, kind, help_text, samples in families:
+            lines.append(f"# HELP {name} {help_text}")
+            lines.append(f"# TYPE {name} {kind}")
+            for sample_name, labels, value in samples:
+                lines.append(f"{sample_name}{_format_labels(labels)} {_format_value(value)}")
+        return '\n'.join(lines) + '\n'
+
+REGISTRY = Registry()
+
+class Counter:
+    """A monotonically increasing count, optionally split by labels."""
+
+    def __init__(self, name, help_text, labelnames=(), registry=REGISTRY):
+        self.name = name
+        self.help = help_text
+        self.labelnames = tuple(labelnames)
+        self._values = {}
+        self._lock = threading.Lock()
+        registry.register(self)
+
+    def inc(self, amount=1, **labels):
+        key = tuple(str(labels[name]) for name in self.labelnames)
+        with self._lock:
+            self._values[key] = self._values.get(key, 0) + amount
+
+    def collect(self):
+        with self._lock:
+            values = sorted(self._values.items())
+        samples = [(self.name, list(zip(self.labelnames, key)), value) for key, value in values]
+        return self.name, 'counter', self.help, samples
+
+class Histogram:
+    """Observations counted into cumulative ``le`` buckets, with their sum."""
+
+    def __init__(self, name, help_text, labelnames=(), buckets=DEFAULT_BUCKETS, registry=REGISTRY):
+        self.name = name
+        self.help = help_text
+        self.labelnames = tuple(labelnames)
+        self.buckets = tuple(sorted(buckets))
+        self._values = {}
+        self._lock = threading.Lock()
+        registry.register(self)
+
+    def observe(self, value, **labels):
+        key = tuple(str(labels[name]) for name in self.labelnames)
+        index = bisect.bisect_left(self.buckets, value)
+        with self._lock:
+            entry = self._values.get(key)
+            if entry is None:
+                # Per-bucket counts (the last one is +Inf), then the sum
+                entry = self._values[key] = [[0] * (len(self.buckets) + 1), 0.0]
+            entry[0][index] += 1
+            entry[1] += value
+
+    def collect(self):
+        with self._lock:
+            values = sorted((key, (list(counts), total)) for key, (counts, total) in self._values.items())
+        samples = []
+        for key, (counts, total) in values:
+            labels = list(zip(self.labelnames, key))
+            cumulative = 0
+            for bound, count in zip(self.buckets + (float('inf'),), counts):
+                cumulative += count
+                samples.append((f"{self.name}_bucket", labels + [('le', _format_value(float(bound)))], cumulative))
+            samples.append((f"{self.name}_sum", labels, total))
+            samples.append((f"{self.name}_count", labels, cumulative))
+        return self.name, 'histogram', self.help, samples
+
+SPAN_SECONDS = Histogram(
+    'travel_span_duration_seconds', 'Time spent in instrumented operations.', ['span']
+)
+SPAN_ERRORS = Counter(
+    'travel_span_errors_total', 'Instrumented operations that raised an exception.', ['span']
+)
+UPSTREAM_ERRORS = Counter(
+    'travel_upstream_errors_total', 'Failed calls to external services.', ['service']
+)
+LLM_TOKENS = Counter(
+    'travel_llm_tokens_total', 'Tokens reported by the LLM providers.', ['provider', 'kind']
+)
+HTTP_REQUESTS = Counter(
+    'travel_http_requests_total', 'HTTP requests handled.', ['method', 'view', 'status']
+)
+HTTP_SECONDS = Histogram(
+    'travel_http_request_duration_seconds', 'Time to produce an HTTP response.', ['method', 'view']
+)
+
+@contextmanager
+def span(name):
+    """Time the enclosed block into ``travel_span_duration_seconds``."""
+    start = time.perf_counter()
+    try:
+        yield
+    except Exception:
+        SPAN_ERRORS.inc(span=name)
+        raise
+    finally:
+        SPAN_SECONDS.observe(time.perf_counter() - start, span=name)
+
+def timed(name):
+    """Decorator running the whole function call inside ``span(name)``.
+
+    Coroutine functions are timed until the coroutine completes.
+    """
+    def decorator(func):
+        if inspect.iscoroutinefunction(func):
+            @functools.wraps(func)
+            async def async_wrapper(*args, **kwargs):
+                with span(name):
+                    return await func(*args, **kwargs)
+            return async_wrapper
+
+        @functools.wraps(func)
+        def wrapper(*args, **kwargs):
+            with span(name):
+                return func(*args, **kwargs)
+        return wrapper
+    return decorator
+
+def timed_iter(name, iterable):
+    """Yield from ``iterable``, timing everything up to its exhaustion or close."""
+    with span(name):
+        yield from iterable
+
+async def atimed_iter(name, aiterable):
+    """Async counterpart of ``timed_iter`` for async iterables."""
+    with span(name):
+        async for item in aiterable:
+            yield item
+
+def record_tokens(provider, prompt_tokens=None, completion_tokens=None):
+    if prompt_tokens:
+        LLM_TOKENS.inc(prompt_tokens, provider=provider, kind='prompt')
+    if completion_tokens:
+        LLM_TOKENS.inc(completion_tokens, provider=provider, kind='completion')
+
+def _cache_metrics():
+    caches = sorted(all_caches(), key=lambda cache: cache.name)
+    stats = [(cache.name, cache.stats()) for cache in caches]
+    return [
+        ('travel_cache_hits_total', 'counter', 'Cache lookups answered from memory or disk.',
+         [('travel_cache_hits_total', [('cache', name)], s['hits']) for name, s in stats]),
+        ('travel_cache_misses_total', 'counter', 'Cache lookups that found nothing.',
+         [('travel_cache_misses_total', [('cache', name)], s['misses']) for name, s in stats]),
+        ('travel_cache_memory_entries', 'gauge', 'Entries held in the in-memory cache layer.',
+         [('travel_cache_memory_entries', [('cache', name)], s['memory_size']) for name, s in stats]),
+    ]
+
+REGISTRY.register_collector(_cache_metrics)
+
+def render():
+    return REGISTRY.render()
@@ -0,0 +1,171 @@
+import os
+import time
+import asyncio
+import sqlite3
+import threading
+from caching import CACHE_DB_PATH
+from metrics import span
+
+# Default budgets per upstream as (requests per second, burst size).
+# Override with e.g. RATE_LIMIT_NOMINATIM="1,1" or RATE_LIMIT_SERPER="10,20".
+DEFAULT_RATE_LIMITS = {
+    "nominatim": (1.0, 1),
+    "serper": (5.0, 5),
+    "gemini": (1.0, 5),
+    "openai": (1.0, 5),
+}
+
+# Kept apart from the caches so taking tokens doesn't wait on cache writes
+RATE_LIMIT_DB_PATH = os.getenv(
+    "RATE_LIMIT_DB",
+    os.path.join(os.path.dirname(os.path.abspath(CACHE_DB_PATH)), "rate_limit.sqlite3")
+)
+
+class TokenBucket:
+    """Token bucket whose state lives in SQLite so every process shares it.
+
+    Tokens refill continuously at ``rate`` per second up to ``capacity``.
+    Each worker process takes tokens from the same row inside an immediate
+    transaction, so together they never exceed the configured budget. If the
+    database is unavailable the bucket degrades to a per-process bucket.
+    """
+
+    def __init__(self, name, rate, capacity, path=None):
+        if rate <= 0:
+            raise ValueError(f"Rate limit for {name} must be positive, got {rate}")
+        if capacity < 1:
+            raise ValueError(f"Burst size for {name} must be at least 1, got {capacity}")
+        self.name = name
+        self.rate = float(rate)
+        self.capacity = float(capacity)
+        self.path = path or RATE_LIMIT_DB_PATH
+        self._local = threading.local()
+        self._lock = threading.Lock()
+        self._tokens = self.capacity
+        self._updated_at = time.time()
+
+    def _connection(self):
+        conn = getattr(self._local, 'conn', None)
+        if conn is None:
+            conn = sqlite3.connect(self.path, timeout=30, isolation_level=None)
+            conn.execute("PRAGMA journal_mode=WAL")
+            conn.execute(
+                "CREATE TABLE IF NOT EXISTS rate_limit_buckets ("
+                "name TEXT PRIMARY KEY, tokens REAL NOT NULL, updated_at REAL NOT NULL)"
+            )
+            self._local.conn = conn
+        return conn
+
+    def _refill(self, tokens, updated_at, now):
+        return min(self.capacity, tokens + max(0.0, now - updated_at) * self.rate)
+
+    def _take(self, count):
+        """Try to take ``count`` tokens; return how long to wait if not enough."""
+        now = time.time()
+        conn = self._connection()
+        conn.execute("BEGIN IMMEDIATE")
+        try:
+            row = conn.execute(
+                "SELECT tokens, updated_at FROM rate_limit_buckets WHERE name = ?", (self.name,)
+            ).fetchone()
+            tokens = self._refill(*row, now) if row else self.capacity
+            wait = 0.0
+            if tokens >= count:
+                tokens -= count
+            else:
+                wait = (count - tokens) / self.rate
+            conn.execute(
+                "INSERT OR REPLACE INTO rate_limit_buckets (name, tokens, updated_at) VALUES (?, ?, ?)",
+                (self.name, tokens, now)
+            )
+            conn.execute("COMMIT")
+            return wait
+        except Exception:
+            conn.execute("ROLLBACK")
+            raise
+
+    def _take_local(self, count):
+        with self._lock:
+            now = time.time()
+            self._tokens = self._refill(self._tokens, self._updated_at, now)
+            self._updated_at = now
+            if self._tokens >= count:
+                self._tokens -= count
+                return 0.0
+            return (count - self._tokens) / self.rate
+
+    def acquire(self, count=1, timeout=None):
+        """Block until ``count`` tokens are available and take them.
+
+        Returns True once the tokens were taken, or False if that would take
+        longer than ``timeout`` seconds. Raises ValueError if ``count`` is more
+        than the bucket can ever hold.
+        """
+        self._check_count(count)
+        with span(f"rate_limit.{self.name}"):
+            return self._acquire(count, timeout)
+
+    def _check_count(self, count):
+        if count > self.capacity:
+            raise ValueError(
+                f"Cannot take {count} tokens from {self.name}, its burst size is {self.capacity:g}"
+            )
+
+    def _try_take(self, count):
+        try:
+            return self._take(count)
+        except sqlite3.Error as e:
+            print(f"Rate limiter error ({self.name}), using process-local budget: {e}")
+            return self._take_local(count)
+
+    def _acquire(self, count, timeout):
+        deadline = time.time() + timeout if timeout is not None else None
+        while True:
+            wait = self._try_take(count)
+            if wait <= 0:
+                return True
+            if deadline is not None and time.time() + wait > deadline:
+                return False
+            time.sleep(wait)
+
+    async def aacquire(self, count=1, timeout=None):
+        """Async counterpart of ``acquire`` that waits without blocking the event loop."""
+        self._check_count(count)
+        with span(f"rate_limit.{self.name}"):
+            deadline = time.time() + timeout if timeout is not None else None
+            while True:
+                # The SQLite transaction may wait on other processes' locks
+                wait = await asyncio.to_thread(self._try_take, count)
+                if wait <= 0:
+                    return True
+                if deadline is not None and time.time() + wait > deadline:
+                    return False
+                await asyncio.sleep(wait)
+
+def _configured_limit(name):
+    """Return ``(rate, capacity)`` for an upstream, honouring env overrides."""
+    rate, capacity = DEFAULT_RATE_LIMITS.get(name, (1.0, 1))
+    override = os.getenv(f"RATE_LIMIT_{name.upper()}")
+    if override:
+        try:
+            parts = [float(p) for p in override.split(',')]
+            override_rate = parts[0]
+            override_capacity = parts[1] if len(parts) > 1 else max(1.0, override_rate)
+            if override_rate <= 0 or override_capacity < 1:
+                raise ValueError("rate must be positive and burst at least 1")
+            rate, capacity = override_rate, override_capacity
+        except ValueError:
+            print(f"Warning: Invalid RATE_LIMIT_{name.upper()} value '{override}'")
+    return rate, capacity
+
+_buckets = {}
+_buckets_lock = threading.Lock()
+
+def get_limiter(name):
+    """Return the process-wide token bucket for an upstream service."""
+    with _buckets_lock:
+        bucket = _buckets.get(name)
+        if bucket is None:
+            rate, capacity = _configured_limit(name)
+            bucket = _buckets[name] = TokenBucket(name, rate, capacity)
+        return bucket
@@ -5,6 +5,7 @@ let map;
 let markers = [];
 let markerCluster;
 let currentItineraryId = null;
+let lastMessageId = 0;
 
 // Initialize the application when the DOM is loaded
 document.addEventListener('DOMContentLoaded', function() {
@@ -22,6 +23,13 @@ document.addEventListener('DOMContentLoaded', function() {
     
     // Set up event listeners
     setupEventListeners();
+    
+    // Pick up messages added while the page was in the background
+    document.addEventListener('visibilitychange', function() {
+        if (document.visibilityState === 'visible') {
+            loadNewMessages();
+        }
+    });
 });
 
 // Initialize event listeners
@@ -95,22 +103,35 @@ function checkApiKeys() {
         });
 }
 
-// Load all itineraries
+// Load the first page of itineraries; further pages are fetched on demand
 function loadItineraries() {
     const itinerariesList = document.getElementById('itineraries-list');
     if (!itinerariesList) return;
     
-    fetch('/api/get-itineraries/')
+    itinerariesList.innerHTML = '';
+    loadItinerariesPage(null, true);
+}
+
+// Fetch one page of itinerary summaries and append it to the sidebar
+function loadItinerariesPage(cursor, selectFirst) {
+    const itinerariesList = document.getElementById('itineraries-list');
+    if (!itinerariesList) return;
+    
+    const url = cursor ? 
+        `/api/get-itineraries/?cursor=${encodeURIComponent(cursor)}` : 
+        '/api/get-itineraries/';
+    
+    fetch(url)
         .then(response => response.json())
         .then(data => {
-            itinerariesList.innerHTML = '';
+            const itineraries = data.results || [];
             
-            if (data.length === 0) {
+            if (!cursor && itineraries.length === 0) {
                 itinerariesList.innerHTML = '<p class="text-muted">No itineraries yet. Use the chat to create one!</p>';
                 return;
             }
             
-            data.forEach(itinerary => {
+            itineraries.forEach(itinerary => {
                 const item = document.createElement('a');
                 item.href = '#';
                 item.className = 'list-group-item list-group-item-action';
@@ -125,16 +146,55 @@ function loadItineraries() {
                 itinerariesList.appendChild(item);
             });
             
+            if (data.next_cursor) {
+                appendLoadMoreItem(itinerariesList, data.next_cursor);
+            }
+            
             // Load the first itinerary by default
-            if (data.length > 0) {
-                loadItinerary(data[0].id);
+            if (selectFirst && itineraries.length > 0) {
+                loadItinerary(itineraries[0].id);
             }
         })
         .catch(error => {
             console.error('Error loading itineraries:', error);
-            itinerariesList.innerHTML = 
-                '<p class="text-danger">Error loading itineraries. Please try again later.</p>';
+            if (!cursor) {
+                itinerariesList.innerHTML = 
+                    '<p class="text-danger">Error loading itineraries. Please try again later.</p>';
+            }
+        });
+}
+
+// Add a "load more" entry that fetches the next page when it scrolls into view or is clicked
+function appendLoadMoreItem(itinerariesList, cursor) {
+    const loadMore = document.createElement('button');
+    loadMore.type = 'button';
+    loadMore.className = 'list-group-item list-group-item-action text-center text-muted';
+    loadMore.textContent = 'Load more';
+    
+    let loading = false;
+    const loadNextPage = function() {
+        if (loading) return;
+        loading = true;
+        if (observer) {
+            observer.disconnect();
+        }
+        itinerariesList.removeChild(loadMore);
+        loadItinerariesPage(cursor, false);
+    };
+    
+    loadMore.addEventListener('click', loadNextPage);
+    
+    let observer = null;
+    if ('IntersectionObserver' in window) {
+        observer = new IntersectionObserver(entries => {
+            if (entries.some(entry => entry.isIntersecting)) {
+                loadNextPage();
+            }
         });
+        observer.observe(loadMore);
+    }
+    
+    itinerariesList.appendChild(loadMore);
 }
 
 // Load a specific itinerary
@@ -287,19 +347,24 @@ function formatItineraryContent(content) {
 // Load map data for a specific itinerary
 function loadMapData(itineraryId = null) {
     const url = itineraryId ? 
-        `/api/map-data/${itineraryId}/` : 
-        '/api/map-data/';
+        `/api/map-geojson/${itineraryId}/` : 
+        '/api/map-geojson/';
     
+    // The endpoint sends an ETag with "Cache-Control: no-cache", so repeat
+    // loads are answered from the browser cache after a 304 revalidation
     fetch(url)
         .then(response => response.json())
         .then(data => {
             // Clear existing markers
             clearMapMarkers();
             
+            const features = data.features || [];
+            const destination = features.find(feature => feature.properties.kind === 'destination');
+            const places = features.filter(feature => feature.properties.kind === 'place');
+            
             // If there's a destination, center the map on it
-            if (data.destination && data.destination.latitude && data.destination.longitude) {
-                const lat = data.destination.latitude;
-                const lng = data.destination.longitude;
+            if (destination) {
+                const [lng, lat] = destination.geometry.coordinates;
                 
                 // Create a custom destination marker
                 const destinationIcon = L.divIcon({
@@ -311,7 +376,7 @@ function loadMapData(itineraryId = null) {
                 const destinationMarker = L.marker([lat, lng], {
                     icon: destinationIcon
                 }).bindPopup(`
-                    <div class="popup-title">${data.destination.name}</div>
+                    <div class="popup-title">${destination.properties.name}</div>
                     <div class="popup-description">Your destination</div>
                 `);
                 
@@ -323,7 +388,7 @@ function loadMapData(itineraryId = null) {
             }
             
             // Add markers for each place
-            if (data.places && data.places.length > 0) {
+            if (places.length > 0) {
                 // Create a custom place marker
                 const placeIcon = L.divIcon({
                     className: 'place-marker',
@@ -331,18 +396,18 @@ function loadMapData(itineraryId = null) {
                     iconAnchor: [7, 7]
                 });
                 
-                data.places.forEach(place => {
-                    if (place.latitude && place.longitude) {
-                        const placeMarker = L.marker([place.latitude, place.longitude], {
-                            icon: placeIcon
-                        }).bindPopup(`
-                            <div class="popup-title">${place.name}</div>
-                            ${place.description ? `<div class="popup-description">${place.description}</div>` : ''}
-                        `);
-                        
-                        markers.push(placeMarker);
-                        markerCluster.addLayer(placeMarker);
-                    }
+                places.forEach(place => {
+                    const [lng, lat] = place.geometry.coordinates;
+                    const description = place.properties.description;
+                    const placeMarker = L.marker([lat, lng], {
+                        icon: placeIcon
+                    }).bindPopup(`
+                        <div class="popup-title">${place.properties.name}</div>
+                        ${description ? `<div class="popup-description">${description}</div>` : ''}
+                    `);
+                    
+                    markers.push(placeMarker);
+                    markerCluster.addLayer(placeMarker);
                 });
                 
                 // Fit map to markers if there are any
@@ -368,7 +433,7 @@ function clearMapMarkers() {
     markers = [];
 }
 
-// Load chat history
+// Load the most recent chat messages
 function loadChatHistory() {
     const chatMessages = document.getElementById('chat-messages');
     if (!chatMessages) return;
@@ -378,15 +443,21 @@ function loadChatHistory() {
         .then(data => {
             chatMessages.innerHTML = '';
             
-            if (data.length === 0) {
+            const messages = data.results || [];
+            if (messages.length === 0) {
                 // Add welcome message
                 addMessageToChat('assistant', "Hi! I'm your travel assistant. I can help you plan trips and answer travel-related questions. Try asking me about destinations or type \"/add\" followed by a destination to create a new itinerary!");
                 return;
             }
             
-            data.forEach(message => {
+            messages.forEach(message => {
                 addMessageToChat(message.role, message.content);
             });
+            lastMessageId = Math.max(lastMessageId, messages[messages.length - 1].id);
+            
+            if (data.next_cursor) {
+                prependLoadEarlierItem(chatMessages, data.next_cursor);
+            }
             
             // Scroll to the bottom
             chatMessages.scrollTop = chatMessages.scrollHeight;
@@ -400,20 +471,85 @@ function loadChatHistory() {
         });
 }
 
-// Add a message to the chat
-function addMessageToChat(role, content) {
-    const chatMessages = document.getElementById('chat-messages');
-    if (!chatMessages) return;
+// Add a control at the top of the chat that loads the previous page of messages
+function prependLoadEarlierItem(chatMessages, cursor) {
+    const loadEarlier = document.createElement('button');
+    loadEarlier.type = 'button';
+    loadEarlier.className = 'btn btn-link btn-sm w-100 text-muted';
+    loadEarlier.textContent = 'Load earlier messages';
+    
+    loadEarlier.addEventListener('click', function() {
+        loadEarlier.disabled = true;
+        
+        fetch(`/api/chat-history/?cursor=${encodeURIComponent(cursor)}`)
+            .then(response => response.json())
+            .then(data => {
+                chatMessages.removeChild(loadEarlier);
+                
+                // Keep the view anchored on the message the user was reading
+                const previousHeight = chatMessages.scrollHeight;
+                const firstMessage = chatMessages.firstChild;
+                (data.results || []).forEach(message => {
+                    chatMessages.insertBefore(createMessageElement(message.role, message.content), firstMessage);
+                });
+                
+                if (data.next_cursor) {
+                    prependLoadEarlierItem(chatMessages, data.next_cursor);
+                }
+                chatMessages.scrollTop += chatMessages.scrollHeight - previousHeight;
+            })
+            .catch(error => {
+                console.error('Error loading earlier messages:', error);
+                loadEarlier.disabled = false;
+            });
+    });
+    
+    chatMessages.insertBefore(loadEarlier, chatMessages.firstChild);
+}
+
+// Fetch only the messages created since the last one shown (e.g. in another tab)
+function loadNewMessages() {
+    if (!lastMessageId) return;
     
+    fetch(`/api/chat-history/?after=${lastMessageId}`)
+        .then(response => response.json())
+        .then(data => {
+            const previousId = lastMessageId;
+            (data.results || []).forEach(message => {
+                if (message.id > lastMessageId) {
+                    addMessageToChat(message.role, message.content);
+                    lastMessageId = message.id;
+                }
+            });
+            
+            // Keep fetching until every new message has been shown
+            if (data.has_more && lastMessageId > previousId) {
+                loadNewMessages();
+            }
+        })
+        .catch(error => {
+            console.error('Error loading new messages:', error);
+        });
+}
+
+// Create the element for a chat message
+function createMessageElement(role, content) {
     const messageElement = document.createElement('div');
     messageElement.className = role === 'user' ? 'message message-user' : 'message message-assistant';
     messageElement.innerHTML = `<p class="mb-0">${content}</p>`;
+    return messageElement;
+}
+
+// Add a message to the chat
+function addMessageToChat(role, content) {
+    const chatMessages = document.getElementById('chat-messages');
+    if (!chatMessages) return;
     
-    chatMessages.appendChild(messageElement);
+    chatMessages.appendChild(createMessageElement(role, content));
     chatMessages.scrollTop = chatMessages.scrollHeight;
 }
 
-// Send a message to the chat
+// Send a message to the chat and stream the response as it is generated
 function sendMessage() {
     const input = document.getElementById('chat-input');
     if (!input) return;
@@ -440,42 +576,192 @@ function sendMessage() {
                       document.querySelector('[name=csrfmiddlewaretoken]').value : 
                       getCookie('csrftoken');
     
+    // Itineraries are generated by a background job rather than streamed
+    if (message.startsWith('/add')) {
+        queueItinerary(message, csrfToken, typingIndicator);
+        return;
+    }
+    
+    // The assistant message that streamed text is written into
+    let responseElement = null;
+    let responseText = '';
+    
+    const removeTypingIndicator = function() {
+        if (typingIndicator.parentNode) {
+            chatMessages.removeChild(typingIndicator);
+        }
+    };
+    
+    const showResponse = function(text) {
+        removeTypingIndicator();
+        if (!responseElement) {
+            addMessageToChat('assistant', '');
+            responseElement = chatMessages.lastElementChild.querySelector('p');
+        }
+        responseElement.textContent = text;
+        chatMessages.scrollTop = chatMessages.scrollHeight;
+    };
+    
+    const handleEvent = function(event, data) {
+        if (event === 'token') {
+            responseText += data.text;
+            showResponse(responseText);
+        } else if (event === 'done' || event === 'error') {
+            showResponse(data.message);
+            if (data.message_id) {
+                lastMessageId = Math.max(lastMessageId, data.message_id);
+            }
+        }
+    };
+    
     // Send the message to the server
-    fetch('/api/chat-message/', {
+    fetch('/api/chat/stream/', {
         method: 'POST',
         headers: {
             'Content-Type': 'application/json',
             'X-CSRFToken': csrfToken,
-            'Accept': 'application/json'
+            'Accept': 'text/event-stream'
         },
         credentials: 'same-origin',
         body: JSON.stringify({ message: message }),
     })
-    .then(response => response.json())
-    .then(data => {
-        // Remove the typing indicator
-        chatMessages.removeChild(typingIndicator);
+    .then(response => {
+        if (!response.ok || !response.body) {
+            throw new Error(`Unexpected response: ${response.status}`);
+        }
         
-        // Add the response to the chat
-        addMessageToChat('assistant', data.message);
+        const reader = response.body.getReader();
+        const decoder = new TextDecoder();
+        let buffer = '';
         
-        // If an itinerary was created, reload the itineraries
-        if (data.itinerary_id) {
-            loadItineraries();
-            loadItinerary(data.itinerary_id);
-        }
+        // Read Server-Sent Events frames as they arrive
+        const read = function() {
+            return reader.read().then(({ done, value }) => {
+                if (done) {
+                    removeTypingIndicator();
+                    return;
+                }
+                
+                buffer += decoder.decode(value, { stream: true });
+                const frames = buffer.split('\n\n');
+                buffer = frames.pop();
+                
+                frames.forEach(frame => {
+                    let event = 'message';
+                    let data = '';
+                    frame.split('\n').forEach(line => {
+                        if (line.startsWith('event: ')) {
+                            event = line.substring(7);
+                        } else if (line.startsWith('data: ')) {
+                            data += line.substring(6);
+                        }
+                    });
+                    if (data) {
+                        handleEvent(event, JSON.parse(data));
+                    }
+                });
+                
+                return read();
+            });
+        };
+        
+        return read();
     })
     .catch(error => {
         console.error('Error sending message:', error);
         
         // Remove the typing indicator
-        chatMessages.removeChild(typingIndicator);
+        removeTypingIndicator();
         
         // Add an error message
         addMessageToChat('assistant', 'Sorry, something went wrong. Please try again.');
     });
 }
 
+// Queue an itinerary for a /add command and follow its job
+function queueItinerary(message, csrfToken, typingIndicator) {
+    const chatMessages = document.getElementById('chat-messages');
+    
+    fetch('/api/chat/', {
+        method: 'POST',
+        headers: {
+            'Content-Type': 'application/json',
+            'X-CSRFToken': csrfToken
+        },
+        credentials: 'same-origin',
+        body: JSON.stringify({ message: message }),
+    })
+    .then(response => response.json())
+    .then(data => {
+        if (typingIndicator.parentNode) {
+            chatMessages.removeChild(typingIndicator);
+        }
+        addMessageToChat('assistant', data.message);
+        if (data.message_id) {
+            lastMessageId = Math.max(lastMessageId, data.message_id);
+        }
+        
+        // Follow the job until the itinerary is ready
+        if (data.job_id) {
+            pollItineraryJob(data.job_id);
+        }
+    })
+    .catch(error => {
+        console.error('Error sending message:', error);
+        
+        if (typingIndicator.parentNode) {
+            chatMessages.removeChild(typingIndicator);
+        }
+        addMessageToChat('assistant', 'Sorry, something went wrong. Please try again.');
+    });
+}
+
+// Poll an itinerary job until it completes or fails
+function pollItineraryJob(jobId) {
+    const chatMessages = document.getElementById('chat-messages');
+    if (!chatMessages) return;
+    
+    // Show the job progress as a typing indicator
+    const progressIndicator = document.createElement('div');
+    progressIndicator.className = 'message message-assistant typing-indicator';
+    progressIndicator.innerHTML = '<span>Planning your trip</span><span class="dot">.</span><span class="dot">.</span><span class="dot">.</span>';
+    chatMessages.appendChild(progressIndicator);
+    chatMessages.scrollTop = chatMessages.scrollHeight;
+    
+    const removeProgressIndicator = function() {
+        if (progressIndicator.parentNode) {
+            chatMessages.removeChild(progressIndicator);
+        }
+    };
+    
+    const poll = function() {
+        fetch(`/api/jobs/${jobId}/`)
+            .then(response => response.json())
+            .then(job => {
+                if (job.status === 'completed' || job.status === 'failed') {
+                    removeProgressIndicator();
+                    // The job posts its outcome as a chat message
+                    loadNewMessages();
+                    if (job.itinerary_id) {
+                        loadItineraries();
+                        loadItinerary(job.itinerary_id);
+                    }
+                } else {
+                    progressIndicator.querySelector('span').textContent = 
+                        `Planning your trip (${job.stage}, ${job.progress}%)`;
+                    setTimeout(poll, 1500);
+                }
+            })
+            .catch(error => {
+                console.error('Error checking itinerary job:', error);
+                removeProgressIndicator();
+                addMessageToChat('assistant', 'Sorry, something went wrong while creating your itinerary.');
+            });
+    };
+    
+    poll();
+}
+
 // Function to get CSRF token from cookies
 function getCookie(name) {
     let cookieValue = null;
@@ -98,6 +98,9 @@ function loadItineraries() {
             
             itinerariesList.innerHTML = '';
             
+            // The endpoint returns one page of summaries at a time
+            data = data.results || [];
+            
             if (data.length === 0) {
                 itinerariesList.innerHTML = '<p class="text-muted">No itineraries yet. Use the chat to create one!</p>';
                 return;
@@ -323,6 +326,9 @@ function loadChatHistory() {
             
             chatMessages.innerHTML = '';
             
+            // The endpoint returns the most recent page of messages
+            data = data.results || [];
+            
             if (data.length === 0) {
                 // Add welcome message
                 addMessageToChat('assistant', "Hi! I'm your travel assistant. I can help you plan trips and answer travel-related questions. Try asking me about destinations or type \"/add\" followed by a destination to create a new itinerary!");
@@ -1,13 +1,26 @@
 import os
 import json
+import asyncio
+import hashlib
+import weakref
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from urllib.parse import parse_qsl, urlencode, urlsplit, urlunsplit
+import httpx
 import requests
+from requests.adapters import HTTPAdapter
+from urllib3.util.retry import Retry
 from dotenv import load_dotenv
 from langchain_google_genai import ChatGoogleGenerativeAI
-from utils import parse_natural_date, detect_personality_prefs, extract_destination
+from async_http import RETRY_STATUSES, request_with_retries
+from caching import MISSING, TieredCache, normalize_key
+from metrics import UPSTREAM_ERRORS, atimed_iter, record_tokens, span, timed, timed_iter
+from rate_limit import get_limiter
+from utils import parse_natural_date, detect_personality_prefs, extract_destination, parse_structured_itinerary
 
 # OpenAI integration
 try:
-    from openai import OpenAI
+    from openai import AsyncOpenAI, OpenAI
     OPENAI_AVAILABLE = True
 except ImportError:
     OPENAI_AVAILABLE = False
@@ -15,28 +28,222 @@ except ImportError:
 # Load environment variables
 load_dotenv()
 
+# Connect and read timeouts (seconds) for search requests
+SERPER_TIMEOUT = (3.05, 15)
+
+_http_session = None
+_http_session_lock = threading.Lock()
+
+def get_http_session():
+    """Return the process-wide HTTP session used for outbound API calls.
+    
+    The session keeps connections alive between requests and retries
+    transient failures (connection errors, 429 and 5xx responses) with
+    exponential backoff.
+    """
+    global _http_session
+    with _http_session_lock:
+        if _http_session is None:
+            retry = Retry(
+                total=3,
+                backoff_factor=0.3,
+                status_forcelist=RETRY_STATUSES,
+                allowed_methods=frozenset(["GET", "POST"]),
+            )
+            adapter = HTTPAdapter(pool_connections=4, pool_maxsize=16, max_retries=retry)
+            session = requests.Session()
+            session.mount("https://", adapter)
+            session.mount("http://", adapter)
+            _http_session = session
+        return _http_session
+
+# Search results are cached per normalized query
+SEARCH_CACHE_TTL = int(os.getenv("SEARCH_CACHE_TTL", 24 * 3600))
+SEARCH_CACHE_MAX_ENTRIES = int(os.getenv("SEARCH_CACHE_MAX_ENTRIES", 5000))
+SEARCH_RESULT_FIELDS = ("title", "link", "snippet")
+
 class SerperSearch:
-    def __init__(self, api_key):
+    cache = TieredCache("search_cache", maxsize=512, max_entries=SEARCH_CACHE_MAX_ENTRIES)
+
+    def __init__(self, api_key, session=None):
         self.api_key = api_key
         self.url = "https://google.serper.dev/search"
+        self.session = session or get_http_session()
 
+    @timed("serper.search")
     def search(self, query):
-        headers = {
+        """Return the organic results for a query, from the cache when possible."""
+        key = normalize_key(query)
+        cached = self.cache.get(key)
+        if cached is not MISSING:
+            return cached
+        return self._cache_results(key, self._search_uncached(query))
+
+    @timed("serper.search")
+    async def asearch(self, query):
+        """Async counterpart of ``search``, sent over the shared async HTTP pool."""
+        key = normalize_key(query)
+        cached = await self.cache.aget(key)
+        if cached is not MISSING:
+            return cached
+        results = self._cacheable_results(await self._asearch_uncached(query))
+        if results:
+            await self.cache.aset(key, results, SEARCH_CACHE_TTL)
+        return results
+
+    def _cache_results(self, key, results):
+        results = self._cacheable_results(results)
+        if results:
+            self.cache.set(key, results, SEARCH_CACHE_TTL)
+        return results
+
+    def _cacheable_results(self, results):
+        # Only keep the fields used to build LLM context
+        return [{field: r.get(field, '') for field in SEARCH_RESULT_FIELDS} for r in results]
+
+    def _headers(self):
+        return {
             "X-API-KEY": self.api_key,
             "Content-Type": "application/json"
         }
+
+    def _search_uncached(self, query):
+        payload = {
+            "q": query
+        }
+        try:
+            get_limiter("serper").acquire()
+            response = self.session.post(self.url, headers=self._headers(), json=payload, timeout=SERPER_TIMEOUT)
+            response.raise_for_status()
+            results = response.json()
+            return results.get("organic", [])
+        except Exception as e:
+            UPSTREAM_ERRORS.inc(service="serper")
+            print(f"Error in search: {e}")
+            return []
+
+    async def _asearch_uncached(self, query):
         payload = {
             "q": query
         }
         try:
-            response = requests.post(self.url, headers=headers, json=payload)
+            await get_limiter("serper").aacquire()
+            response = await request_with_retries(
+                "POST", self.url, headers=self._headers(), json=payload,
+                timeout=httpx.Timeout(SERPER_TIMEOUT[1], connect=SERPER_TIMEOUT[0])
+            )
+            response.raise_for_status()
             results = response.json()
             return results.get("organic", [])
         except Exception as e:
+            UPSTREAM_ERRORS.inc(service="serper")
             print(f"Error in search: {e}")
             return []
 
+# Context sent to the LLM is trimmed to roughly this many tokens
+SEARCH_CONTEXT_TOKEN_BUDGET = int(os.getenv("SEARCH_CONTEXT_TOKEN_BUDGET", 1500))
+# Rough token count of English text, without calling a tokenizer
+CHARS_PER_TOKEN = 4
+# Damping of reciprocal rank fusion: higher values flatten the gap between ranks
+RANK_FUSION_K = 60
+FLEXIBLE_DATES = "flexible dates"
+
+def _canonical_url(url):
+    """Normalize a result URL so the same page found by two queries is merged.
+    
+    Ignores the scheme, a leading ``www.``, a trailing slash, the fragment and
+    ``utm_*`` tracking parameters.
+    """
+    parts = urlsplit(url.strip())
+    host = parts.netloc.lower()
+    if host.startswith("www."):
+        host = host[4:]
+    query = urlencode([(k, v) for k, v in parse_qsl(parts.query) if not k.startswith("utm_")])
+    return urlunsplit(("", host, parts.path.rstrip("/"), query, ""))
+
+def merge_search_results(result_lists):
+    """Merge the results of several queries into one ranked list.
+    
+    Results are deduplicated by URL and ranked by reciprocal rank fusion:
+    each query adds ``1 / (RANK_FUSION_K + rank)`` to the score of every
+    result it returned, so pages found by several queries rise to the top
+    while every query's best results stay near it. Ties keep the order of
+    the queries.
+    """
+    scores = {}
+    merged = {}
+    for results in result_lists:
+        for rank, result in enumerate(results or (), start=1):
+            key = _canonical_url(result.get("link", "")) or result.get("title", "")
+            if key not in merged:
+                merged[key] = result
+                scores[key] = 0.0
+            elif len(result.get("snippet", "")) > len(merged[key].get("snippet", "")):
+                # Keep the most informative snippet of the page
+                merged[key] = result
+            scores[key] += 1.0 / (RANK_FUSION_K + rank)
+    order = sorted(merged, key=lambda key: -scores[key])
+    return [merged[key] for key in order]
+
+def trim_to_token_budget(blocks, budget=None):
+    """Return the leading ``blocks`` of text that fit in ``budget`` tokens.
+    
+    The first block is always kept, so the context is never empty.
+    """
+    budget = SEARCH_CONTEXT_TOKEN_BUDGET if budget is None else budget
+    kept = []
+    used = 0
+    for block in blocks:
+        tokens = len(block) // CHARS_PER_TOKEN + 1
+        if kept and used + tokens > budget:
+            break
+        kept.append(block)
+        used += tokens
+    return kept
+
+# LLM responses are cached per provider, model, temperature and prompt
+LLM_CACHE_TTL = int(os.getenv("LLM_CACHE_TTL", 6 * 3600))
+LLM_CACHE_MAX_ENTRIES = int(os.getenv("LLM_CACHE_MAX_ENTRIES", 2000))
+
+# JSON schema for structured itinerary output (days -> slots)
+ITINERARY_SCHEMA = {
+    "title": "itinerary",
+    "description": "A day-by-day travel itinerary",
+    "type": "object",
+    "properties": {
+        "days": {
+            "type": "array",
+            "items": {
+                "type": "object",
+                "properties": {
+                    "day_number": {"type": "integer"},
+                    "slots": {
+                        "type": "array",
+                        "items": {
+                            "type": "object",
+                            "properties": {
+                                "time_of_day": {"type": "string"},
+                                "activity": {"type": "string"},
+                                "place_name": {"type": "string"},
+                                "rating": {"type": "number"},
+                            },
+                            "required": ["time_of_day", "activity", "place_name", "rating"],
+                            "additionalProperties": False,
+                        },
+                    },
+                },
+                "required": ["day_number", "slots"],
+                "additionalProperties": False,
+            },
+        },
+    },
+    "required": ["days"],
+    "additionalProperties": False,
+}
+
 class TravelAgent:
+    response_cache = TieredCache("llm_response_cache", maxsize=256, max_entries=LLM_CACHE_MAX_ENTRIES)
+
     def __init__(self, serper_api_key=None, google_api_key=None, openai_api_key=None):
         # API keys
         self.serper_api_key = serper_api_key or os.getenv("SERPER_API_KEY")
@@ -46,20 +253,24 @@ class TravelAgent:
         # Model configurations
         self.gemini_model = "gemini-1.5-flash"
         self.openai_model = "gpt-4o"  # the newest OpenAI model is "gpt-4o" which was released May 13, 2024.
+        self.gemini_temperature = 0.6
+        self.openai_temperature = 0.7
         
         # Setup LLM clients - ALWAYS prioritize Gemini as requested
         self.llm_provider = "gemini"  # Default and preferred LLM provider
         
-        # Initialize Gemini
+        # Initialize Gemini (the structured-output runnable is built on first use)
+        self.llm_gemini_structured = None
         if self.google_api_key:
             self.llm_gemini = ChatGoogleGenerativeAI(
                 model=self.gemini_model,
                 verbose=True,
-                temperature=0.6,
+                temperature=self.gemini_temperature,
                 google_api_key=self.google_api_key
             )
         
-        # Initialize OpenAI if available (only as fallback)
+        # Initialize OpenAI if available (only as fallback); async clients are made per event loop
+        self._openai_async_clients = weakref.WeakKeyDictionary()
         if OPENAI_AVAILABLE and self.openai_api_key:
             self.openai_client = OpenAI(api_key=self.openai_api_key)
         
@@ -99,10 +310,32 @@ class TravelAgent:
             response = self.openai_client.chat.completions.create(
                 model=self.openai_model,
                 messages=[{"role": "user", "content": prompt}],
-                temperature=0.7,
+                temperature=self.openai_temperature,
             )
+            self._record_openai_usage(response)
             return response.choices[0].message.content
         except Exception as e:
+            UPSTREAM_ERRORS.inc(service="openai")
+            print(f"OpenAI error: {e}")
+            raise e
+    
+    def _stream_with_openai(self, prompt):
+        """Yield response text from OpenAI as it is generated."""
+        try:
+            stream = self.openai_client.chat.completions.create(
+                model=self.openai_model,
+                messages=[{"role": "user", "content": prompt}],
+                temperature=self.openai_temperature,
+                stream=True,
+                # The last chunk then reports the token usage
+                stream_options={"include_usage": True},
+            )
+            for chunk in stream:
+                self._record_openai_usage(chunk)
+                if chunk.choices and chunk.choices[0].delta.content:
+                    yield chunk.choices[0].delta.content
+        except Exception as e:
+            UPSTREAM_ERRORS.inc(service="openai")
             print(f"OpenAI error: {e}")
             raise e
             
@@ -110,55 +343,263 @@ class TravelAgent:
         """Generate response using Gemini."""
         try:
             response = self.llm_gemini.invoke(prompt)
+            self._record_gemini_usage(response)
             return response.content
         except Exception as e:
+            UPSTREAM_ERRORS.inc(service="gemini")
+            print(f"Gemini error: {e}")
+            raise e
+    
+    def _stream_with_gemini(self, prompt):
+        """Yield response text from Gemini as it is generated."""
+        try:
+            for chunk in self.llm_gemini.stream(prompt):
+                # Usage is reported per chunk and adds up to the total
+                self._record_gemini_usage(chunk)
+                if chunk.content:
+                    yield chunk.content
+        except Exception as e:
+            UPSTREAM_ERRORS.inc(service="gemini")
             print(f"Gemini error: {e}")
             raise e
             
-    def generate_text(self, prompt):
-        """Generate text using the selected LLM provider."""
-        if self.llm_provider == "openai" and self.openai_api_key:
-            return self._generate_with_openai(prompt)
+    def _async_openai_client(self):
+        """Return the async OpenAI client of the running event loop."""
+        loop = asyncio.get_running_loop()
+        client = self._openai_async_clients.get(loop)
+        if client is None:
+            client = self._openai_async_clients[loop] = AsyncOpenAI(api_key=self.openai_api_key)
+        return client
+    
+    async def _agenerate_with_openai(self, prompt):
+        """Async counterpart of ``_generate_with_openai``."""
+        try:
+            response = await self._async_openai_client().chat.completions.create(
+                model=self.openai_model,
+                messages=[{"role": "user", "content": prompt}],
+                temperature=self.openai_temperature,
+            )
+            self._record_openai_usage(response)
+            return response.choices[0].message.content
+        except Exception as e:
+            UPSTREAM_ERRORS.inc(service="openai")
+            print(f"OpenAI error: {e}")
+            raise e
+    
+    async def _astream_with_openai(self, prompt):
+        """Async counterpart of ``_stream_with_openai``."""
+        try:
+            stream = await self._async_openai_client().chat.completions.create(
+                model=self.openai_model,
+                messages=[{"role": "user", "content": prompt}],
+                temperature=self.openai_temperature,
+                stream=True,
+                stream_options={"include_usage": True},
+            )
+            async for chunk in stream:
+                self._record_openai_usage(chunk)
+                if chunk.choices and chunk.choices[0].delta.content:
+                    yield chunk.choices[0].delta.content
+        except Exception as e:
+            UPSTREAM_ERRORS.inc(service="openai")
+            print(f"OpenAI error: {e}")
+            raise e
+    
+    async def _agenerate_with_gemini(self, prompt):
+        """Async counterpart of ``_generate_with_gemini``."""
+        try:
+            response = await self.llm_gemini.ainvoke(prompt)
+            self._record_gemini_usage(response)
+            return response.content
+        except Exception as e:
+            UPSTREAM_ERRORS.inc(service="gemini")
+            print(f"Gemini error: {e}")
+            raise e
+    
+    async def _astream_with_gemini(self, prompt):
+        """Async counterpart of ``_stream_with_gemini``."""
+        try:
+            async for chunk in self.llm_gemini.astream(prompt):
+                self._record_gemini_usage(chunk)
+                if chunk.content:
+                    yield chunk.content
+        except Exception as e:
+            UPSTREAM_ERRORS.inc(service="gemini")
+            print(f"Gemini error: {e}")
+            raise e
+    
+    def _record_openai_usage(self, response):
+        usage = getattr(response, 'usage', None)
+        if usage:
+            record_tokens("openai", usage.prompt_tokens, usage.completion_tokens)
+    
+    def _record_gemini_usage(self, response):
+        usage = getattr(response, 'usage_metadata', None)
+        if usage:
+            record_tokens("gemini", usage.get('input_tokens'), usage.get('output_tokens'))
+    
+    def _response_cache_key(self, provider, prompt):
+        """Return a deterministic cache key for a prompt sent to a provider."""
+        if provider.startswith("openai"):
+            model, temperature = self.openai_model, self.openai_temperature
         else:
-            return self._generate_with_gemini(prompt)
+            model, temperature = self.gemini_model, self.gemini_temperature
+        raw = json.dumps([provider, model, temperature, prompt])
+        return hashlib.sha256(raw.encode("utf-8")).hexdigest()
     
-    def generate_itinerary(self, user_input):
-        """Generate a travel itinerary based on user input."""
-        # Validate configuration
-        is_valid, message = self.validate_configuration()
-        if not is_valid:
-            return message
+    def _cache_stream(self, key, chunks):
+        """Pass streamed chunks through, caching the full text once complete."""
+        parts = []
+        for chunk in chunks:
+            parts.append(chunk)
+            yield chunk
+        if key and parts:
+            self.response_cache.set(key, ''.join(parts), LLM_CACHE_TTL)
+    
+    async def _acache_stream(self, key, chunks):
+        """Async counterpart of ``_cache_stream``."""
+        parts = []
+        async for chunk in chunks:
+            parts.append(chunk)
+            yield chunk
+        if key and parts:
+            await self.response_cache.aset(key, ''.join(parts), LLM_CACHE_TTL)
+    
+    def _provider(self):
+        return "openai" if self.llm_provider == "openai" and self.openai_api_key else "gemini"
+    
+    def generate_text(self, prompt, stream=False, use_cache=True):
+        """Generate text using the selected LLM provider.
         
-        # Extract information from user input
-        destination = extract_destination(user_input)
-        if not destination:
-            return "I couldn't identify a destination in your request. Please specify where you want to travel."
+        With ``stream=True`` an iterator of text chunks is returned instead
+        of the complete response. Responses are cached by provider, model,
+        temperature and prompt; pass ``use_cache=False`` to always call the LLM.
+        """
+        provider = self._provider()
+        
+        key = self._response_cache_key(provider, prompt) if use_cache else None
+        if key:
+            cached = self.response_cache.get(key)
+            if cached is not MISSING:
+                return iter([cached]) if stream else cached
+        
+        get_limiter(provider).acquire()
+        if stream:
+            # The span lasts until the caller has consumed the whole stream
+            if provider == "openai":
+                chunks = self._stream_with_openai(prompt)
+            else:
+                chunks = self._stream_with_gemini(prompt)
+            return timed_iter(f"llm.stream.{provider}", self._cache_stream(key, chunks))
+        
+        with span(f"llm.generate.{provider}"):
+            if provider == "openai":
+                text = self._generate_with_openai(prompt)
+            else:
+                text = self._generate_with_gemini(prompt)
+        if key and text and isinstance(text, str):
+            self.response_cache.set(key, text, LLM_CACHE_TTL)
+        return text
+    
+    async def agenerate_text(self, prompt, stream=False, use_cache=True):
+        """Async counterpart of ``generate_text``.
+        
+        The LLM call is awaited rather than holding a thread, so one event
+        loop can wait on many of them. With ``stream=True`` an async iterator
+        of text chunks is returned.
+        """
+        provider = self._provider()
         
+        key = self._response_cache_key(provider, prompt) if use_cache else None
+        if key:
+            cached = await self.response_cache.aget(key)
+            if cached is not MISSING:
+                return _aiter_once(cached) if stream else cached
+        
+        await get_limiter(provider).aacquire()
+        if stream:
+            if provider == "openai":
+                chunks = self._astream_with_openai(prompt)
+            else:
+                chunks = self._astream_with_gemini(prompt)
+            return atimed_iter(f"llm.stream.{provider}", self._acache_stream(key, chunks))
+        
+        with span(f"llm.generate.{provider}"):
+            if provider == "openai":
+                text = await self._agenerate_with_openai(prompt)
+            else:
+                text = await self._agenerate_with_gemini(prompt)
+        if key and text and isinstance(text, str):
+            await self.response_cache.aset(key, text, LLM_CACHE_TTL)
+        return text
+    
+    def trip_preferences(self, user_input):
+        """Return the personalities and a readable travel date for a request."""
         personalities = detect_personality_prefs(user_input)
         date_obj = parse_natural_date(user_input) or None
-        date_str = date_obj.strftime('%B %d, %Y') if date_obj else "flexible dates"
-        
-        # Perform search to gather context
-        query = f"{destination} travel guide best attractions, activities, restaurants for {', '.join(personalities)} travelers"
-        results = self.search.search(query)
+        date_str = date_obj.strftime('%B %d, %Y') if date_obj else FLEXIBLE_DATES
+        return personalities, date_str
+    
+    def search_context(self, destination, personalities, date_str=FLEXIBLE_DATES):
+        """Search for travel information and format it as LLM context.
         
+        Several targeted queries (see ``_search_queries``) are sent at once
+        over the pooled session, so the search takes as long as the slowest
+        of them. Their results are merged, ranked and trimmed to
+        SEARCH_CONTEXT_TOKEN_BUDGET. Returns None when nothing was found.
+        """
+        queries = self._search_queries(destination, personalities, date_str)
+        with ThreadPoolExecutor(max_workers=len(queries)) as pool:
+            result_lists = list(pool.map(self.search.search, queries))
+        return self._format_context(result_lists)
+    
+    async def asearch_context(self, destination, personalities, date_str=FLEXIBLE_DATES):
+        """Async counterpart of ``search_context``."""
+        queries = self._search_queries(destination, personalities, date_str)
+        result_lists = await asyncio.gather(*(self.search.asearch(query) for query in queries))
+        return self._format_context(result_lists)
+    
+    def _search_queries(self, destination, personalities, date_str):
+        """Return the searches run for a trip, most general first."""
+        # Personalities are sorted so the same set always produces the same (cacheable) query
+        queries = [
+            f"{destination} travel guide best attractions, activities, restaurants for {', '.join(sorted(personalities))} travelers",
+            f"best local restaurants and food in {destination}",
+            f"{destination} best neighborhoods to explore and hidden gems",
+        ]
+        if date_str and date_str != FLEXIBLE_DATES:
+            queries.append(f"{destination} events and festivals {date_str}")
+        return queries
+    
+    def _format_context(self, result_lists):
+        results = merge_search_results(result_lists)
         if not results:
-            return f"I couldn't find travel information for {destination}. Please try another destination or check your internet connection."
+            return None
         
         # Format context from search results
-        context = "\n".join([
+        return "\n".join(trim_to_token_budget([
             f"Title: {r.get('title', '')}\nLink: {r.get('link', '')}\nSnippet: {r.get('snippet', '')}"
-            for r in results[:5]
-        ])
+            for r in results
+        ]))
+    
+    def build_itinerary_prompt(self, destination, personalities, date_str, context, structured=False):
+        """Build the LLM prompt for a 3-day itinerary.
         
-        # Generate itinerary with LLM
-        prompt = f"""
-        Based on the user's personality {personalities} and their travel destination {destination} on {date_str},
-        generate a concise 3-day travel itinerary.
-
-        Use this context:
-        {context}
-
+        With ``structured=True`` the prompt asks for JSON matching
+        ``ITINERARY_SCHEMA`` instead of Markdown.
+        """
+        if structured:
+            output_format = """
+        Return the itinerary as JSON with 3 days. Each day has a numeric day_number and
+        three slots (Morning, Afternoon, Evening). Each slot has:
+        - time_of_day: Morning, Afternoon or Evening
+        - activity: a brief activity description
+        - place_name: the EXACT name of the place, exactly as it would appear on a map
+        - rating: the place's rating out of 5 for restaurants, otherwise 0
+        """
+            formatting_rule = "Only put the place's own name in place_name, without descriptions or the city name"
+        else:
+            output_format = """
         The itinerary MUST follow this format:
         
         # Day 1
@@ -175,7 +616,16 @@ class TravelAgent:
         - Morning: [Brief activity description] at [EXACT PLACE NAME]
         - Afternoon: [Brief activity description] at [EXACT PLACE NAME]
         - Evening: [Brief activity description] at [EXACT PLACE NAME]
+        """
+            formatting_rule = "Use proper Markdown formatting with # for day headers"
+        
+        return f"""
+        Based on the user's personality {personalities} and their travel destination {destination} on {date_str},
+        generate a concise 3-day travel itinerary.
 
+        Use this context:
+        {context}
+        {output_format}
         IMPORTANT RULES:
         1. Each activity MUST include a specific, mappable place name (museum, landmark, restaurant, etc.)
         2. Keep activities short and concise
@@ -184,23 +634,104 @@ class TravelAgent:
         5. Make sure to highlight the main attractions of {destination}
         6. Include at least one local secret or hidden gem
         7. Align with the user's {personalities} interests
-        8. Use proper Markdown formatting with # for day headers
+        8. {formatting_rule}
         """
+    
+    def _generate_structured_with_openai(self, prompt):
+        """Generate a JSON itinerary using OpenAI structured outputs."""
+        try:
+            response = self.openai_client.chat.completions.create(
+                model=self.openai_model,
+                messages=[{"role": "user", "content": prompt}],
+                temperature=self.openai_temperature,
+                response_format={
+                    "type": "json_schema",
+                    "json_schema": {"name": "itinerary", "schema": ITINERARY_SCHEMA, "strict": True},
+                },
+            )
+            self._record_openai_usage(response)
+            return json.loads(response.choices[0].message.content)
+        except Exception as e:
+            UPSTREAM_ERRORS.inc(service="openai")
+            print(f"OpenAI error: {e}")
+            raise e
+    
+    def _generate_structured_with_gemini(self, prompt):
+        """Generate a JSON itinerary using Gemini structured output."""
+        try:
+            if self.llm_gemini_structured is None:
+                self.llm_gemini_structured = self.llm_gemini.with_structured_output(ITINERARY_SCHEMA)
+            return self.llm_gemini_structured.invoke(prompt)
+        except Exception as e:
+            UPSTREAM_ERRORS.inc(service="gemini")
+            print(f"Gemini error: {e}")
+            raise e
+    
+    def generate_structured_itinerary(self, prompt, use_cache=True):
+        """Generate an itinerary as validated structured data.
+        
+        Returns the list of days from ``parse_structured_itinerary``, or None
+        when the provider fails or its output doesn't match the schema, so the
+        caller can fall back to the Markdown prompt.
+        """
+        provider = self._provider()
         
+        key = self._response_cache_key(f"{provider}:structured", prompt) if use_cache else None
+        if key:
+            cached = self.response_cache.get(key)
+            if cached is not MISSING:
+                return cached
+        
+        get_limiter(provider).acquire()
         try:
-            return self.generate_text(prompt)
+            with span(f"llm.structured.{provider}"):
+                if provider == "openai":
+                    data = self._generate_structured_with_openai(prompt)
+                else:
+                    data = self._generate_structured_with_gemini(prompt)
+            days = parse_structured_itinerary(data)
         except Exception as e:
-            return f"Error generating itinerary: {str(e)}"
+            print(f"Structured itinerary unavailable, falling back to text: {e}")
+            return None
+        
+        if key:
+            self.response_cache.set(key, days, LLM_CACHE_TTL)
+        return days
     
-    def answer_travel_question(self, user_input):
-        """Answer travel-related questions using the LLM."""
+    def generate_itinerary(self, user_input, destination=None):
+        """Generate a travel itinerary based on user input.
+        
+        Pass ``destination`` when the caller has already extracted it, so the
+        input isn't parsed again.
+        """
         # Validate configuration
         is_valid, message = self.validate_configuration()
         if not is_valid:
             return message
         
-        # Generate response with LLM
-        prompt = f"""
+        # Extract information from user input
+        destination = destination or extract_destination(user_input)
+        if not destination:
+            return "I couldn't identify a destination in your request. Please specify where you want to travel."
+        
+        personalities, date_str = self.trip_preferences(user_input)
+        
+        # Perform search to gather context
+        context = self.search_context(destination, personalities, date_str)
+        if not context:
+            return f"I couldn't find travel information for {destination}. Please try another destination or check your internet connection."
+        
+        # Generate itinerary with LLM
+        prompt = self.build_itinerary_prompt(destination, personalities, date_str, context)
+        
+        try:
+            return self.generate_text(prompt)
+        except Exception as e:
+            return f"Error generating itinerary: {str(e)}"
+    
+    def build_question_prompt(self, user_input):
+        """Build the LLM prompt for a travel question."""
+        return f"""
         You are a helpful travel assistant. Answer the following travel-related question:
         
         {user_input}
@@ -209,8 +740,59 @@ class TravelAgent:
         If the question is not related to travel, politely explain that you can only help with travel topics.
         Keep your answer concise but informative.
         """
+    
+    def answer_travel_question(self, user_input):
+        """Answer travel-related questions using the LLM."""
+        # Validate configuration
+        is_valid, message = self.validate_configuration()
+        if not is_valid:
+            return message
+        
+        # Generate response with LLM
+        prompt = self.build_question_prompt(user_input)
         
         try:
             return self.generate_text(prompt)
         except Exception as e:
             return f"Error answering question: {str(e)}"
+    
+    async def aanswer_travel_question(self, user_input):
+        """Async counterpart of ``answer_travel_question``."""
+        is_valid, message = self.validate_configuration()
+        if not is_valid:
+            return message
+        
+        prompt = self.build_question_prompt(user_input)
+        
+        try:
+            return await self.agenerate_text(prompt)
+        except Exception as e:
+            return f"Error answering question: {str(e)}"
+
+async def _aiter_once(value):
+    yield value
+
+_agents = {}
+_agents_lock = threading.Lock()
+
+def get_travel_agent(serper_api_key=None, google_api_key=None, openai_api_key=None):
+    """Return a shared TravelAgent for this set of API keys.
+    
+    Agents (and the LLM clients they hold) are built once per process and
+    reused by every request using the same keys.
+    """
+    keys = (
+        serper_api_key or os.getenv("SERPER_API_KEY"),
+        google_api_key or os.getenv("GOOGLE_API_KEY"),
+        openai_api_key or os.getenv("OPENAI_API_KEY"),
+    )
+    with _agents_lock:
+        agent = _agents.get(keys)
+        if agent is None:
+            agent = _agents[keys] = TravelAgent(*keys)
+        return agent
+
+def clear_travel_agents():
+    """Drop every cached TravelAgent, e.g. after API keys were changed."""
+    with _agents_lock:
+        _agents.clear()
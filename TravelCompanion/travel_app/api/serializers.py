@@ -1,5 +1,5 @@
 from rest_framework import serializers
-from travel_app.models import Destination, Itinerary, ItineraryDay, Place, Message, ApiKey
+from travel_app.models import Destination, Itinerary, ItineraryDay, Place, Message, ApiKey, ItineraryJob
 
 class ApiKeySerializer(serializers.ModelSerializer):
     class Meta:
@@ -30,7 +30,21 @@ class ItinerarySerializer(serializers.ModelSerializer):
         model = Itinerary
         fields = ['id', 'title', 'destination', 'content', 'days', 'places', 'created_at']
 
+class ItinerarySummarySerializer(serializers.ModelSerializer):
+    destination_name = serializers.CharField(source='destination.name', read_only=True)
+    
+    class Meta:
+        model = Itinerary
+        fields = ['id', 'title', 'destination_name', 'created_at']
+
 class MessageSerializer(serializers.ModelSerializer):
     class Meta:
         model = Message
-        fields = ['id', 'role', 'content', 'timestamp']
\ No newline at end of file
+        fields = ['id', 'role', 'content', 'timestamp']
+
+class ItineraryJobSerializer(serializers.ModelSerializer):
+    itinerary_id = serializers.PrimaryKeyRelatedField(source='itinerary', read_only=True)
+    
+    class Meta:
+        model = ItineraryJob
+        fields = ['id', 'status', 'stage', 'progress', 'message', 'itinerary_id', 'created_at', 'updated_at']
\ No newline at end of file
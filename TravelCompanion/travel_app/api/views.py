@@ -2,13 +2,18 @@ from rest_framework import viewsets, status
 from rest_framework.response import Response
 from rest_framework.decorators import api_view, action
 from django.http import JsonResponse
-from travel_app.models import ApiKey, Destination, Itinerary, ItineraryDay, Place, Message
+from django.shortcuts import get_object_or_404
+from travel_app.models import ApiKey, Destination, Itinerary, ItineraryDay, Place, Message, ItineraryJob
+from travel_app.jobs import fail_stale_jobs, submit_itinerary_job
+from travel_app.keys import get_api_keys
+from travel_app import spatial
 from .serializers import (
     ApiKeySerializer, DestinationSerializer, ItinerarySerializer, 
-    ItineraryDaySerializer, PlaceSerializer, MessageSerializer
+    ItineraryDaySerializer, PlaceSerializer, MessageSerializer,
+    ItineraryJobSerializer
 )
-from travel_agent import TravelAgent
-from utils import extract_places_from_itinerary, get_coordinates, parse_itinerary_to_days, extract_destination
+from travel_agent import get_travel_agent
+from utils import extract_destination
 
 class ApiKeyViewSet(viewsets.ModelViewSet):
     queryset = ApiKey.objects.all()
@@ -25,6 +30,47 @@ class ItineraryViewSet(viewsets.ModelViewSet):
 class PlaceViewSet(viewsets.ModelViewSet):
     queryset = Place.objects.all()
     serializer_class = PlaceSerializer
+    
+    @action(detail=False, methods=['get'])
+    def within(self, request):
+        """
+        Find saved places of every itinerary by location.
+        
+        Pass either ``bbox=min_lng,min_lat,max_lng,max_lat`` (the map
+        viewport) or ``lat``, ``lng`` and ``radius_km`` (nearest first).
+        ``limit`` caps the number of places returned.
+        """
+        params = request.query_params
+        try:
+            limit = int(params.get('limit', spatial.DEFAULT_RESULT_LIMIT))
+        except ValueError:
+            limit = spatial.DEFAULT_RESULT_LIMIT
+        limit = max(1, min(limit, spatial.MAX_RESULT_LIMIT))
+        
+        try:
+            if 'bbox' in params:
+                min_lng, min_lat, max_lng, max_lat = (float(v) for v in params['bbox'].split(','))
+                if not (-90 <= min_lat <= max_lat <= 90 and -180 <= min_lng <= 180 and -180 <= max_lng <= 180):
+                    raise ValueError
+                places, truncated = spatial.places_in_bbox(min_lat, min_lng, max_lat, max_lng, limit)
+            elif 'lat' in params and 'lng' in params:
+                lat, lng = float(params['lat']), float(params['lng'])
+                radius_km = float(params.get('radius_km', 2))
+                if not (-90 <= lat <= 90 and -180 <= lng <= 180 and 0 < radius_km <= 20000):
+                    raise ValueError
+                places, truncated = spatial.places_near(lat, lng, radius_km, limit)
+            else:
+                return Response(
+                    {"error": "Provide bbox=min_lng,min_lat,max_lng,max_lat or lat, lng and radius_km"},
+                    status=status.HTTP_400_BAD_REQUEST
+                )
+        except ValueError:
+            return Response(
+                {"error": "Invalid coordinates"},
+                status=status.HTTP_400_BAD_REQUEST
+            )
+        
+        return Response({'results': places, 'truncated': truncated})
 
 class MessageViewSet(viewsets.ModelViewSet):
     queryset = Message.objects.all()
@@ -33,11 +79,15 @@ class MessageViewSet(viewsets.ModelViewSet):
 @api_view(['POST'])
 def generate_itinerary(request):
     """
-    Generate a travel itinerary using the travel agent.
+    Queue a travel itinerary job for the travel agent.
+    
+    Returns the job id immediately; progress and the resulting itinerary
+    are reported by the job status endpoint.
     """
-    # Get API keys from database
-    serper_api_key = ApiKey.objects.filter(name='serper').first()
-    google_api_key = ApiKey.objects.filter(name='google').first()
+    # Get API keys from the in-memory key cache
+    api_keys = get_api_keys()
+    serper_api_key = api_keys.get('serper')
+    google_api_key = api_keys.get('google')
     
     if not serper_api_key or not google_api_key:
         return Response(
@@ -53,12 +103,6 @@ def generate_itinerary(request):
             status=status.HTTP_400_BAD_REQUEST
         )
     
-    # Initialize travel agent
-    travel_agent = TravelAgent(
-        serper_api_key=serper_api_key.key,
-        google_api_key=google_api_key.key
-    )
-    
     # Process the destination
     destination_name = extract_destination(query)
     if not destination_name:
@@ -67,68 +111,25 @@ def generate_itinerary(request):
             status=status.HTTP_400_BAD_REQUEST
         )
     
-    # Get or create destination
-    destination_coords = get_coordinates(destination_name)
-    if destination_coords:
-        latitude, longitude = destination_coords
-        destination, created = Destination.objects.get_or_create(
-            name=destination_name,
-            defaults={
-                'latitude': latitude,
-                'longitude': longitude
-            }
-        )
-    else:
-        destination, created = Destination.objects.get_or_create(name=destination_name)
-    
-    # Generate itinerary
-    itinerary_content = travel_agent.generate_itinerary(query)
-    
-    # Check for errors
-    if itinerary_content.startswith("Error") or itinerary_content.startswith("I couldn't"):
-        return Response(
-            {"error": itinerary_content}, 
-            status=status.HTTP_500_INTERNAL_SERVER_ERROR
-        )
-    
-    # Create itinerary
-    itinerary = Itinerary.objects.create(
+    job = submit_itinerary_job(
+        query=query,
+        destination_name=destination_name,
         title=f"Trip to {destination_name}",
-        destination=destination,
-        content=itinerary_content
+        source='api'
     )
     
-    # Parse itinerary days
-    days_dict = parse_itinerary_to_days(itinerary_content)
-    for day_num, content in days_dict.items():
-        day_number = int(day_num.replace('Day ', ''))
-        ItineraryDay.objects.create(
-            itinerary=itinerary,
-            day_number=day_number,
-            content=content
-        )
-    
-    # Extract and create places
-    places = extract_places_from_itinerary(itinerary_content)
-    for place_name in places:
-        # Get coordinates for the place
-        place_coords = get_coordinates(f"{place_name}, {destination_name}")
-        if place_coords:
-            latitude, longitude = place_coords
-            Place.objects.create(
-                name=place_name,
-                itinerary=itinerary,
-                latitude=latitude,
-                longitude=longitude
-            )
-        else:
-            Place.objects.create(
-                name=place_name,
-                itinerary=itinerary
-            )
-    
-    # Return the created itinerary
-    serializer = ItinerarySerializer(itinerary)
+    serializer = ItineraryJobSerializer(job)
+    return Response(serializer.data, status=status.HTTP_202_ACCEPTED)
+
+@api_view(['GET'])
+def job_status(request, pk):
+    """
+    Report the progress of an itinerary job.
+    """
+    job = get_object_or_404(ItineraryJob, pk=pk)
+    if job.status in ('pending', 'running') and fail_stale_jobs():
+        job.refresh_from_db()
+    serializer = ItineraryJobSerializer(job)
     return Response(serializer.data)
 
 @api_view(['GET'])
@@ -136,8 +137,9 @@ def check_api_keys(request):
     """
     Check if API keys are configured.
     """
-    serper_key = ApiKey.objects.filter(name='serper').first()
-    google_key = ApiKey.objects.filter(name='google').first()
+    api_keys = get_api_keys()
+    serper_key = api_keys.get('serper')
+    google_key = api_keys.get('google')
     
     keys = []
     if serper_key:
@@ -152,9 +154,10 @@ def chat_message(request):
     """
     Process a chat message using the travel agent.
     """
-    # Get API keys from database
-    serper_api_key = ApiKey.objects.filter(name='serper').first()
-    google_api_key = ApiKey.objects.filter(name='google').first()
+    # Get API keys from the in-memory key cache
+    api_keys = get_api_keys()
+    serper_api_key = api_keys.get('serper')
+    google_api_key = api_keys.get('google')
     
     if not serper_api_key or not google_api_key:
         return Response(
@@ -177,7 +180,7 @@ def chat_message(request):
     )
     
     # Initialize travel agent
-    travel_agent = TravelAgent(
+    travel_agent = get_travel_agent(
         serper_api_key=serper_api_key.key,
         google_api_key=google_api_key.key
     )
@@ -0,0 +1,129 @@
+"""Coroutine versions of the chat endpoints, used under ASGI.
+
+LLM calls are awaited instead of holding a thread each, so one ASGI
+worker can wait on many slow requests at once.
+Itineraries are generated by background jobs, as under WSGI.
+The database is still accessed through Django's sync ORM, via
+``sync_to_async`` or the ORM's async methods.
+"""
+import json
+
+from asgiref.sync import sync_to_async
+from django.http import JsonResponse, StreamingHttpResponse
+
+from .jobs import load_api_keys
+from .models import Message
+from .views import _queue_itinerary, _sse_event
+
+from travel_agent import get_travel_agent
+
+async def _travel_agent():
+    return get_travel_agent(**await sync_to_async(load_api_keys)())
+
+async def chat_message(request):
+    """Handle chat messages and generate responses"""
+    if request.method != 'POST':
+        return JsonResponse({'error': 'Invalid request'}, status=400)
+
+    data = json.loads(request.body)
+    user_message = data.get('message', '')
+
+    # Save the user message
+    await Message.objects.acreate(role='user', content=user_message)
+
+    # Check if it's a command to add a location to the itinerary
+    if user_message.startswith('/add'):
+        try:
+            # Generate the itinerary in the background; the client polls the job
+            response_message, job = await sync_to_async(_queue_itinerary)(user_message[4:].strip())
+        except Exception as e:
+            error_message = f"Sorry, I couldn't create an itinerary: {str(e)}"
+            await Message.objects.acreate(role='assistant', content=error_message)
+            return JsonResponse({'message': error_message}, status=500)
+
+        saved = await Message.objects.acreate(role='assistant', content=response_message)
+        if job is None:
+            return JsonResponse({'message': response_message, 'message_id': saved.id})
+        return JsonResponse({
+            'message': response_message,
+            'message_id': saved.id,
+            'job_id': job.id
+        }, status=202)
+
+    # Regular travel question
+    try:
+        travel_agent = await _travel_agent()
+        response = await travel_agent.aanswer_travel_question(user_message)
+
+        await Message.objects.acreate(role='assistant', content=response)
+
+        return JsonResponse({'message': response})
+    except Exception as e:
+        error_message = f"Sorry, I couldn't answer that: {str(e)}"
+        await Message.objects.acreate(role='assistant', content=error_message)
+        return JsonResponse({'message': error_message}, status=500)
+
+async def _stream_answer(user_message):
+    """Yield SSE frames for the answer to a travel question"""
+    chunks = []
+    try:
+        travel_agent = await _travel_agent()
+        is_valid, message = travel_agent.validate_configuration()
+        if not is_valid:
+            chunks.append(message)
+            yield _sse_event('token', {'text': message})
+        else:
+            prompt = travel_agent.build_question_prompt(user_message)
+            async for chunk in await travel_agent.agenerate_text(prompt, stream=True):
+                chunks.append(chunk)
+                yield _sse_event('token', {'text': chunk})
+    except Exception as e:
+        error_message = f"Sorry, I couldn't answer that: {str(e)}"
+        saved = await Message.objects.acreate(role='assistant', content=error_message)
+        yield _sse_event('error', {'message': error_message, 'message_id': saved.id})
+        return
+
+    # Persist the complete answer once the stream has finished
+    response = ''.join(chunks)
+    saved = await Message.objects.acreate(role='assistant', content=response)
+    yield _sse_event('done', {'message': response, 'message_id': saved.id})
+
+async def _stream_itinerary(content):
+    """Yield the SSE frame acknowledging a /add command"""
+    try:
+        response_message, job = await sync_to_async(_queue_itinerary)(content)
+    except Exception as e:
+        error_message = f"Sorry, I couldn't create an itinerary: {str(e)}"
+        saved = await Message.objects.acreate(role='assistant', content=error_message)
+        yield _sse_event('error', {'message': error_message, 'message_id': saved.id})
+        return
+
+    saved = await Message.objects.acreate(role='assistant', content=response_message)
+    data = {'message': response_message, 'message_id': saved.id}
+    if job is not None:
+        data['job_id'] = job.id
+    yield _sse_event('done', data)
+
+async def chat_stream(request):
+    """Handle a chat message and stream the response as Server-Sent Events
+
+    Emits the same events as the sync ``views.chat_stream``.
+    """
+    if request.method != 'POST':
+        return JsonResponse({'error': 'Invalid request'}, status=400)
+
+    data = json.loads(request.body)
+    user_message = data.get('message', '')
+
+    # Save the user message
+    await Message.objects.acreate(role='user', content=user_message)
+
+    if user_message.startswith('/add'):
+        events = _stream_itinerary(user_message[4:].strip())
+    else:
+        events = _stream_answer(user_message)
+
+    response = StreamingHttpResponse(events, content_type='text/event-stream')
+    response['Cache-Control'] = 'no-cache'
+    response['X-Accel-Buffering'] = 'no'
+    return response
@@ -0,0 +1,69 @@
+_BASE32 = '0123456789bcdefghjkmnpqrstuvwxyz'
+
+# Precision stored on places: 9 characters is a cell of roughly 5 x 5 m
+GEOHASH_PRECISION = 9
+
+def encode(latitude, longitude, precision=GEOHASH_PRECISION):
+    """Return the geohash of a point, e.g. ``encode(48.8584, 2.2945, 7) == 'u09tunq'``."""
+    lat_range = [-90.0, 90.0]
+    lon_range = [-180.0, 180.0]
+    chars = []
+    bits = 0
+    value = 0
+    even = True
+    while len(chars) < precision:
+        # Bits alternate between longitude and latitude, starting with longitude
+        if even:
+            rng, coordinate = lon_range, longitude
+        else:
+            rng, coordinate = lat_range, latitude
+        middle = (rng[0] + rng[1]) / 2
+        value <<= 1
+        if coordinate >= middle:
+            value |= 1
+            rng[0] = middle
+        else:
+            rng[1] = middle
+        even = not even
+        bits += 1
+        if bits == 5:
+            chars.append(_BASE32[value])
+            bits = 0
+            value = 0
+    return ''.join(chars)
+
+def cell_size(precision):
+    """Return the ``(latitude, longitude)`` span in degrees of a cell."""
+    lon_bits = (5 * precision + 1) // 2
+    lat_bits = 5 * precision // 2
+    return 180.0 / 2 ** lat_bits, 360.0 / 2 ** lon_bits
+
+def covering_cells(min_lat, min_lon, max_lat, max_lon, max_cells=32):
+    """Return geohash prefixes whose cells together cover a bounding box.
+
+    Uses the finest precision that needs at most ``max_cells`` cells, so a
+    small viewport is covered by a few small cells and a whole continent by
+    a few short prefixes. The box must not cross the antimeridian.
+    """
+    min_lat, max_lat = max(min_lat, -90.0), min(max_lat, 90.0)
+    min_lon, max_lon = max(min_lon, -180.0), min(max_lon, 180.0)
+    for precision in range(GEOHASH_PRECISION, 0, -1):
+        lat_step, lon_step = cell_size(precision)
+        rows = int(max_lat // lat_step) - int(min_lat // lat_step) + 1
+        columns = int(max_lon // lon_step) - int(min_lon // lon_step) + 1
+        if rows * columns <= max_cells or precision == 1:
+            break
+
+    cells = set()
+    lat = min_lat
+    while True:
+        lon = min_lon
+        while True:
+            cells.add(encode(lat, lon, precision))
+            if lon >= max_lon:
+                break
+            lon = min(lon + lon_step, max_lon)
+        if lat >= max_lat:
+            break
+        lat = min(lat + lat_step, max_lat)
+    return sorted(cells)
@@ -0,0 +1,373 @@
+import os
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from datetime import timedelta
+
+from django.conf import settings
+from django.db import close_old_connections, transaction
+from django.db.models import Value, prefetch_related_objects
+from django.db.models.functions import Lower
+from django.utils import timezone
+
+from .keys import get_api_keys
+from .pipeline import Pipeline
+from .places import PlaceRegistry
+from .models import Destination, Itinerary, ItineraryDay, Place, Message, ItineraryJob
+
+from travel_agent import get_travel_agent
+from metrics import span, timed
+import utils
+
+# Progress reported for each pipeline stage, in the order they run
+STAGE_PROGRESS = {
+    'queued': 0,
+    'searching': 10,
+    'generating': 30,
+    'parsing': 70,
+    'extracting': 75,
+    'geocoding': 80,
+    'saving': 95,
+    'completed': 100,
+}
+
+_executor = None
+_executor_lock = threading.Lock()
+
+def _get_executor():
+    """Return the process-wide worker pool, creating it on first use."""
+    global _executor
+    with _executor_lock:
+        if _executor is None:
+            _executor = ThreadPoolExecutor(
+                max_workers=getattr(settings, 'ITINERARY_JOB_WORKERS', 2),
+                thread_name_prefix='itinerary-job'
+            )
+        return _executor
+
+def load_api_keys():
+    """Return the configured API keys, falling back to environment variables."""
+    try:
+        keys = get_api_keys()
+    except Exception as e:
+        print(f"Warning: Could not load API keys: {e}")
+        keys = {}
+
+    return {
+        'serper_api_key': keys['serper'].key if 'serper' in keys else os.getenv('SERPER_API_KEY'),
+        'google_api_key': keys['google'].key if 'google' in keys else os.getenv('GOOGLE_API_KEY'),
+    }
+
+def submit_itinerary_job(query, destination_name, title, source='api'):
+    """Create an itinerary job and queue it on the local worker pool."""
+    job = ItineraryJob.objects.create(
+        query=query,
+        destination_name=destination_name,
+        title=title,
+        source=source
+    )
+    # Only hand the job to a worker once its row is visible to other connections
+    transaction.on_commit(lambda: _get_executor().submit(run_itinerary_job, job.id))
+    return job
+
+def fail_stale_jobs():
+    """Mark jobs that stopped making progress as failed and return how many.
+
+    Jobs run on in-process threads, so a restart loses the ones it was
+    running or had queued. Their rows would stay pending or running forever;
+    once they haven't been updated for ITINERARY_JOB_TIMEOUT seconds they
+    are failed so clients stop polling them.
+    """
+    cutoff = timezone.now() - timedelta(seconds=getattr(settings, 'ITINERARY_JOB_TIMEOUT', 900))
+    stale = ItineraryJob.objects.filter(status__in=['pending', 'running'], updated_at__lt=cutoff)
+    message = "Sorry, I couldn't create an itinerary: it was interrupted before it finished. Please try again."
+    failed = 0
+    for job in stale:
+        # Skip jobs that made progress since they were read
+        if ItineraryJob.objects.filter(pk=job.pk, status=job.status, updated_at=job.updated_at).update(
+            status='failed', message=message, updated_at=timezone.now()
+        ):
+            failed += 1
+            if job.source == 'chat':
+                Message.objects.create(role='assistant', content=message)
+    return failed
+
+class JobAbandoned(Exception):
+    """Raised when a running job's row was failed meanwhile, e.g. by ``fail_stale_jobs``."""
+
+def _transition(job, statuses, **fields):
+    """Update a job only while its status is one of ``statuses``; return whether it was.
+
+    Like the sweep, this is a conditional UPDATE, so a job that was already
+    failed is never revived by the thread that was still running it.
+    """
+    updated = ItineraryJob.objects.filter(pk=job.pk, status__in=statuses).update(
+        updated_at=timezone.now(), **fields
+    )
+    for name, value in fields.items():
+        setattr(job, name, value)
+    return bool(updated)
+
+def _set_stage(job, stage):
+    if not _transition(job, ['running'], stage=stage, progress=STAGE_PROGRESS[stage]):
+        raise JobAbandoned(f"Itinerary job {job.pk} is no longer running")
+
+def _ignore_stage(stage):
+    pass
+
+@timed("itinerary.gather_context")
+def gather_trip_context(travel_agent, query, destination_name, on_stage=_ignore_stage):
+    """Search for a trip's context and return the arguments of build_itinerary_prompt."""
+    is_valid, message = travel_agent.validate_configuration()
+    if not is_valid:
+        raise ValueError(message)
+
+    personalities, date_str = travel_agent.trip_preferences(query)
+
+    on_stage('searching')
+    context = travel_agent.search_context(destination_name, personalities, date_str)
+    if not context:
+        raise ValueError(f"I couldn't find travel information for {destination_name}. Please try another destination or check your internet connection.")
+
+    return {
+        'destination': destination_name,
+        'personalities': personalities,
+        'date_str': date_str,
+        'context': context,
+    }
+
+def find_destination(name):
+    """Return the Destination called ``name`` ignoring case, or None.
+
+    Compares ``LOWER(name)`` so the lookup is served by the case-insensitive
+    unique index on destinations.
+    """
+    return Destination.objects.alias(name_lower=Lower('name')).filter(
+        name_lower=Lower(Value(name))
+    ).first()
+
+def _structured_day_places(structured_days):
+    """Return ``(day_number, place_name)`` for each distinct place in structured days."""
+    day_places = []
+    seen = set()
+    for day in structured_days:
+        for slot in day['slots']:
+            key = slot['place_name'].lower()
+            if len(key) > 3 and key not in seen and key not in utils.NON_PLACE_WORDS:
+                seen.add(key)
+                day_places.append((day['day_number'], slot['place_name']))
+    return day_places
+
+def _geocode_itinerary(content, structured_days, destination_name, registry, on_stage=_ignore_stage):
+    """Parse an itinerary and resolve its places.
+
+    Places already registered for the destination keep their coordinates;
+    only the others are geocoded. Returns the content, the days, the
+    ``(day_number, place_name)`` pairs and the entity of each place.
+    """
+    on_stage('parsing')
+    content, days = _itinerary_days(content, structured_days)
+
+    on_stage('extracting')
+    day_places = _itinerary_day_places(content, structured_days)
+
+    on_stage('geocoding')
+    names, entities, unknown = _match_places(registry, day_places)
+    _register_places(registry, names, entities, unknown, utils.geocode_many(unknown, context=destination_name))
+    return content, days, day_places, entities
+
+def _destination_coords(destination_name, destination):
+    """Geocode the destination, unless it is already saved with coordinates."""
+    if destination and destination.latitude and destination.longitude:
+        return None
+    return utils.get_coordinates(destination_name)
+
+def _itinerary_days(content, structured_days):
+    """Return the itinerary's content and a dict of each day's content."""
+    if structured_days:
+        days = {day['day_number']: utils.render_itinerary_day(day) for day in structured_days}
+        return "\n\n".join(days.values()), days
+    return content, utils.parse_itinerary_to_days(content)
+
+def _itinerary_day_places(content, structured_days):
+    """Return ``(day_number, place_name)`` for the places of an itinerary."""
+    if structured_days:
+        return _structured_day_places(structured_days)
+    day_places = []
+    for day_num, place_names in utils.extract_places_by_day(content).items():
+        for place_name in place_names:
+            day_places.append((day_num, place_name))
+    return day_places
+
+def _destination_registry(destination_name):
+    destination = find_destination(destination_name)
+    return destination, PlaceRegistry(destination)
+
+def _match_places(registry, day_places):
+    """Match place names against the registry; return the names, entities and unknown names."""
+    names = [place_name for _, place_name in day_places]
+    entities = [registry.match(name) for name in names]
+    unknown = [name for name, entity in zip(names, entities) if entity is None]
+    return names, entities, unknown
+
+def _register_places(registry, names, entities, unknown, coordinates):
+    """Add the geocoded unknown places to the registry, filling in ``entities``."""
+    geocoded = dict(zip(unknown, coordinates))
+    for i, name in enumerate(names):
+        if entities[i] is None and geocoded[name]:
+            entities[i] = registry.add(name, geocoded[name])
+
+def _itinerary_places(day_places, entities):
+    return [
+        Place(
+            name=place_name,
+            description=f"Day {day_num}",
+            latitude=entity.latitude if entity else None,
+            longitude=entity.longitude if entity else None
+        )
+        for (day_num, place_name), entity in zip(day_places, entities)
+    ]
+
+@timed("db.save_itinerary")
+def save_itinerary(destination, destination_coords, title, content, days, places, registry=None):
+    """Write an itinerary with its days and places in a single transaction.
+
+    ``destination`` is a Destination or the name of one to create, ``days``
+    maps day numbers to their content and ``places`` are unsaved Place rows.
+    When a PlaceRegistry is given, its new entities are saved too and every
+    place is linked to the entity matching its name.
+    Rows are inserted with ``bulk_create`` so the number of queries doesn't
+    grow with the size of the itinerary, and the returned Itinerary comes
+    with its days and places already prefetched.
+    """
+    with transaction.atomic():
+        if not isinstance(destination, Destination):
+            destination = find_destination(destination) or Destination(name=destination)
+        if destination_coords:
+            destination.latitude, destination.longitude = destination_coords
+        if destination.pk is None or destination_coords:
+            destination.save()
+
+        itinerary = Itinerary.objects.create(
+            title=title,
+            destination=destination,
+            content=content
+        )
+        ItineraryDay.objects.bulk_create(
+            ItineraryDay(itinerary=itinerary, day_number=day_num, content=day_content)
+            for day_num, day_content in days.items()
+        )
+        if registry is not None:
+            registry.save(destination)
+        for place in places:
+            place.itinerary = itinerary
+            place.update_geohash()
+            if registry is not None:
+                place.entity = registry.match(place.name)
+        Place.objects.bulk_create(places)
+
+    prefetch_related_objects([itinerary], 'days', 'places')
+    return itinerary
+
+def _generate_itinerary(travel_agent, trip, on_stage):
+    """Ask the LLM for the itinerary; return ``(content, structured_days)``."""
+    on_stage('generating')
+    if getattr(settings, 'ITINERARY_STRUCTURED_OUTPUT', True):
+        structured_days = travel_agent.generate_structured_itinerary(
+            travel_agent.build_itinerary_prompt(**trip, structured=True)
+        )
+        if structured_days:
+            return None, structured_days
+
+    # Fall back to Markdown output parsed with the regex extractor
+    return travel_agent.generate_text(travel_agent.build_itinerary_prompt(**trip)), None
+
+def _run_pipeline(job):
+    """Run every stage of itinerary generation and return the new Itinerary.
+
+    Loading and geocoding the destination don't depend on the search or the
+    LLM, so they run alongside them, and the places are geocoded as soon as
+    the generated days are parsed. The destination name and the trip
+    preferences are parsed once, when the job is queued and by the search
+    stage respectively.
+    """
+    on_stage = lambda stage: _set_stage(job, stage)
+    travel_agent = get_travel_agent(**load_api_keys())
+    destination_name = job.destination_name
+
+    def trip():
+        return gather_trip_context(travel_agent, job.query, destination_name, on_stage)
+
+    def destination():
+        return _destination_registry(destination_name)
+
+    def destination_coords(destination):
+        return _destination_coords(destination_name, destination[0])
+
+    def generated(trip):
+        return _generate_itinerary(travel_agent, trip, on_stage)
+
+    def places(generated, destination):
+        content, structured_days = generated
+        return _geocode_itinerary(content, structured_days, destination_name, destination[1], on_stage)
+
+    def itinerary(places, destination, destination_coords):
+        content, days, day_places, entities = places
+        on_stage('saving')
+        # The itinerary is only kept if the job is still running when it's saved
+        with transaction.atomic():
+            itinerary = save_itinerary(
+                destination[0] or destination_name, destination_coords, job.title, content, days,
+                _itinerary_places(day_places, entities), destination[1]
+            )
+            if not _transition(
+                job, ['running'],
+                status='completed',
+                stage='completed',
+                progress=STAGE_PROGRESS['completed'],
+                itinerary=itinerary,
+                message=f"I've created an itinerary for {job.destination_name}. You can see it in the itinerary panel."
+            ):
+                raise JobAbandoned(f"Itinerary job {job.pk} is no longer running")
+        return itinerary
+
+    pipeline = Pipeline()
+    pipeline.stage('trip', trip)
+    pipeline.stage('destination', destination)
+    pipeline.stage('destination_coords', destination_coords, after=['destination'])
+    pipeline.stage('generated', generated, after=['trip'])
+    pipeline.stage('places', places, after=['generated', 'destination'])
+    pipeline.stage('itinerary', itinerary, after=['places', 'destination', 'destination_coords'])
+    return pipeline.run()['itinerary']
+
+def run_itinerary_job(job_id):
+    """Execute a queued itinerary job, recording progress and the outcome.
+
+    A job that is no longer pending when a worker picks it up, or that is
+    failed while it runs, is dropped without saving its itinerary or
+    posting a chat message.
+    """
+    close_old_connections()
+    try:
+        job = ItineraryJob.objects.get(pk=job_id)
+        if not _transition(job, ['pending'], status='running'):
+            return
+
+        try:
+            with span("itinerary.job"):
+                _run_pipeline(job)
+        except JobAbandoned as e:
+            print(e)
+            return
+        except Exception as e:
+            print(f"Itinerary job {job_id} failed: {e}")
+            message = f"Sorry, I couldn't create an itinerary: {str(e)}"
+            if _transition(job, ['running'], status='failed', message=message) and job.source == 'chat':
+                Message.objects.create(role='assistant', content=message)
+            return
+
+        if job.source == 'chat':
+            Message.objects.create(role='assistant', content=job.message)
+    except Exception as e:
+        print(f"Error running itinerary job {job_id}: {e}")
+    finally:
+        close_old_connections()
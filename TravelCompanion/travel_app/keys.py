@@ -0,0 +1,38 @@
+import threading
+
+from caching import VersionStamp
+
+from .models import ApiKey
+
+# Every process keeps the API keys in memory. Saving or deleting a key bumps
+# this stamp so other worker processes reload them on their next request.
+_version = VersionStamp('api_keys')
+_lock = threading.Lock()
+_keys = None
+_keys_version = None
+
+def get_api_keys():
+    """Return a dict of every configured ApiKey, indexed by name.
+
+    The keys are loaded with a single query and then served from memory
+    until a key changes in this or any other worker process.
+    """
+    global _keys, _keys_version
+    version = _version.current()
+    with _lock:
+        if _keys is not None and _keys_version == version:
+            return dict(_keys)
+
+    # Read the stamp before querying, so a change made while loading
+    # triggers another reload instead of being missed
+    keys = {api_key.name: api_key for api_key in ApiKey.objects.all()}
+    with _lock:
+        _keys, _keys_version = keys, version
+    return dict(keys)
+
+def invalidate_api_keys():
+    """Drop the cached keys here and in every other worker process."""
+    global _keys
+    with _lock:
+        _keys = None
+    _version.bump()
@@ -0,0 +1,42 @@
+import time
+
+from asgiref.sync import iscoroutinefunction, markcoroutinefunction
+
+from metrics import HTTP_REQUESTS, HTTP_SECONDS
+
+class MetricsMiddleware:
+    """Count requests and time responses per view for the /metrics endpoint.
+
+    Supports both sync and async request handling, so async views served
+    under ASGI aren't pushed back onto a thread by this middleware.
+    """
+
+    sync_capable = True
+    async_capable = True
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+        self.async_mode = iscoroutinefunction(get_response)
+        if self.async_mode:
+            markcoroutinefunction(self)
+
+    def __call__(self, request):
+        if self.async_mode:
+            return self.__acall__(request)
+        start = time.perf_counter()
+        response = self.get_response(request)
+        self._record(request, response, time.perf_counter() - start)
+        return response
+
+    async def __acall__(self, request):
+        start = time.perf_counter()
+        response = await self.get_response(request)
+        self._record(request, response, time.perf_counter() - start)
+        return response
+
+    def _record(self, request, response, elapsed):
+        # Label by URL pattern name rather than path to keep the label set small
+        match = request.resolver_match
+        view = (match.view_name or match._func_path) if match else 'unmatched'
+        HTTP_SECONDS.observe(elapsed, method=request.method, view=view)
+        HTTP_REQUESTS.inc(method=request.method, view=view, status=response.status_code)
@@ -0,0 +1,63 @@
+# Generated by Django 5.2.18 on 2026-10-17 04:38
+
+import django.db.models.functions.text
+from django.db import migrations, models
+
+
+def remove_duplicates(apps, schema_editor):
+    """Drop duplicate rows that would violate the new unique constraints.
+
+    The first key (lowest id) is kept for each API key name: the app looked
+    keys up with ``.first()``, so that is the key it was using. Destinations
+    whose names only differ by case are merged into the oldest one,
+    preferring a row with coordinates, and their itineraries are moved over.
+    """
+    ApiKey = apps.get_model('travel_app', 'ApiKey')
+    Destination = apps.get_model('travel_app', 'Destination')
+    Itinerary = apps.get_model('travel_app', 'Itinerary')
+
+    seen = set()
+    for api_key in ApiKey.objects.order_by('id'):
+        if api_key.name in seen:
+            api_key.delete()
+        else:
+            seen.add(api_key.name)
+
+    groups = {}
+    for destination in Destination.objects.order_by('id'):
+        groups.setdefault(destination.name.lower(), []).append(destination)
+    for destinations in groups.values():
+        if len(destinations) < 2:
+            continue
+        keep = next((d for d in destinations if d.latitude is not None), destinations[0])
+        duplicates = [d.id for d in destinations if d.id != keep.id]
+        Itinerary.objects.filter(destination_id__in=duplicates).update(destination=keep)
+        Destination.objects.filter(id__in=duplicates).delete()
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('travel_app', '0003_message_timestamp_id_idx'),
+    ]
+
+    operations = [
+        migrations.RunPython(remove_duplicates, migrations.RunPython.noop),
+        migrations.AlterField(
+            model_name='apikey',
+            name='name',
+            field=models.CharField(max_length=100, unique=True),
+        ),
+        migrations.AddIndex(
+            model_name='itinerary',
+            index=models.Index(fields=['created_at', 'id'], name='itinerary_created_at_id_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='place',
+            index=models.Index(fields=['itinerary', 'description'], name='place_itinerary_day_idx'),
+        ),
+        migrations.AddConstraint(
+            model_name='destination',
+            constraint=models.UniqueConstraint(django.db.models.functions.text.Lower('name'), name='destination_name_ci_unique'),
+        ),
+    ]
@@ -0,0 +1,38 @@
+# Generated by Django 5.2.18 on 2026-10-17 05:10
+
+from django.db import migrations, models
+
+from travel_app import geohash
+
+
+def fill_geohashes(apps, schema_editor):
+    Place = apps.get_model('travel_app', 'Place')
+    places = Place.objects.filter(latitude__isnull=False, longitude__isnull=False).only('id', 'latitude', 'longitude')
+    batch = []
+    for place in places.iterator(chunk_size=2000):
+        place.geohash = geohash.encode(place.latitude, place.longitude)
+        batch.append(place)
+        if len(batch) >= 2000:
+            Place.objects.bulk_update(batch, ['geohash'])
+            batch = []
+    Place.objects.bulk_update(batch, ['geohash'])
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('travel_app', '0005_itinerary_updated_at'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='place',
+            name='geohash',
+            field=models.CharField(blank=True, editable=False, max_length=12, null=True),
+        ),
+        migrations.AddIndex(
+            model_name='place',
+            index=models.Index(fields=['geohash'], name='place_geohash_idx'),
+        ),
+        migrations.RunPython(fill_geohashes, migrations.RunPython.noop),
+    ]
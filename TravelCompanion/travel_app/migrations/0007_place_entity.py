@@ -0,0 +1,82 @@
+# Generated by Django 5.2.18 on 2026-10-17 05:24
+
+import re
+import unicodedata
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+# Frozen copy of travel_app.places.normalize_place_name as of this migration,
+# so later changes to the live normalizer don't change what it does
+_LEADING_ARTICLE = re.compile(r'^(?:the|le|la|les|l|el|il|lo|der|die|das) ')
+
+
+def normalize_place_name(name):
+    text = unicodedata.normalize('NFKD', str(name))
+    text = ''.join(c if c.isalnum() else ' ' for c in text if not unicodedata.combining(c))
+    return _LEADING_ARTICLE.sub('', ' '.join(text.lower().split()))
+
+
+def register_existing_places(apps, schema_editor):
+    """Create an entity per distinct place name and destination, and link places to it."""
+    Place = apps.get_model('travel_app', 'Place')
+    PlaceEntity = apps.get_model('travel_app', 'PlaceEntity')
+
+    entities = {}
+    batch = []
+    places = Place.objects.filter(
+        latitude__isnull=False, longitude__isnull=False
+    ).select_related('itinerary').order_by('id')
+    for place in places.iterator(chunk_size=2000):
+        key = normalize_place_name(place.name)[:200]
+        if not key:
+            continue
+        entity_key = (place.itinerary.destination_id, key)
+        entity = entities.get(entity_key)
+        if entity is None:
+            entity = entities[entity_key] = PlaceEntity.objects.create(
+                name=place.name[:200],
+                normalized_name=key,
+                destination_id=place.itinerary.destination_id,
+                latitude=place.latitude,
+                longitude=place.longitude
+            )
+        place.entity = entity
+        batch.append(place)
+        if len(batch) >= 2000:
+            Place.objects.bulk_update(batch, ['entity'])
+            batch = []
+    Place.objects.bulk_update(batch, ['entity'])
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('travel_app', '0006_place_geohash'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='PlaceEntity',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('name', models.CharField(max_length=200)),
+                ('normalized_name', models.CharField(max_length=200)),
+                ('latitude', models.FloatField()),
+                ('longitude', models.FloatField()),
+                ('created_at', models.DateTimeField(auto_now_add=True)),
+                ('destination', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='place_entities', to='travel_app.destination')),
+            ],
+        ),
+        migrations.AddField(
+            model_name='place',
+            name='entity',
+            field=models.ForeignKey(blank=True, null=True, on_delete=django.db.models.deletion.SET_NULL, related_name='places', to='travel_app.placeentity'),
+        ),
+        migrations.AddConstraint(
+            model_name='placeentity',
+            constraint=models.UniqueConstraint(fields=('destination', 'normalized_name'), name='place_entity_unique_name'),
+        ),
+        migrations.RunPython(register_existing_places, migrations.RunPython.noop),
+    ]
@@ -1,7 +1,10 @@
 from django.db import models
+from django.db.models.functions import Lower
+
+from . import geohash
 
 class ApiKey(models.Model):
-    name = models.CharField(max_length=100)
+    name = models.CharField(max_length=100, unique=True)
     key = models.CharField(max_length=255)
     created_at = models.DateTimeField(auto_now_add=True)
     
@@ -14,6 +17,11 @@ class Destination(models.Model):
     longitude = models.FloatField(null=True, blank=True)
     created_at = models.DateTimeField(auto_now_add=True)
     
+    class Meta:
+        constraints = [
+            models.UniqueConstraint(Lower('name'), name='destination_name_ci_unique'),
+        ]
+    
     def __str__(self):
         return self.name
 
@@ -22,6 +30,13 @@ class Itinerary(models.Model):
     destination = models.ForeignKey(Destination, on_delete=models.CASCADE, related_name='itineraries')
     content = models.TextField()
     created_at = models.DateTimeField(auto_now_add=True)
+    # Bumped whenever the itinerary, its places or its destination change
+    updated_at = models.DateTimeField(auto_now=True)
+    
+    class Meta:
+        indexes = [
+            models.Index(fields=['created_at', 'id'], name='itinerary_created_at_id_idx'),
+        ]
     
     def __str__(self):
         return self.title
@@ -37,15 +52,56 @@ class ItineraryDay(models.Model):
     def __str__(self):
         return f"{self.itinerary.title} - Day {self.day_number}"
 
+class PlaceEntity(models.Model):
+    """A canonical place of a destination, geocoded once and shared by itineraries."""
+    name = models.CharField(max_length=200)
+    # Folded name used to recognise the same place, e.g. "louvre museum"
+    normalized_name = models.CharField(max_length=200)
+    destination = models.ForeignKey(Destination, on_delete=models.CASCADE, related_name='place_entities')
+    latitude = models.FloatField()
+    longitude = models.FloatField()
+    created_at = models.DateTimeField(auto_now_add=True)
+    
+    class Meta:
+        constraints = [
+            models.UniqueConstraint(fields=['destination', 'normalized_name'], name='place_entity_unique_name'),
+        ]
+    
+    def __str__(self):
+        return self.name
+
 class Place(models.Model):
     name = models.CharField(max_length=200)
     itinerary = models.ForeignKey(Itinerary, on_delete=models.CASCADE, related_name='places')
+    entity = models.ForeignKey(PlaceEntity, on_delete=models.SET_NULL, null=True, blank=True, related_name='places')
     latitude = models.FloatField(null=True, blank=True)
     longitude = models.FloatField(null=True, blank=True)
     description = models.TextField(blank=True, null=True)
+    # Geohash of the coordinates, indexed for bounding box and radius queries
+    geohash = models.CharField(max_length=12, null=True, blank=True, editable=False)
+    
+    class Meta:
+        indexes = [
+            models.Index(fields=['itinerary', 'description'], name='place_itinerary_day_idx'),
+            models.Index(fields=['geohash'], name='place_geohash_idx'),
+        ]
     
     def __str__(self):
         return self.name
+    
+    def update_geohash(self):
+        """Recompute ``geohash`` from the coordinates; call before bulk_create."""
+        if self.latitude is None or self.longitude is None:
+            self.geohash = None
+        else:
+            self.geohash = geohash.encode(self.latitude, self.longitude)
+    
+    def save(self, *args, **kwargs):
+        self.update_geohash()
+        update_fields = kwargs.get('update_fields')
+        if update_fields is not None and {'latitude', 'longitude'} & set(update_fields):
+            kwargs['update_fields'] = set(update_fields) | {'geohash'}
+        super().save(*args, **kwargs)
 
 class Message(models.Model):
     ROLE_CHOICES = (
@@ -58,6 +114,35 @@ class Message(models.Model):
     
     class Meta:
         ordering = ['timestamp']
+        indexes = [
+            models.Index(fields=['timestamp', 'id'], name='message_timestamp_id_idx'),
+        ]
+    
+    def __str__(self):
+        return f"{self.role}: {self.content[:50]}..."
+
+class ItineraryJob(models.Model):
+    STATUS_CHOICES = (
+        ('pending', 'Pending'),
+        ('running', 'Running'),
+        ('completed', 'Completed'),
+        ('failed', 'Failed'),
+    )
+    SOURCE_CHOICES = (
+        ('api', 'API'),
+        ('chat', 'Chat'),
+    )
+    query = models.TextField()
+    destination_name = models.CharField(max_length=100)
+    title = models.CharField(max_length=200)
+    source = models.CharField(max_length=20, choices=SOURCE_CHOICES, default='api')
+    status = models.CharField(max_length=20, choices=STATUS_CHOICES, default='pending')
+    stage = models.CharField(max_length=50, default='queued')
+    progress = models.PositiveSmallIntegerField(default=0)
+    message = models.TextField(blank=True)
+    itinerary = models.ForeignKey(Itinerary, on_delete=models.SET_NULL, null=True, blank=True, related_name='jobs')
+    created_at = models.DateTimeField(auto_now_add=True)
+    updated_at = models.DateTimeField(auto_now=True)
     
     def __str__(self):
-        return f"{self.role}: {self.content[:50]}..."
\ No newline at end of file
+        return f"{self.title} ({self.status})"
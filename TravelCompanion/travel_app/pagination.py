@@ -0,0 +1,60 @@
+import base64
+import binascii
+
+from django.db.models import Q
+from django.utils.dateparse import parse_datetime
+
+DEFAULT_PAGE_SIZE = 20
+MAX_PAGE_SIZE = 100
+
+class InvalidCursor(ValueError):
+    """Raised when a pagination cursor cannot be decoded."""
+
+def encode_cursor(value, pk):
+    """Encode a (timestamp, id) position as an opaque URL-safe cursor."""
+    raw = f"{value.isoformat()}|{pk}"
+    return base64.urlsafe_b64encode(raw.encode()).decode()
+
+def decode_cursor(cursor):
+    """Decode a cursor produced by ``encode_cursor`` into (timestamp, id)."""
+    try:
+        raw = base64.urlsafe_b64decode(cursor.encode()).decode()
+        value, pk = raw.rsplit('|', 1)
+        timestamp = parse_datetime(value)
+        if timestamp is None:
+            raise ValueError(value)
+        return timestamp, int(pk)
+    except (ValueError, UnicodeDecodeError, binascii.Error):
+        raise InvalidCursor(f"Invalid cursor: {cursor}")
+
+def parse_limit(value, default=DEFAULT_PAGE_SIZE):
+    """Parse a page size from a query parameter, clamped to MAX_PAGE_SIZE."""
+    try:
+        limit = int(value)
+    except (TypeError, ValueError):
+        return default
+    return max(1, min(limit, MAX_PAGE_SIZE))
+
+def keyset_page(queryset, field, cursor=None, limit=DEFAULT_PAGE_SIZE):
+    """Return one page of ``queryset`` in descending ``(field, id)`` order.
+
+    Instead of an OFFSET the page starts strictly after the row the cursor
+    points at, so every page costs the same single indexed query no matter
+    how deep the client has scrolled. Returns ``(items, next_cursor)`` where
+    ``next_cursor`` is None on the last page.
+    """
+    queryset = queryset.order_by(f'-{field}', '-id')
+    if cursor:
+        value, pk = decode_cursor(cursor)
+        queryset = queryset.filter(
+            Q(**{f'{field}__lt': value}) | Q(**{field: value, 'id__lt': pk})
+        )
+
+    # Fetch one extra row to know whether another page exists
+    items = list(queryset[:limit + 1])
+    next_cursor = None
+    if len(items) > limit:
+        items = items[:limit]
+        last = items[-1]
+        next_cursor = encode_cursor(getattr(last, field), last.pk)
+    return items, next_cursor
@@ -0,0 +1,78 @@
+import threading
+from concurrent.futures import FIRST_COMPLETED, ThreadPoolExecutor, wait
+
+from django.conf import settings
+from django.db import close_old_connections
+
+from metrics import span
+
+_executor = None
+_executor_lock = threading.Lock()
+
+def _get_executor():
+    """Return the process-wide pool running pipeline stages, creating it on first use."""
+    global _executor
+    with _executor_lock:
+        if _executor is None:
+            _executor = ThreadPoolExecutor(
+                max_workers=getattr(settings, 'PIPELINE_STAGE_WORKERS', 8),
+                thread_name_prefix='pipeline-stage'
+            )
+        return _executor
+
+def _run_stage(name, func, kwargs):
+    close_old_connections()
+    try:
+        with span(f"pipeline.{name}"):
+            return func(**kwargs)
+    finally:
+        close_old_connections()
+
+class Pipeline:
+    """Stages that run as soon as the stages they depend on are done.
+
+    Each stage is a function called with the results of its dependencies as
+    keyword arguments, named after those stages. Stages that don't depend on
+    each other run concurrently on a shared worker pool, so the pipeline
+    takes as long as its slowest chain of stages rather than the sum of all
+    of them. Stages can only depend on stages added before them.
+    """
+
+    def __init__(self):
+        self._stages = {}
+
+    def stage(self, name, func, after=()):
+        """Add a stage running ``func`` once every stage in ``after`` is done."""
+        if name in self._stages:
+            raise ValueError(f"Duplicate pipeline stage: {name}")
+        unknown = [dep for dep in after if dep not in self._stages]
+        if unknown:
+            raise ValueError(f"Stage {name} depends on unknown stages: {', '.join(unknown)}")
+        self._stages[name] = (func, tuple(after))
+        return self
+
+    def run(self):
+        """Run every stage and return a dict of their results by name.
+
+        If a stage raises, the stages that haven't started are skipped and
+        the exception is re-raised once the running ones have finished.
+        """
+        results = {}
+        pending = dict(self._stages)
+        running = {}
+        executor = _get_executor()
+        while pending or running:
+            for name, (func, after) in list(pending.items()):
+                if all(dep in results for dep in after):
+                    del pending[name]
+                    kwargs = {dep: results[dep] for dep in after}
+                    running[executor.submit(_run_stage, name, func, kwargs)] = name
+            done, _ = wait(running, return_when=FIRST_COMPLETED)
+            for future in done:
+                name = running.pop(future)
+                try:
+                    results[name] = future.result()
+                except Exception:
+                    wait(running)
+                    raise
+        return results
@@ -0,0 +1,105 @@
+import os
+import re
+
+from gazetteer import fold_name, name_similarity
+
+from .models import PlaceEntity
+
+# Folded names at least this similar are treated as the same place
+PLACE_MATCH_THRESHOLD = float(os.getenv("PLACE_MATCH_THRESHOLD", 0.75))
+
+# Names shorter than this share most of their trigrams even when one letter
+# makes them different places ("hotel roma" and "hotel rome"), so they must
+# be at least SHORT_NAME_THRESHOLD similar
+SHORT_NAME_LENGTH = 12
+SHORT_NAME_THRESHOLD = max(PLACE_MATCH_THRESHOLD, 0.9)
+
+_LEADING_ARTICLE = re.compile(r'^(?:the|le|la|les|l|el|il|lo|der|die|das) ')
+_NUMBER = re.compile(r'\d+')
+
+def normalize_place_name(name):
+    """Return the key identifying a place within a destination.
+
+    ``"The Louvre Museum"`` and ``"louvre museum"`` share the key
+    ``"louvre museum"``.
+    """
+    return _LEADING_ARTICLE.sub('', fold_name(name))
+
+def _same_place(key, other):
+    """Whether two different keys are spellings of the same place."""
+    words, other_words = set(key.split()), set(other.split())
+    # "central park zoo" is not "central park", however similar they look
+    if words < other_words or other_words < words:
+        return False
+    # Nor is "terminal 1" "terminal 2"
+    if _NUMBER.findall(key) != _NUMBER.findall(other):
+        return False
+    threshold = PLACE_MATCH_THRESHOLD
+    if min(len(key), len(other)) < SHORT_NAME_LENGTH:
+        threshold = SHORT_NAME_THRESHOLD
+    return name_similarity(key, other) >= threshold
+
+class PlaceRegistry:
+    """The canonical places of one destination.
+
+    Existing entities are loaded with a single query. Names are matched by
+    key first and then by trigram similarity, so spelling variants resolve
+    to the same entity and don't have to be geocoded again. Places that are
+    not registered yet are added with ``add`` and written by ``save``.
+    """
+
+    def __init__(self, destination=None):
+        self.entities = {}
+        self._new_keys = []
+        self._keys = {}
+        if destination is not None and destination.pk is not None:
+            for entity in PlaceEntity.objects.filter(destination=destination):
+                self.entities[entity.normalized_name] = entity
+
+    def _key(self, name):
+        """Return the key of the entity ``name`` refers to, or None."""
+        if name in self._keys:
+            return self._keys[name]
+        key = normalize_place_name(name)[:200]
+        if key and key not in self.entities:
+            candidates = [other for other in self.entities if _same_place(key, other)]
+            if candidates:
+                key = max(candidates, key=lambda other: name_similarity(key, other))
+        if key in self.entities:
+            # Unregistered names are looked up again, as a variant may be added later
+            self._keys[name] = key
+        return key
+
+    def match(self, name):
+        """Return the entity matching ``name``, or None if it is not registered."""
+        return self.entities.get(self._key(name))
+
+    def add(self, name, coords):
+        """Register a newly geocoded place, returning its (unsaved) entity."""
+        key = self._key(name)
+        if not key:
+            return None
+        entity = self.entities.get(key)
+        if entity is None:
+            entity = PlaceEntity(
+                name=name[:200],
+                normalized_name=key,
+                latitude=coords[0],
+                longitude=coords[1]
+            )
+            self.entities[key] = entity
+            self._new_keys.append(key)
+        return entity
+
+    def save(self, destination):
+        """Insert the entities added since loading, for ``destination``."""
+        if not self._new_keys:
+            return
+        new_entities = [self.entities[key] for key in self._new_keys]
+        for entity in new_entities:
+            entity.destination = destination
+        # Another job may have registered the same place meanwhile; keep its row
+        PlaceEntity.objects.bulk_create(new_entities, ignore_conflicts=True)
+        for entity in PlaceEntity.objects.filter(destination=destination, normalized_name__in=self._new_keys):
+            self.entities[entity.normalized_name] = entity
+        self._new_keys = []
@@ -0,0 +1,51 @@
+from django.conf import settings
+from django.db import transaction
+from django.db.backends.signals import connection_created
+from django.db.models.signals import post_delete, post_save, pre_save
+from django.dispatch import receiver
+from django.utils import timezone
+
+from .keys import invalidate_api_keys
+from .models import ApiKey, Destination, Itinerary, Place
+
+from travel_agent import clear_travel_agents
+
+@receiver(post_save, sender=ApiKey)
+@receiver(post_delete, sender=ApiKey)
+def api_key_changed(sender, **kwargs):
+    """Reload the API keys and rebuild travel agents on their next use."""
+    transaction.on_commit(invalidate_api_keys)
+    clear_travel_agents()
+
+@receiver(pre_save, sender=Place)
+def place_saving(sender, instance, **kwargs):
+    """Remember which itinerary an existing place belonged to before the save."""
+    if not instance._state.adding:
+        instance._previous_itinerary_id = Place.objects.filter(pk=instance.pk).values_list(
+            'itinerary_id', flat=True
+        ).first()
+
+@receiver(post_save, sender=Place)
+@receiver(post_delete, sender=Place)
+def place_changed(sender, instance, **kwargs):
+    """Mark the itinerary as changed so its map data gets a new ETag.
+
+    A place moved to another itinerary also changes the map of the one it
+    left.
+    """
+    itinerary_ids = {instance.itinerary_id, getattr(instance, '_previous_itinerary_id', None)}
+    Itinerary.objects.filter(pk__in=itinerary_ids - {None}).update(updated_at=timezone.now())
+
+@receiver(post_save, sender=Destination)
+def destination_changed(sender, instance, created, **kwargs):
+    if not created:
+        Itinerary.objects.filter(destination=instance).update(updated_at=timezone.now())
+
+@receiver(connection_created)
+def configure_sqlite(sender, connection, **kwargs):
+    """Apply the SQLITE_PRAGMAS of the database profile to new connections."""
+    if connection.vendor != 'sqlite':
+        return
+    with connection.cursor() as cursor:
+        for pragma, value in getattr(settings, 'SQLITE_PRAGMAS', {}).items():
+            cursor.execute(f"PRAGMA {pragma} = {value}")
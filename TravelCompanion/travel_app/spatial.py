@@ -0,0 +1,109 @@
+import math
+
+import numpy as np
+from django.db.models import Q
+
+from . import geohash
+from .models import Place
+
+EARTH_RADIUS_KM = 6371.0
+
+DEFAULT_RESULT_LIMIT = 500
+MAX_RESULT_LIMIT = 5000
+
+def _cell_filter(min_lat, min_lon, max_lat, max_lon):
+    """Build an OR of geohash ranges covering the box.
+
+    Each prefix becomes ``prefix <= geohash < prefix + '~'`` rather than a
+    LIKE, so SQLite answers every range with a seek on the geohash index.
+    """
+    boxes = [(min_lat, min_lon, max_lat, max_lon)]
+    if min_lon > max_lon:
+        # The box crosses the antimeridian: cover both sides of it
+        boxes = [(min_lat, min_lon, max_lat, 180.0), (min_lat, -180.0, max_lat, max_lon)]
+    condition = Q()
+    for box in boxes:
+        for prefix in geohash.covering_cells(*box):
+            condition |= Q(geohash__gte=prefix, geohash__lt=prefix + '~')
+    return condition
+
+def _bounds_filter(min_lat, min_lon, max_lat, max_lon):
+    """Exact coordinate bounds of the box, checked next to the cell ranges."""
+    condition = Q(latitude__range=(min_lat, max_lat))
+    if min_lon <= max_lon:
+        return condition & Q(longitude__range=(min_lon, max_lon))
+    return condition & (Q(longitude__gte=min_lon) | Q(longitude__lte=max_lon))
+
+def _fetch(min_lat, min_lon, max_lat, max_lon, limit=None):
+    """Return ids, names, descriptions, itinerary ids and coordinates of the places in a box.
+
+    The cells select candidate rows by index and the exact bounds drop the
+    ones outside the box in SQL. With a ``limit`` at most that many rows are
+    read, in id order.
+    """
+    places = Place.objects.filter(
+        _cell_filter(min_lat, min_lon, max_lat, max_lon),
+        _bounds_filter(min_lat, min_lon, max_lat, max_lon),
+    ).values_list('id', 'name', 'description', 'itinerary_id', 'latitude', 'longitude')
+    if limit is not None:
+        places = places.order_by('id')[:limit]
+    rows = list(places)
+    if not rows:
+        return rows, np.empty(0), np.empty(0)
+    coords = np.array([(row[4], row[5]) for row in rows], dtype=float)
+    return rows, coords[:, 0], coords[:, 1]
+
+def _serialize(row, distance=None):
+    place = {
+        'id': row[0],
+        'name': row[1],
+        'description': row[2],
+        'itinerary_id': row[3],
+        'latitude': row[4],
+        'longitude': row[5],
+    }
+    if distance is not None:
+        place['distance_km'] = round(float(distance), 3)
+    return place
+
+def haversine_km(latitude, longitude, latitudes, longitudes):
+    """Distances in km from one point to arrays of points, computed in one pass."""
+    lat1, lon1 = math.radians(latitude), math.radians(longitude)
+    lat2, lon2 = np.radians(latitudes), np.radians(longitudes)
+    a = np.sin((lat2 - lat1) / 2) ** 2 + math.cos(lat1) * np.cos(lat2) * np.sin((lon2 - lon1) / 2) ** 2
+    return 2 * EARTH_RADIUS_KM * np.arcsin(np.sqrt(np.minimum(a, 1.0)))
+
+def places_in_bbox(min_lat, min_lon, max_lat, max_lon, limit=DEFAULT_RESULT_LIMIT):
+    """Return places of every itinerary inside a bounding box.
+
+    ``min_lon`` may be greater than ``max_lon`` for a box crossing the
+    antimeridian. Returns ``(places, truncated)``.
+    """
+    # One extra row tells whether the result was truncated
+    rows, _, _ = _fetch(min_lat, min_lon, max_lat, max_lon, limit + 1)
+    return [_serialize(row) for row in rows[:limit]], len(rows) > limit
+
+def places_near(latitude, longitude, radius_km, limit=DEFAULT_RESULT_LIMIT):
+    """Return places of every itinerary within ``radius_km``, nearest first.
+
+    Returns ``(places, truncated)``; each place has its ``distance_km``.
+    """
+    lat_delta = math.degrees(radius_km / EARTH_RADIUS_KM)
+    min_lat, max_lat = latitude - lat_delta, latitude + lat_delta
+    if min_lat <= -90 or max_lat >= 90:
+        # The circle contains a pole, so it spans every longitude
+        min_lon, max_lon = -180.0, 180.0
+    else:
+        lon_delta = math.degrees(radius_km / (EARTH_RADIUS_KM * math.cos(math.radians(latitude))))
+        if lon_delta >= 180:
+            min_lon, max_lon = -180.0, 180.0
+        else:
+            min_lon = (longitude - lon_delta + 180) % 360 - 180
+            max_lon = (longitude + lon_delta + 180) % 360 - 180
+
+    # SQL narrows the rows to the circle's bounding box, numpy to the circle
+    rows, latitudes, longitudes = _fetch(min_lat, min_lon, max_lat, max_lon)
+    distances = haversine_km(latitude, longitude, latitudes, longitudes)
+    indices = np.flatnonzero(distances <= radius_km)
+    indices = indices[np.argsort(distances[indices], kind='stable')]
+    return [_serialize(rows[i], distances[i]) for i in indices[:limit]], len(indices) > limit
@@ -1,3 +1,394 @@
-from django.test import TestCase
+import json
+import os
+import random
+import shutil
+import tempfile
+from datetime import timedelta
+from unittest import mock
 
-# Create your tests here.
+from django.test import SimpleTestCase, TestCase, TransactionTestCase
+from django.utils import timezone
+
+from gazetteer import Gazetteer, haversine_km
+from rate_limit import TokenBucket, _configured_limit
+
+from . import geohash, spatial
+from . import jobs
+from .jobs import fail_stale_jobs
+from .models import Destination, Itinerary, ItineraryJob, Message, Place, PlaceEntity
+from .pagination import InvalidCursor, decode_cursor, encode_cursor, keyset_page
+from .places import PlaceRegistry, normalize_place_name
+from utils import GazetteerBackend, extract_place_spans, extract_places_by_day
+
+class KeysetPaginationTests(TestCase):
+    def test_cursor_round_trip(self):
+        timestamp = timezone.now()
+        self.assertEqual(decode_cursor(encode_cursor(timestamp, 42)), (timestamp, 42))
+
+    def test_invalid_cursor(self):
+        for cursor in ['not-a-cursor', encode_cursor(timezone.now(), 1)[:-4], 'bm8tcGlwZQ==']:
+            with self.assertRaises(InvalidCursor):
+                decode_cursor(cursor)
+
+    def test_pages_through_ties_on_timestamp(self):
+        destination = Destination.objects.create(name="Paris")
+        for i in range(7):
+            Itinerary.objects.create(title=f"Trip {i}", destination=destination, content="")
+        # Every itinerary shares one created_at, so only the id breaks ties
+        Itinerary.objects.update(created_at=timezone.now())
+
+        seen = []
+        cursor = None
+        while True:
+            page, cursor = keyset_page(Itinerary.objects.all(), 'created_at', cursor=cursor, limit=3)
+            seen.extend(itinerary.id for itinerary in page)
+            if cursor is None:
+                break
+        expected = list(Itinerary.objects.order_by('-id').values_list('id', flat=True))
+        self.assertEqual(seen, expected)
+
+    def test_chat_history_pages(self):
+        for i in range(5):
+            Message.objects.create(role='user', content=str(i))
+        Message.objects.update(timestamp=timezone.now())
+        ids = list(Message.objects.order_by('id').values_list('id', flat=True))
+
+        data = self.client.get('/api/chat-history/?limit=2').json()
+        self.assertEqual([m['id'] for m in data['results']], ids[3:])
+        self.assertTrue(data['has_more'])
+        data = self.client.get(f"/api/chat-history/?limit=2&cursor={data['next_cursor']}").json()
+        self.assertEqual([m['id'] for m in data['results']], ids[1:3])
+
+        data = self.client.get(f'/api/chat-history/?limit=2&after={ids[0]}').json()
+        self.assertEqual([m['id'] for m in data['results']], ids[1:3])
+        self.assertTrue(data['has_more'])
+        data = self.client.get(f'/api/chat-history/?limit=2&after={ids[2]}').json()
+        self.assertEqual([m['id'] for m in data['results']], ids[3:])
+        self.assertFalse(data['has_more'])
+
+class GeohashTests(SimpleTestCase):
+    def test_encode(self):
+        self.assertEqual(geohash.encode(48.8584, 2.2945, 7), 'u09tunq')
+
+    def test_covering_cells_contain_every_point_of_the_box(self):
+        rng = random.Random(7)
+        for _ in range(50):
+            min_lat, min_lon = rng.uniform(-80, 70), rng.uniform(-170, 160)
+            max_lat, max_lon = min_lat + rng.uniform(0.001, 10), min_lon + rng.uniform(0.001, 10)
+            cells = geohash.covering_cells(min_lat, min_lon, max_lat, max_lon)
+            self.assertLessEqual(len(cells), 32)
+            for _ in range(20):
+                point = geohash.encode(rng.uniform(min_lat, max_lat), rng.uniform(min_lon, max_lon))
+                self.assertTrue(any(point.startswith(cell) for cell in cells))
+
+class SpatialQueryTests(TestCase):
+    def setUp(self):
+        destination = Destination.objects.create(name="Paris")
+        itinerary = Itinerary.objects.create(title="Trip", destination=destination, content="")
+        rng = random.Random(3)
+        self.points = [(48.85, 2.35), (0.0, 179.99), (0.0, -179.99)]
+        self.points += [(48.85 + rng.uniform(-0.5, 0.5), 2.35 + rng.uniform(-0.8, 0.8)) for _ in range(300)]
+        for i, (latitude, longitude) in enumerate(self.points):
+            Place(name=f"Place {i}", itinerary=itinerary, latitude=latitude, longitude=longitude).save()
+
+    def brute_force(self, latitude, longitude, radius_km):
+        return {
+            f"Place {i}" for i, point in enumerate(self.points)
+            if haversine_km(latitude, longitude, *point) <= radius_km
+        }
+
+    def test_places_near_matches_brute_force(self):
+        for latitude, longitude, radius_km in [(48.85, 2.35, 5), (48.9, 2.2, 20), (49.2, 2.9, 35), (0.0, 180.0, 10)]:
+            places, truncated = spatial.places_near(latitude, longitude, radius_km, limit=1000)
+            self.assertFalse(truncated)
+            self.assertEqual({place['name'] for place in places}, self.brute_force(latitude, longitude, radius_km))
+            distances = [place['distance_km'] for place in places]
+            self.assertEqual(distances, sorted(distances))
+
+    def test_places_in_bbox(self):
+        places, _ = spatial.places_in_bbox(48.8, 2.3, 48.9, 2.4, limit=1000)
+        expected = {
+            f"Place {i}" for i, (latitude, longitude) in enumerate(self.points)
+            if 48.8 <= latitude <= 48.9 and 2.3 <= longitude <= 2.4
+        }
+        self.assertEqual({place['name'] for place in places}, expected)
+
+        # A box crossing the antimeridian
+        places, _ = spatial.places_in_bbox(-1, 179, 1, -179, limit=1000)
+        self.assertEqual({place['name'] for place in places}, {"Place 1", "Place 2"})
+
+    def test_places_in_bbox_truncates(self):
+        inside = sum(1 for latitude, longitude in self.points if 48.8 <= latitude <= 48.9 and 2.3 <= longitude <= 2.4)
+        places, truncated = spatial.places_in_bbox(48.8, 2.3, 48.9, 2.4, limit=inside)
+        self.assertEqual((len(places), truncated), (inside, False))
+        places, truncated = spatial.places_in_bbox(48.8, 2.3, 48.9, 2.4, limit=inside - 1)
+        self.assertEqual((len(places), truncated), (inside - 1, True))
+
+class ExtractPlacesTests(SimpleTestCase):
+    TEXT = (
+        "# Day 1\nVisit the Louvre Museum. Lunch at   Cafe de Flore.\n"
+        "# Day 2\nExplore Montmartre.\n"
+        "# Day 3\nVisit the Louvre Museum again."
+    )
+
+    def test_place_repeated_on_two_days_is_listed_on_both(self):
+        places = extract_places_by_day(self.TEXT)
+        self.assertIn("Louvre Museum", places[1])
+        self.assertIn("Louvre Museum", places[3])
+        self.assertEqual(places[1].count("Louvre Museum"), 1)
+
+    def test_spans_point_at_the_name(self):
+        matches = extract_place_spans(self.TEXT)
+        self.assertTrue(matches)
+        for match in matches:
+            self.assertEqual(self.TEXT[match.start:match.end], match.name)
+
+class GazetteerBackendTests(SimpleTestCase):
+    def setUp(self):
+        index = Gazetteer([
+            (["Barcelona"], 41.39, 2.17, 'ES', 1600000),
+            (["Sagrada Familia"], 41.40, 2.17, 'ES', 0),
+        ])
+        patcher = mock.patch('utils.get_gazetteer', return_value=index)
+        patcher.start()
+        self.addCleanup(patcher.stop)
+
+    def test_scoped_near_miss_is_resolved(self):
+        self.assertEqual(GazetteerBackend().geocode_many(["Sagrada Famila"], "Barcelona, Spain"), [(41.40, 2.17)])
+
+    def test_unscoped_lookup_accepts_exact_names_only(self):
+        self.assertEqual(
+            GazetteerBackend().geocode_many(["sagrada familia", "Sagrada Famila", "Sagrada", None]),
+            [(41.40, 2.17), None, None, None],
+        )
+
+    def test_unknown_destination_resolves_nothing(self):
+        self.assertEqual(GazetteerBackend().geocode_many(["Sagrada Familia"], "Atlantis"), [None])
+
+class TokenBucketTests(SimpleTestCase):
+    def setUp(self):
+        self.directory = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, self.directory)
+        self.path = os.path.join(self.directory, 'rate_limit.sqlite3')
+
+    def bucket(self, rate, capacity, name='test'):
+        return TokenBucket(name, rate, capacity, path=self.path)
+
+    def test_refill(self):
+        bucket = self.bucket(10, 2)
+        self.assertAlmostEqual(bucket._refill(0.0, 100.0, 100.05), 0.5)
+        self.assertEqual(bucket._refill(1.0, 100.0, 200.0), 2.0)
+        self.assertEqual(bucket._refill(1.0, 100.0, 99.0), 1.0)
+
+    def test_take_waits_for_refill(self):
+        bucket = self.bucket(10, 2)
+        with mock.patch('rate_limit.time.time', return_value=1000.0):
+            self.assertEqual(bucket._take(2), 0.0)
+            self.assertAlmostEqual(bucket._take(1), 0.1)
+        with mock.patch('rate_limit.time.time', return_value=1000.1):
+            self.assertEqual(bucket._take(1), 0.0)
+
+    def test_buckets_share_state(self):
+        self.assertTrue(self.bucket(1, 1).acquire())
+        self.assertFalse(self.bucket(1, 1).acquire(timeout=0.05))
+
+    def test_rejects_invalid_limits(self):
+        for rate, capacity in [(0, 1), (-1, 1), (1, 0), (1, 0.5)]:
+            with self.assertRaises(ValueError):
+                self.bucket(rate, capacity)
+
+    def test_rejects_count_above_capacity(self):
+        with self.assertRaises(ValueError):
+            self.bucket(10, 2).acquire(3)
+
+    def test_invalid_override_keeps_default(self):
+        for value in ['0,5', '-1', '5,0', 'fast']:
+            with mock.patch.dict(os.environ, {'RATE_LIMIT_SERPER': value}):
+                self.assertEqual(_configured_limit('serper'), (5.0, 5))
+        with mock.patch.dict(os.environ, {'RATE_LIMIT_SERPER': '2,4'}):
+            self.assertEqual(_configured_limit('serper'), (2.0, 4.0))
+
+class MapETagTests(TestCase):
+    def setUp(self):
+        destination = Destination.objects.create(name="Paris", latitude=48.85, longitude=2.35)
+        self.itinerary = Itinerary.objects.create(title="Trip", destination=destination, content="")
+        self.other = Itinerary.objects.create(title="Other", destination=destination, content="")
+        self.place = Place.objects.create(
+            name="Louvre", itinerary=self.itinerary, latitude=48.86, longitude=2.34, description="Day 1"
+        )
+        self.url = f'/api/map-geojson/{self.itinerary.id}/'
+
+    def test_unchanged_map_is_not_modified(self):
+        etag = self.client.get(self.url)['ETag']
+        self.assertEqual(self.client.get(self.url, HTTP_IF_NONE_MATCH=etag).status_code, 304)
+
+    def test_gzipped_map_keeps_a_strong_etag(self):
+        response = self.client.get(self.url, HTTP_ACCEPT_ENCODING='gzip')
+        self.assertEqual(response['Content-Encoding'], 'gzip')
+        self.assertIn('Accept-Encoding', response['Vary'])
+        etag = response['ETag']
+        self.assertFalse(etag.startswith('W/'))
+        self.assertTrue(etag.endswith('-gzip"'))
+        self.assertNotEqual(etag, self.client.get(self.url)['ETag'])
+
+        response = self.client.get(self.url, HTTP_ACCEPT_ENCODING='gzip', HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(response.status_code, 304)
+        self.assertEqual(response['ETag'], etag)
+        # A client that does not accept gzip must not reuse the gzipped body
+        self.assertEqual(self.client.get(self.url, HTTP_IF_NONE_MATCH=etag).status_code, 200)
+
+    def test_place_edit_changes_etag(self):
+        etag = self.client.get(self.url)['ETag']
+        response = self.client.patch(
+            f'/api/places/{self.place.id}/', json.dumps({'name': "Louvre Museum"}), content_type='application/json'
+        )
+        self.assertEqual(response.status_code, 200)
+        response = self.client.get(self.url, HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(json.loads(response.content)['features'][1]['properties']['name'], "Louvre Museum")
+
+    def test_moving_a_place_changes_both_etags(self):
+        etags = [self.client.get(url)['ETag'] for url in (self.url, f'/api/map-geojson/{self.other.id}/')]
+        self.place.itinerary = self.other
+        self.place.save()
+        self.assertEqual(self.client.get(self.url, HTTP_IF_NONE_MATCH=etags[0]).status_code, 200)
+        self.assertEqual(
+            self.client.get(f'/api/map-geojson/{self.other.id}/', HTTP_IF_NONE_MATCH=etags[1]).status_code, 200
+        )
+
+class StaleJobTests(TestCase):
+    def test_fails_jobs_without_progress(self):
+        stale = ItineraryJob.objects.create(query="q", destination_name="Paris", title="t", status='running', source='chat')
+        fresh = ItineraryJob.objects.create(query="q", destination_name="Paris", title="t")
+        ItineraryJob.objects.filter(pk=stale.pk).update(updated_at=timezone.now() - timedelta(hours=1))
+
+        self.assertEqual(fail_stale_jobs(), 1)
+        stale.refresh_from_db()
+        fresh.refresh_from_db()
+        self.assertEqual(stale.status, 'failed')
+        self.assertTrue(stale.message)
+        self.assertEqual(fresh.status, 'pending')
+        self.assertTrue(Message.objects.filter(role='assistant', content=stale.message).exists())
+
+        self.assertEqual(self.client.get(f'/api/jobs/{stale.pk}/').json()['status'], 'failed')
+
+    @mock.patch('travel_app.jobs.close_old_connections')
+    @mock.patch('travel_app.jobs._run_pipeline')
+    def test_failed_job_is_not_run(self, run_pipeline, close_old_connections):
+        job = ItineraryJob.objects.create(query="q", destination_name="Paris", title="t", status='failed', source='chat')
+        jobs.run_itinerary_job(job.pk)
+        run_pipeline.assert_not_called()
+        job.refresh_from_db()
+        self.assertEqual(job.status, 'failed')
+        self.assertFalse(Message.objects.exists())
+
+    @mock.patch('travel_app.jobs.close_old_connections')
+    def test_job_failed_while_running_is_not_revived(self, close_old_connections):
+        job = ItineraryJob.objects.create(query="q", destination_name="Paris", title="t", source='chat')
+
+        def swept_pipeline(running_job):
+            ItineraryJob.objects.filter(pk=job.pk).update(status='failed', message="interrupted")
+            jobs._set_stage(running_job, 'generating')
+
+        with mock.patch('travel_app.jobs._run_pipeline', side_effect=swept_pipeline):
+            jobs.run_itinerary_job(job.pk)
+        job.refresh_from_db()
+        self.assertEqual((job.status, job.message, job.stage), ('failed', "interrupted", 'queued'))
+        self.assertFalse(Message.objects.exists())
+
+class JobPipelineTests(TransactionTestCase):
+    def run_job(self, fail_at=None):
+        job = ItineraryJob.objects.create(query="3 days in Paris", destination_name="Paris", title="t", source='chat')
+        set_stage = jobs._set_stage
+
+        def set_stage_then_fail(running_job, stage):
+            set_stage(running_job, stage)
+            # The sweep fails the job right after this stage was recorded
+            if stage == fail_at:
+                ItineraryJob.objects.filter(pk=job.pk).update(status='failed', message="interrupted")
+
+        def geocode(content, structured_days, destination_name, registry, on_stage):
+            on_stage('geocoding')
+            return content, {1: "Day 1: Louvre"}, [(1, "Louvre")], [None]
+
+        with mock.patch.multiple(
+            'travel_app.jobs',
+            load_api_keys=mock.Mock(return_value={}),
+            get_travel_agent=mock.Mock(),
+            gather_trip_context=mock.Mock(return_value={}),
+            _generate_itinerary=mock.Mock(return_value=("Day 1: Louvre", None)),
+            _geocode_itinerary=geocode,
+            _set_stage=set_stage_then_fail,
+            _destination_coords=mock.Mock(return_value=(48.85, 2.35)),
+        ):
+            jobs.run_itinerary_job(job.pk)
+        job.refresh_from_db()
+        return job
+
+    def test_completes_job(self):
+        job = self.run_job()
+        self.assertEqual((job.status, job.progress), ('completed', 100))
+        self.assertEqual(job.itinerary.places.get().name, "Louvre")
+        self.assertEqual(Message.objects.get().content, job.message)
+
+    def test_job_failed_while_running_keeps_nothing(self):
+        for stage in ['geocoding', 'saving']:
+            job = self.run_job(fail_at=stage)
+            self.assertEqual((job.status, job.message), ('failed', "interrupted"))
+            self.assertFalse(Itinerary.objects.exists())
+            self.assertFalse(Message.objects.exists())
+
+class PlaceRegistryTests(SimpleTestCase):
+    def registry(self, *names):
+        registry = PlaceRegistry()
+        for i, name in enumerate(names):
+            registry.add(name, (48.0 + i, 2.0 + i))
+        return registry
+
+    def test_normalize_place_name(self):
+        self.assertEqual(normalize_place_name("The Louvre Museum"), "louvre museum")
+        self.assertEqual(normalize_place_name("  Musée d'Orsay "), "musee d orsay")
+
+    def test_folds_spelling_variants(self):
+        registry = self.registry("Louvre Museum", "Sagrada Familia", "Uffizi Gallery")
+        self.assertIs(registry.match("the louvre museum"), registry.match("Louvre Museum"))
+        self.assertIs(registry.match("Louvre Musem"), registry.match("Louvre Museum"))
+        self.assertIs(registry.match("La Sagrada Família"), registry.match("Sagrada Familia"))
+        self.assertIs(registry.match("Uffizi Galery"), registry.match("Uffizi Gallery"))
+
+    def test_keeps_numbered_places_apart(self):
+        registry = self.registry("District 7", "Terminal 2", "Pier 39")
+        self.assertIsNone(registry.match("District 1"))
+        self.assertIsNone(registry.match("Terminal 1"))
+        self.assertIsNone(registry.match("Pier 39th"))
+        self.assertIsNotNone(registry.match("Terminal 2"))
+
+    def test_keeps_short_names_apart(self):
+        registry = self.registry("Hotel Paris", "Hotel Roma")
+        self.assertIsNone(registry.match("Hotel Parisi"))
+        self.assertIsNone(registry.match("Hotel Rome"))
+        self.assertIsNotNone(registry.match("hotel paris"))
+
+    def test_keeps_places_containing_others_apart(self):
+        registry = self.registry("Central Park")
+        self.assertIsNone(registry.match("Central Park Zoo"))
+
+    def test_add_reuses_matching_entity(self):
+        registry = self.registry("Louvre Museum")
+        entity = registry.add("Louvre Musem", (0.0, 0.0))
+        self.assertEqual(entity.name, "Louvre Museum")
+        self.assertEqual(entity.latitude, 48.0)
+        self.assertIsNot(registry.add("Terminal 1", (1.0, 1.0)), registry.add("Terminal 2", (2.0, 2.0)))
+
+class PlaceRegistrySaveTests(TestCase):
+    def test_save_and_reload(self):
+        destination = Destination.objects.create(name="Paris")
+        registry = PlaceRegistry(destination)
+        registry.add("Louvre Museum", (48.86, 2.34))
+        registry.add("Terminal 1", (49.0, 2.55))
+        registry.save(destination)
+        self.assertEqual(PlaceEntity.objects.filter(destination=destination).count(), 2)
+
+        reloaded = PlaceRegistry(destination)
+        self.assertEqual(reloaded.match("The Louvre Musem").latitude, 48.86)
+        self.assertIsNone(reloaded.match("Terminal 2"))
@@ -1,6 +1,7 @@
+from django.conf import settings
 from django.urls import path, include
 from rest_framework.routers import DefaultRouter
-from . import views
+from . import async_views, views
 from .api import views as api_views
 
 # Setup the API router
@@ -11,6 +12,9 @@ router.register(r'itineraries', api_views.ItineraryViewSet)
 router.register(r'places', api_views.PlaceViewSet)
 router.register(r'messages', api_views.MessageViewSet)
 
+# Under ASGI the chat endpoints are coroutines
+chat_views = async_views if settings.ASYNC_VIEWS else views
+
 urlpatterns = [
     # Frontend views
     path('', views.home, name='home'),
@@ -19,13 +23,18 @@ urlpatterns = [
     
     # API endpoints
     path('api/', include(router.urls)),
-    path('api/chat/', views.chat_message, name='chat_message'),
-    path('api/chat-message/', views.chat_message, name='chat_message_alt'),  # Alias for compatibility
+    path('api/chat/', chat_views.chat_message, name='chat_message'),
+    path('api/chat-message/', chat_views.chat_message, name='chat_message_alt'),  # Alias for compatibility
+    path('api/chat/stream/', chat_views.chat_stream, name='chat_stream'),
     path('api/chat-history/', views.get_chat_history, name='chat_history'),
     path('api/generate-itinerary/', api_views.generate_itinerary, name='generate_itinerary'),
+    path('api/jobs/<int:pk>/', api_views.job_status, name='job_status'),
     path('api/get-itineraries/', views.get_itineraries, name='get_itineraries'),
     path('api/get-itinerary/<int:pk>/', views.get_itinerary, name='get_itinerary'),
     path('api/map-data/', views.get_map_data, name='map_data'),
     path('api/map-data/<int:itinerary_id>/', views.get_map_data, name='map_data_with_id'),
+    path('api/map-geojson/', views.get_map_geojson, name='map_geojson'),
+    path('api/map-geojson/<int:itinerary_id>/', views.get_map_geojson, name='map_geojson_with_id'),
     path('api/api-keys/', api_views.check_api_keys, name='check_api_keys'),
+    path('metrics', views.metrics_view, name='metrics'),
 ]
\ No newline at end of file
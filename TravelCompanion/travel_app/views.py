@@ -1,20 +1,31 @@
 from django.shortcuts import render, redirect, get_object_or_404
-from django.http import JsonResponse
+from django.utils.cache import patch_vary_headers
+from django.utils.text import compress_string
+from django.http import HttpResponse, JsonResponse, StreamingHttpResponse
 from django.views.decorators.csrf import csrf_exempt
+from django.views.decorators.http import condition
 from rest_framework import viewsets
 from rest_framework.response import Response
 
 from .models import Destination, Itinerary, ItineraryDay, Place, Message, ApiKey
 from .api.serializers import (
     DestinationSerializer, ItinerarySerializer, 
-    ItineraryDaySerializer, PlaceSerializer, 
+    ItinerarySummarySerializer, ItineraryDaySerializer, PlaceSerializer, 
     MessageSerializer, ApiKeySerializer
 )
+from .pagination import InvalidCursor, keyset_page, parse_limit
 
-from travel_agent import TravelAgent
+from .keys import get_api_keys
+from .jobs import load_api_keys, submit_itinerary_job
+
+from travel_agent import get_travel_agent
+import metrics
 import utils
+import functools
+import hashlib
 import json
 import os
+import re
 from dotenv import load_dotenv
 
 # Load environment variables
@@ -23,7 +34,7 @@ load_dotenv()
 def home(request):
     """Home page view"""
     # Get API keys for configuration
-    api_keys = ApiKey.objects.all()
+    api_keys = get_api_keys().values()
     return render(request, 'travel_app/index.html', {'api_keys': api_keys})
 
 def api_keys(request):
@@ -80,6 +91,24 @@ class MessageViewSet(viewsets.ModelViewSet):
     queryset = Message.objects.all()
     serializer_class = MessageSerializer
 
+def _queue_itinerary(content):
+    """Queue an itinerary job for the text of a /add command
+    
+    Returns the reply to show and the job, or None as the job when no
+    destination could be found in ``content``.
+    """
+    destination_name = utils.extract_destination(content)
+    if not destination_name:
+        return "I couldn't identify a destination in your request. Please specify where you want to travel.", None
+    
+    job = submit_itinerary_job(
+        query=content,
+        destination_name=destination_name,
+        title=f"{destination_name} Itinerary",
+        source='chat'
+    )
+    return f"I'm creating an itinerary for {destination_name}. It will appear in the itinerary panel when it's ready.", job
+
 def chat_message(request):
     """Handle chat messages and generate responses"""
     if request.method == 'POST':
@@ -89,123 +118,29 @@ def chat_message(request):
         # Save the user message
         Message.objects.create(role='user', content=user_message)
         
-        # Initialize the travel agent
-        serper_api_key = None
-        google_api_key = None
-        
-        # Get API keys from database
-        try:
-            serper_key = ApiKey.objects.filter(name='serper').first()
-            if serper_key:
-                serper_api_key = serper_key.key
-                
-            google_key = ApiKey.objects.filter(name='google').first()
-            if google_key:
-                google_api_key = google_key.key
-        except:
-            pass
-            
-        # Fall back to environment variables if not found in database
-        if not serper_api_key:
-            serper_api_key = os.getenv('SERPER_API_KEY')
-        if not google_api_key:
-            google_api_key = os.getenv('GOOGLE_API_KEY')
-            
-        travel_agent = TravelAgent(
-            serper_api_key=serper_api_key,
-            google_api_key=google_api_key
-        )
-        
         # Check if it's a command to add a location to the itinerary
         if user_message.startswith('/add'):
-            content = user_message[4:].strip()
             try:
-                # Generate an itinerary
-                response = travel_agent.generate_itinerary(content)
-                
-                # Extract destination
-                destination_name = utils.extract_destination(content)
-                if not destination_name:
-                    # If no destination found, use a generic name based on the content
-                    words = content.split()
-                    destination_name = ' '.join(words[:2]) + " Trip" if len(words) >= 2 else "Travel Plan"
-                
-                destination, created = Destination.objects.get_or_create(
-                    name=destination_name
-                )
-                
-                # Get coordinates for the destination
-                if created and not (destination.latitude and destination.longitude):
-                    coords = utils.get_coordinates(destination_name)
-                    if coords:
-                        destination.latitude = coords[0]
-                        destination.longitude = coords[1]
-                        destination.save()
-                
-                # Create the itinerary
-                itinerary = Itinerary.objects.create(
-                    title=f"{destination_name} Itinerary",
-                    destination=destination,
-                    content=response
-                )
-                
-                # Parse days and places
-                days = utils.parse_itinerary_to_days(response)
-                
-                # Create a dictionary to store places by day
-                places_by_day = {}
-                
-                # Process each day
-                for day_num, content in days.items():
-                    # Create the itinerary day
-                    itinerary_day = ItineraryDay.objects.create(
-                        itinerary=itinerary,
-                        day_number=day_num,
-                        content=content
-                    )
-                    
-                    # Extract places for this specific day
-                    day_places = utils.extract_places_from_itinerary(content)
-                    places_by_day[day_num] = day_places
-                    
-                    # Create places with day association
-                    for place_name in day_places:
-                        try:
-                            # Create the place with day number in description
-                            place = Place.objects.create(
-                                name=place_name,
-                                itinerary=itinerary,
-                                description=f"Day {day_num}"
-                            )
-                            
-                            # Then try to get coordinates
-                            try:
-                                coords = utils.get_coordinates(f"{place_name}, {destination_name}")
-                                if coords:
-                                    place.latitude = coords[0]
-                                    place.longitude = coords[1]
-                                    place.save()
-                            except Exception as coord_error:
-                                print(f"Warning: Failed to get coordinates for {place_name}: {coord_error}")
-                        except Exception as place_error:
-                            print(f"Warning: Failed to save place {place_name}: {place_error}")
-                
-                # Save the assistant's response
-                response_message = f"I've created an itinerary for {destination_name}. You can see it in the itinerary panel."
-                Message.objects.create(role='assistant', content=response_message)
-                
-                return JsonResponse({
-                    'message': response_message,
-                    'itinerary_id': itinerary.id
-                })
-                
+                # Generate the itinerary in the background; the client polls the job
+                response_message, job = _queue_itinerary(user_message[4:].strip())
             except Exception as e:
                 error_message = f"Sorry, I couldn't create an itinerary: {str(e)}"
                 Message.objects.create(role='assistant', content=error_message)
                 return JsonResponse({'message': error_message}, status=500)
+            
+            saved = Message.objects.create(role='assistant', content=response_message)
+            if job is None:
+                return JsonResponse({'message': response_message, 'message_id': saved.id})
+            return JsonResponse({
+                'message': response_message,
+                'message_id': saved.id,
+                'job_id': job.id
+            }, status=202)
         else:
             # Regular travel question
             try:
+                # Initialize the travel agent with the keys from the database or environment
+                travel_agent = get_travel_agent(**load_api_keys())
                 response = travel_agent.answer_travel_question(user_message)
                 
                 # Save the assistant's response
@@ -219,43 +154,283 @@ def chat_message(request):
     
     return JsonResponse({'error': 'Invalid request'}, status=400)
 
+def _sse_event(event, data):
+    """Format a single Server-Sent Events frame"""
+    return f"event: {event}\ndata: {json.dumps(data)}\n\n"
+
+def _stream_answer(user_message):
+    """Yield SSE frames for the answer to a travel question"""
+    chunks = []
+    try:
+        travel_agent = get_travel_agent(**load_api_keys())
+        is_valid, message = travel_agent.validate_configuration()
+        if not is_valid:
+            chunks.append(message)
+            yield _sse_event('token', {'text': message})
+        else:
+            prompt = travel_agent.build_question_prompt(user_message)
+            for chunk in travel_agent.generate_text(prompt, stream=True):
+                chunks.append(chunk)
+                yield _sse_event('token', {'text': chunk})
+    except Exception as e:
+        error_message = f"Sorry, I couldn't answer that: {str(e)}"
+        saved = Message.objects.create(role='assistant', content=error_message)
+        yield _sse_event('error', {'message': error_message, 'message_id': saved.id})
+        return
+    
+    # Persist the complete answer once the stream has finished
+    response = ''.join(chunks)
+    saved = Message.objects.create(role='assistant', content=response)
+    yield _sse_event('done', {'message': response, 'message_id': saved.id})
+
+def _stream_itinerary(content):
+    """Yield the SSE frame acknowledging a /add command
+    
+    The itinerary is generated by a background job rather than in the
+    request; the ``done`` event carries the ``job_id`` to poll.
+    """
+    try:
+        response_message, job = _queue_itinerary(content)
+    except Exception as e:
+        error_message = f"Sorry, I couldn't create an itinerary: {str(e)}"
+        saved = Message.objects.create(role='assistant', content=error_message)
+        yield _sse_event('error', {'message': error_message, 'message_id': saved.id})
+        return
+    
+    saved = Message.objects.create(role='assistant', content=response_message)
+    data = {'message': response_message, 'message_id': saved.id}
+    if job is not None:
+        data['job_id'] = job.id
+    yield _sse_event('done', data)
+
+def chat_stream(request):
+    """Handle a chat message and stream the response as Server-Sent Events
+    
+    Emits ``token`` events with text as the LLM produces it and a final
+    ``done`` (or ``error``) event once the response has been saved. A /add
+    command only queues an itinerary job, whose id is in the ``done`` event.
+    """
+    if request.method != 'POST':
+        return JsonResponse({'error': 'Invalid request'}, status=400)
+    
+    data = json.loads(request.body)
+    user_message = data.get('message', '')
+    
+    # Save the user message
+    Message.objects.create(role='user', content=user_message)
+    
+    if user_message.startswith('/add'):
+        events = _stream_itinerary(user_message[4:].strip())
+    else:
+        events = _stream_answer(user_message)
+    
+    response = StreamingHttpResponse(events, content_type='text/event-stream')
+    response['Cache-Control'] = 'no-cache'
+    response['X-Accel-Buffering'] = 'no'
+    return response
+
 def get_chat_history(request):
-    """Get the chat history"""
-    messages = Message.objects.all().order_by('timestamp')
+    """Get the most recent chat messages, oldest first
+    
+    ``?cursor=`` (the returned ``next_cursor``) pages back through older
+    messages, while ``?after=<id>`` returns only messages newer than ``id``.
+    ``has_more`` tells whether the page was cut at ``limit``; for ``after``
+    pages, ask again after the last returned id to get the rest.
+    """
+    limit = parse_limit(request.GET.get('limit'))
+    after = request.GET.get('after')
+    
+    if after:
+        try:
+            after_id = int(after)
+        except ValueError:
+            return JsonResponse({'error': f"Invalid message id: {after}"}, status=400)
+        # Fetch one extra row to know whether more new messages are waiting
+        messages = list(Message.objects.filter(id__gt=after_id).order_by('timestamp', 'id')[:limit + 1])
+        has_more = len(messages) > limit
+        messages = messages[:limit]
+        next_cursor = None
+    else:
+        try:
+            messages, next_cursor = keyset_page(
+                Message.objects.all(),
+                'timestamp',
+                cursor=request.GET.get('cursor'),
+                limit=limit
+            )
+        except InvalidCursor as e:
+            return JsonResponse({'error': str(e)}, status=400)
+        messages.reverse()
+        has_more = next_cursor is not None
+    
     serializer = MessageSerializer(messages, many=True)
-    return JsonResponse(serializer.data, safe=False)
+    return JsonResponse({'results': serializer.data, 'next_cursor': next_cursor, 'has_more': has_more})
 
 def get_itineraries(request):
-    """Get all itineraries"""
-    itineraries = Itinerary.objects.all().order_by('-created_at')
-    serializer = ItinerarySerializer(itineraries, many=True)
-    return JsonResponse(serializer.data, safe=False)
+    """Get a page of itinerary summaries, newest first
+    
+    Pass the returned ``next_cursor`` as ``?cursor=`` to fetch the next page.
+    """
+    itineraries = Itinerary.objects.select_related('destination').only(
+        'id', 'title', 'created_at', 'destination__id', 'destination__name'
+    )
+    try:
+        page, next_cursor = keyset_page(
+            itineraries,
+            'created_at',
+            cursor=request.GET.get('cursor'),
+            limit=parse_limit(request.GET.get('limit'))
+        )
+    except InvalidCursor as e:
+        return JsonResponse({'error': str(e)}, status=400)
+    
+    serializer = ItinerarySummarySerializer(page, many=True)
+    return JsonResponse({'results': serializer.data, 'next_cursor': next_cursor})
 
 def get_itinerary(request, pk):
     """Get a specific itinerary with all its details"""
-    itinerary = get_object_or_404(Itinerary, pk=pk)
+    itinerary = get_object_or_404(
+        Itinerary.objects.select_related('destination').prefetch_related('days', 'places'),
+        pk=pk
+    )
     serializer = ItinerarySerializer(itinerary)
     return JsonResponse(serializer.data)
 
+def metrics_view(request):
+    """Expose this process's metrics in the Prometheus text format."""
+    return HttpResponse(metrics.render(), content_type='text/plain; version=0.0.4; charset=utf-8')
+
+def _map_itinerary(itinerary_id=None):
+    """Return the requested itinerary, or the most recent one if no id is given."""
+    itineraries = Itinerary.objects.select_related('destination')
+    if itinerary_id:
+        return get_object_or_404(itineraries, pk=itinerary_id)
+    return itineraries.order_by('-created_at', '-id').first()
+
+_ACCEPTS_GZIP = re.compile(r'\bgzip\b')
+
+def _accepts_gzip(request):
+    return bool(_ACCEPTS_GZIP.search(request.META.get('HTTP_ACCEPT_ENCODING', '')))
+
+def map_data_etag(request, itinerary_id=None):
+    """ETag of the map data: changes whenever the itinerary or its places do.
+    
+    Gzipped responses get their own tag so it can stay strong.
+    """
+    itineraries = Itinerary.objects.all()
+    if itinerary_id:
+        itineraries = itineraries.filter(pk=itinerary_id)
+    else:
+        itineraries = itineraries.order_by('-created_at', '-id')
+    latest = itineraries.values_list('id', 'updated_at').first()
+    if latest is None:
+        return None
+    pk, updated_at = latest
+    stamp = f"{request.path}:{pk}:{updated_at.isoformat()}"
+    etag = hashlib.sha256(stamp.encode()).hexdigest()[:32]
+    return f"{etag}-gzip" if _accepts_gzip(request) else etag
+
+def gzip_map_data(view):
+    """Gzip map responses for clients that accept it, keeping the ETag strong.
+    
+    Unlike ``gzip_page`` this always compresses when gzip is accepted, so
+    ``map_data_etag`` knows the encoding up front and the tag does not have
+    to be weakened. Brotli is not offered: it needs a compiled dependency the
+    project does not ship, and map payloads gzip well.
+    """
+    @functools.wraps(view)
+    def wrapper(request, *args, **kwargs):
+        response = view(request, *args, **kwargs)
+        patch_vary_headers(response, ('Accept-Encoding',))
+        if (response.status_code == 200 and not response.streaming
+                and not response.has_header('Content-Encoding') and _accepts_gzip(request)):
+            response.content = compress_string(response.content)
+            response['Content-Encoding'] = 'gzip'
+            response['Content-Length'] = str(len(response.content))
+        return response
+    return wrapper
+
+def _revalidate(response):
+    """Let browsers cache map data but check the ETag before reusing it."""
+    response['Cache-Control'] = 'no-cache'
+    return response
+
+@gzip_map_data
+@condition(etag_func=map_data_etag)
 def get_map_data(request, itinerary_id=None):
     """Get map data for places in an itinerary"""
-    if itinerary_id:
-        itinerary = get_object_or_404(Itinerary, pk=itinerary_id)
-        places = Place.objects.filter(itinerary=itinerary)
+    itinerary = _map_itinerary(itinerary_id)
+    if itinerary:
+        places = itinerary.places.all()
         destination = itinerary.destination
     else:
-        # Get the most recent itinerary
-        itinerary = Itinerary.objects.order_by('-created_at').first()
-        if itinerary:
-            places = Place.objects.filter(itinerary=itinerary)
-            destination = itinerary.destination
-        else:
-            places = []
-            destination = None
+        places = []
+        destination = None
     
     result = {
         'destination': DestinationSerializer(destination).data if destination else None,
         'places': PlaceSerializer(places, many=True).data
     }
     
-    return JsonResponse(result)
\ No newline at end of file
+    return _revalidate(JsonResponse(result))
+
+_DAY_DESCRIPTION = re.compile(r'^Day (\d+)$')
+
+def _geojson_point(latitude, longitude, properties):
+    return {
+        'type': 'Feature',
+        'geometry': {
+            'type': 'Point',
+            # GeoJSON positions are [longitude, latitude]
+            'coordinates': [round(longitude, 6), round(latitude, 6)],
+        },
+        'properties': properties,
+    }
+
+@gzip_map_data
+@condition(etag_func=map_data_etag)
+def get_map_geojson(request, itinerary_id=None):
+    """Get an itinerary's destination and places as a GeoJSON FeatureCollection.
+    
+    Places carry the day they are visited on, and the collection lists the
+    itinerary's days so the map can group or filter markers per day.
+    """
+    itinerary = _map_itinerary(itinerary_id)
+    features = []
+    days = set()
+    if itinerary:
+        destination = itinerary.destination
+        if destination.latitude is not None and destination.longitude is not None:
+            features.append(_geojson_point(destination.latitude, destination.longitude, {
+                'kind': 'destination',
+                'name': destination.name,
+            }))
+        places = itinerary.places.filter(
+            latitude__isnull=False, longitude__isnull=False
+        ).values_list('name', 'description', 'latitude', 'longitude')
+        for name, description, latitude, longitude in places:
+            match = _DAY_DESCRIPTION.match(description or '')
+            day = int(match.group(1)) if match else None
+            if day is not None:
+                days.add(day)
+            features.append(_geojson_point(latitude, longitude, {
+                'kind': 'place',
+                'name': name,
+                'day': day,
+                'description': description,
+            }))
+    
+    collection = {
+        'type': 'FeatureCollection',
+        'properties': {
+            'itinerary_id': itinerary.id if itinerary else None,
+            'title': itinerary.title if itinerary else None,
+            'days': sorted(days),
+        },
+        'features': features,
+    }
+    response = HttpResponse(
+        json.dumps(collection, separators=(',', ':')),
+        content_type='application/geo+json'
+    )
+    return _revalidate(response)
@@ -12,5 +12,7 @@ import os
 from django.core.asgi import get_asgi_application
 
 os.environ.setdefault('DJANGO_SETTINGS_MODULE', 'travel_planner.settings')
+# Await LLM calls in the chat views instead of blocking a thread per request
+os.environ.setdefault('ASYNC_VIEWS', 'true')
 
 application = get_asgi_application()
@@ -10,6 +10,7 @@ For the full list of settings and their values, see
 https://docs.djangoproject.com/en/5.2/ref/settings/
 """
 
+import os
 from pathlib import Path
 
 # Build paths inside the project like this: BASE_DIR / 'subdir'.
@@ -49,6 +50,7 @@ INSTALLED_APPS = [
 ]
 
 MIDDLEWARE = [
+    'travel_app.middleware.MetricsMiddleware',
     'django.middleware.security.SecurityMiddleware',
     'django.contrib.sessions.middleware.SessionMiddleware',
     'django.middleware.common.CommonMiddleware',
@@ -88,6 +90,33 @@ DATABASES = {
     }
 }
 
+# Set DATABASE_PROFILE=production when several workers share the SQLite file:
+# WAL lets readers run alongside the single writer, writers wait longer for the
+# lock instead of failing with "database is locked", and connections are kept
+# open between requests. The pragmas are applied in travel_app.signals.
+DATABASE_PROFILE = os.getenv('DATABASE_PROFILE', 'default')
+
+SQLITE_PRAGMAS = {}
+
+if DATABASE_PROFILE == 'production':
+    DATABASES['default'].update({
+        'CONN_MAX_AGE': int(os.getenv('DB_CONN_MAX_AGE', 600)),
+        'CONN_HEALTH_CHECKS': True,
+        'OPTIONS': {
+            'timeout': 30,
+            # Take the write lock at BEGIN so transactions never deadlock upgrading it
+            'transaction_mode': 'IMMEDIATE',
+        },
+    })
+    SQLITE_PRAGMAS = {
+        'journal_mode': 'WAL',
+        'synchronous': 'NORMAL',
+        'busy_timeout': 30000,
+        'cache_size': -64000,  # 64 MB
+        'mmap_size': 268435456,  # 256 MB
+        'temp_store': 'MEMORY',
+    }
+
 
 # Password validation
 # https://docs.djangoproject.com/en/5.2/ref/settings/#auth-password-validators
@@ -132,3 +161,27 @@ STATICFILES_DIRS = [
 # https://docs.djangoproject.com/en/5.2/ref/settings/#default-auto-field
 
 DEFAULT_AUTO_FIELD = 'django.db.models.BigAutoField'
+
+
+# Background itinerary generation
+# Number of worker threads per process running itinerary jobs
+
+ITINERARY_JOB_WORKERS = int(os.getenv('ITINERARY_JOB_WORKERS', 2))
+
+# Seconds a pending or running job may go without progress before it is marked
+# failed, e.g. because the process running it was restarted
+
+ITINERARY_JOB_TIMEOUT = int(os.getenv('ITINERARY_JOB_TIMEOUT', 900))
+
+# Ask the LLM for JSON itineraries (days -> slots) instead of parsing Markdown
+
+ITINERARY_STRUCTURED_OUTPUT = os.getenv('ITINERARY_STRUCTURED_OUTPUT', 'true').lower() in ('1', 'true', 'yes')
+
+# Serve the chat endpoints with coroutine views (travel_app.async_views).
+# asgi.py turns this on; under WSGI the sync views are used.
+
+ASYNC_VIEWS = os.getenv('ASYNC_VIEWS', 'false').lower() in ('1', 'true', 'yes')
+
+# Worker threads per process running the concurrent stages of itinerary jobs
+
+PIPELINE_STAGE_WORKERS = int(os.getenv('PIPELINE_STAGE_WORKERS', 8))
@@ -1,12 +1,21 @@
 import re
 import os
+import bisect
+from collections import namedtuple
 import requests
 from datetime import datetime, timedelta
 from dateutil.parser import parse
 from geopy.geocoders import Nominatim
 import time
+import asyncio
+from concurrent.futures import ThreadPoolExecutor
 import folium
 from folium.plugins import MarkerCluster
+from async_http import request_with_retries
+from caching import MISSING, TieredCache, normalize_key
+from gazetteer import get_gazetteer
+from rate_limit import get_limiter
+from metrics import UPSTREAM_ERRORS, span, timed
 
 def parse_natural_date(text):
     """Parse natural language date references from text."""
@@ -93,157 +102,450 @@ def extract_destination(user_input):
     # No destination found
     return None
 
-def get_coordinates(location_name):
-    """Get latitude and longitude for a location using Geopy.
+# Geocode cache: resolved places are kept for a month, misses for a day
+GEOCODE_CACHE_TTL = int(os.getenv("GEOCODE_CACHE_TTL", 30 * 24 * 3600))
+GEOCODE_NEGATIVE_TTL = int(os.getenv("GEOCODE_NEGATIVE_TTL", 24 * 3600))
+_geocode_cache = TieredCache("geocode_cache", maxsize=4096)
+
+# Maximum number of concurrent Nominatim lookups in a batch
+GEOCODE_WORKERS = int(os.getenv("GEOCODE_WORKERS", 4))
+
+NOMINATIM_USER_AGENT = "travel_planner_app"
+
+_geolocator = None
+
+def _get_geolocator():
+    """Return the shared Nominatim client, creating it on first use."""
+    global _geolocator
+    if _geolocator is None:
+        _geolocator = Nominatim(user_agent=NOMINATIM_USER_AGENT)
+    return _geolocator
+
+GeocodedPoint = namedtuple('GeocodedPoint', ['latitude', 'longitude'])
+
+class AsyncNominatim:
+    """Nominatim search over the shared async HTTP pool.
     
-    This function attempts to geocode a location name with increased reliability
-    by using several strategies if initial geocoding fails.
+    Only supports what ``geocode_many`` needs from geopy's Nominatim: the
+    best match for a free-form query, or None.
     """
-    if not location_name:
-        return None
-        
+    url = "https://nominatim.openstreetmap.org/search"
+    
+    def __init__(self, user_agent):
+        self.user_agent = user_agent
+    
+    async def geocode(self, query, exactly_one=True, timeout=10):
+        response = await request_with_retries(
+            "GET", self.url,
+            params={"q": query, "format": "json", "limit": 1},
+            headers={"User-Agent": self.user_agent},
+            timeout=timeout
+        )
+        response.raise_for_status()
+        matches = response.json()
+        if not matches:
+            return None
+        return GeocodedPoint(float(matches[0]["lat"]), float(matches[0]["lon"]))
+
+_async_geolocator = None
+
+def _get_async_geolocator():
+    """Return the shared async Nominatim client, creating it on first use."""
+    global _async_geolocator
+    if _async_geolocator is None:
+        _async_geolocator = AsyncNominatim(user_agent=NOMINATIM_USER_AGENT)
+    return _async_geolocator
+
+def _geocode_spellings(location_name):
+    """Return the spellings to try for a location, in order of preference."""
     # Clean up the location name - remove any non-alphanumeric characters except spaces, commas and basic punctuation
     clean_location = ''.join(c for c in location_name if c.isalnum() or c.isspace() or c in ',-.')
+    spellings = [location_name, clean_location]
     
+    # If there are commas in the name, fall back to the first part
+    if ',' in clean_location:
+        spellings.append(clean_location.split(',')[0].strip())
+    
+    return list(dict.fromkeys(s for s in spellings if s))
+
+def _geocode_once(query):
+    """Run a single rate-limited Nominatim lookup.
+
+    Returns ``(coords, error)`` where ``coords`` is ``(latitude, longitude)``
+    or None, and ``error`` is the exception raised by the geocoder, if any.
+    """
+    try:
+        get_limiter("nominatim").acquire()
+        with span("nominatim.geocode"):
+            location = _get_geolocator().geocode(query, exactly_one=True, timeout=10)
+    except Exception as e:
+        UPSTREAM_ERRORS.inc(service="nominatim")
+        return None, e
+    if location:
+        return (location.latitude, location.longitude), None
+    return None, None
+
+async def _ageocode_once(query):
+    """Async counterpart of ``_geocode_once``."""
     try:
-        # Add a delay to avoid hitting rate limits
-        time.sleep(0.5)
-        geolocator = Nominatim(user_agent="travel_planner_app")
+        await get_limiter("nominatim").aacquire()
+        with span("nominatim.geocode"):
+            location = await _get_async_geolocator().geocode(query, exactly_one=True, timeout=10)
+    except Exception as e:
+        UPSTREAM_ERRORS.inc(service="nominatim")
+        return None, e
+    if location:
+        return (location.latitude, location.longitude), None
+    return None, None
+
+class GeocoderBackend:
+    """A source of coordinates consulted by ``geocode_many``.
+
+    Backends run in the order of GEOCODER_BACKENDS and each one only sees
+    the names the previous backends could not resolve.
+    """
+
+    def geocode_many(self, names, context=None):
+        """Return ``(latitude, longitude)`` or None for each name, in input order."""
+        raise NotImplementedError
+
+    async def ageocode_many(self, names, context=None):
+        """Async counterpart of ``geocode_many``.
+        
+        Runs ``geocode_many`` on a worker thread unless a backend has a
+        native async implementation.
+        """
+        return await asyncio.to_thread(self.geocode_many, names, context)
+
+class GazetteerBackend(GeocoderBackend):
+    """Offline lookups in the local GeoNames gazetteer (see ``gazetteer.py``).
+
+    Places are only accepted near the destination given as ``context``; if
+    the destination itself is unknown to the gazetteer, nothing is resolved
+    so the names are left to the next backend. Without a context only exact
+    names are accepted, since a near miss could be anywhere in the world.
+    """
+
+    def geocode_many(self, names, context=None):
+        index = get_gazetteer()
+        if index is None:
+            return [None] * len(names)
+        if not context:
+            return [index.lookup(name, fuzzy=False, prefix=False) if name else None for name in names]
+        scope = index.resolve_scope(context)
+        if scope is None:
+            return [None] * len(names)
+        return [index.lookup(name, scope) if name else None for name in names]
+
+class NominatimBackend(GeocoderBackend):
+    """Rate-limited, cached Nominatim lookups."""
+
+    def geocode_many(self, names, context=None):
+        """Geocode a batch of location names concurrently.
+        
+        Each name is qualified with ``context`` (usually the destination) when
+        given. Duplicates are resolved once, cached results are answered without
+        any network call and the remaining names are looked up on a bounded worker
+        pool. Names that are not found are retried with a cleaned spelling and then
+        with the part before the first comma, each as a later stage of the batch.
+        """
+        queries, results, pending = self._cached(names, context)
+        
+        if pending:
+            with ThreadPoolExecutor(max_workers=max(1, min(GEOCODE_WORKERS, len(pending)))) as pool:
+                stages = self._stages(pending, results)
+                lookups = next(stages)
+                while lookups is not None:
+                    lookups = stages.send(dict(zip(lookups, pool.map(_geocode_once, lookups))))
+        
+        return [results.get(query) if query else None for query in queries]
+
+    async def ageocode_many(self, names, context=None):
+        """Async counterpart of ``geocode_many``: lookups run as concurrent coroutines.
         
-        # First attempt with original name
-        location = geolocator.geocode(location_name, exactly_one=True, timeout=10)
+        The geocode cache lives in SQLite, so it is read and written on worker
+        threads rather than on the event loop.
+        """
+        queries, results, pending = await asyncio.to_thread(self._cached, names, context)
         
-        # If that fails, try with cleaned name
-        if not location and clean_location != location_name:
-            time.sleep(0.5)
-            location = geolocator.geocode(clean_location, exactly_one=True, timeout=10)
+        if pending:
+            semaphore = asyncio.Semaphore(max(1, min(GEOCODE_WORKERS, len(pending))))
             
-        # If that fails and there are commas in the name, try the first part
-        if not location and ',' in clean_location:
-            primary_location = clean_location.split(',')[0].strip()
-            time.sleep(0.5)
-            location = geolocator.geocode(primary_location, exactly_one=True, timeout=10)
+            async def lookup(spelling):
+                async with semaphore:
+                    return await _ageocode_once(spelling)
+            
+            stages = self._stages(pending, results)
+            lookups = next(stages)
+            while lookups is not None:
+                outcomes = await asyncio.gather(*(lookup(spelling) for spelling in lookups))
+                # The last stage caches every outcome
+                lookups = await asyncio.to_thread(stages.send, dict(zip(lookups, outcomes)))
         
-        if location:
-            return (location.latitude, location.longitude)
-        else:
-            print(f"Warning: Could not geocode location '{location_name}'")
-    except Exception as e:
-        print(f"Error getting coordinates for '{location_name}': {e}")
-    
-    return None
+        return [results.get(query) if query else None for query in queries]
 
-def extract_places_from_itinerary(itinerary_text):
-    """Extract place names from the itinerary text."""
-    places = []
-    
-    # Common words that aren't places
-    non_place_words = ["the", "your", "this", "that", "these", "those", 
-                       "then", "there", "here", "where", "what", "when", 
-                       "breakfast", "lunch", "dinner", "brunch", "day",
-                       "morning", "afternoon", "evening", "night", "noon"]
+    def _cached(self, names, context):
+        """Return the queries for ``names``, the cached results and the queries left to look up."""
+        queries = [f"{name}, {context}" if name and context else name for name in names]
     
-    # Look for patterns indicating places
-    patterns = [
-        # Places after action verbs
-        r"(?:Visit|Explore|Check out|Go to|See|Head to|Stop by|Enjoy|Experience) ([\w\s',-&]+?)(?:\.|\,|\s|$)",
+        results = {}
+        pending = []
+        for query in dict.fromkeys(q for q in queries if q):
+            cached = _geocode_cache.get(normalize_key(query))
+            if cached is not MISSING:
+                results[query] = tuple(cached) if cached else None
+            else:
+                pending.append(query)
+        return queries, results, pending
+
+    def _stages(self, pending, results):
+        """Drive the lookup stages of ``pending`` queries, filling in ``results``.
         
-        # Places with ratings
-        r"([\w\s',-&]+?) \([\d\.]+\/[\d\.]+\)",
+        A generator shared by the sync and async lookups: it yields the
+        spellings to look up in the next stage, is sent back a dict mapping
+        each of them to ``(coords, error)``, and yields None once every query
+        is resolved or out of spellings. The outcomes are then cached.
+        """
+        spellings = {query: _geocode_spellings(query) for query in pending}
+        errors = {}
+        unresolved = pending
+        stage = 0
         
-        # Landmark pattern
-        r"([\w\s',-&]+? (?:Museum|Temple|Cathedral|Church|Palace|Castle|Park|Garden|Monument|Square|Tower|Bridge|Market|Restaurant|Café|Bistro|Hotel|Resort))",
+        while unresolved:
+            stage_queries = {q: spellings[q][stage] for q in unresolved if stage < len(spellings[q])}
+            if not stage_queries:
+                break
+            
+            # Identical spellings within a stage are only looked up once
+            outcomes = yield list(dict.fromkeys(stage_queries.values()))
+            
+            unresolved = []
+            for query, spelling in stage_queries.items():
+                coords, error = outcomes[spelling]
+                if error is not None:
+                    errors[query] = error
+                elif coords:
+                    results[query] = coords
+                else:
+                    unresolved.append(query)
+            stage += 1
         
-        # Places after time
-        r"\d{1,2}(?::\d{2})?\s*(?:AM|PM|am|pm):\s*([\w\s',-&]+?)(?:\.|\,|\s|$)",
+        for query in pending:
+            if query in errors:
+                # Service errors are transient, so they are not cached
+                print(f"Error getting coordinates for '{query}': {errors[query]}")
+                results[query] = None
+            elif results.get(query):
+                _geocode_cache.set(normalize_key(query), results[query], GEOCODE_CACHE_TTL)
+            else:
+                print(f"Warning: Could not geocode location '{query}'")
+                results[query] = None
+                _geocode_cache.set(normalize_key(query), None, GEOCODE_NEGATIVE_TTL)
+        yield None
+
+GEOCODER_BACKEND_CLASSES = {
+    "gazetteer": GazetteerBackend,
+    "nominatim": NominatimBackend,
+}
+
+# Backends to consult, in order, e.g. "gazetteer,nominatim" or "nominatim"
+GEOCODER_BACKENDS = os.getenv("GEOCODER_BACKENDS", "gazetteer,nominatim")
+
+_geocoder_backends = None
+
+def register_geocoder_backend(name, backend_class):
+    """Make a GeocoderBackend subclass available to GEOCODER_BACKENDS."""
+    global _geocoder_backends
+    GEOCODER_BACKEND_CLASSES[name] = backend_class
+    _geocoder_backends = None
+
+def get_geocoder_backends():
+    """Return the configured geocoder backends, in lookup order."""
+    global _geocoder_backends
+    if _geocoder_backends is None:
+        backends = []
+        for name in (n.strip() for n in GEOCODER_BACKENDS.split(',')):
+            if name in GEOCODER_BACKEND_CLASSES:
+                backends.append(GEOCODER_BACKEND_CLASSES[name]())
+            elif name:
+                print(f"Warning: Unknown geocoder backend '{name}'")
+        _geocoder_backends = backends
+    return _geocoder_backends
+
+@timed("geocode.many")
+def geocode_many(names, context=None):
+    """Geocode a batch of location names.
+    
+    The names are passed to each configured backend in turn, by default the
+    offline gazetteer first and Nominatim for whatever it couldn't resolve.
+    
+    Returns a list of ``(latitude, longitude)`` tuples or None, in input order.
+    """
+    results = [None] * len(names)
+    pending = [i for i, name in enumerate(names) if name]
+    for backend in get_geocoder_backends():
+        if not pending:
+            break
+        found = backend.geocode_many([names[i] for i in pending], context=context)
+        for i, coords in zip(pending, found):
+            results[i] = coords
+        pending = [i for i in pending if results[i] is None]
+    return results
+
+@timed("geocode.many")
+async def ageocode_many(names, context=None):
+    """Async counterpart of ``geocode_many``, consulting the same backends."""
+    results = [None] * len(names)
+    pending = [i for i, name in enumerate(names) if name]
+    for backend in get_geocoder_backends():
+        if not pending:
+            break
+        found = await backend.ageocode_many([names[i] for i in pending], context=context)
+        for i, coords in zip(pending, found):
+            results[i] = coords
+        pending = [i for i in pending if results[i] is None]
+    return results
+
+@timed("geocode.get_coordinates")
+def get_coordinates(location_name):
+    """Get latitude and longitude for a location using Geopy.
+    
+    This function attempts to geocode a location name with increased reliability
+    by using several strategies if initial geocoding fails. Results are cached
+    by normalized name, in memory and on disk; misses are cached for a shorter
+    time so unknown names are not re-queried on every request.
+    """
+    if not location_name:
+        return None
+    return geocode_many([location_name])[0]
+
+@timed("geocode.get_coordinates")
+async def aget_coordinates(location_name):
+    """Async counterpart of ``get_coordinates``."""
+    if not location_name:
+        return None
+    return (await ageocode_many([location_name]))[0]
+
+# Common words that aren't places
+NON_PLACE_WORDS = frozenset([
+    "the", "your", "this", "that", "these", "those",
+    "then", "there", "here", "where", "what", "when",
+    "breakfast", "lunch", "dinner", "brunch", "day",
+    "morning", "afternoon", "evening", "night", "noon",
+])
+
+PlaceMatch = namedtuple('PlaceMatch', ['name', 'start', 'end', 'match_type', 'confidence'])
+
+# A capitalized name of up to seven words, e.g. "Louvre Museum" or "Jardin du Luxembourg"
+_WORD = r"(?:(?:St|Mt|Ste)\.|(?:[a-z]{1,2}['’])?[A-ZÀ-Þ][\w'’&-]*)"
+_CONNECTOR = r"(?:of|the|de|la|le|du|des|di|del|da|&|y|van|von)"
+_NAME = rf"{_WORD}(?:[ \t]+(?:{_CONNECTOR}[ \t]+)?{_WORD}){{0,6}}"
+_LANDMARK = (
+    r"(?:Museum|Temple|Cathedral|Church|Basilica|Abbey|Palace|Castle|Fort|Park|Gardens?|"
+    r"Monument|Square|Plaza|Tower|Bridge|Market|Gallery|Beach|Shrine|Restaurant|Café|Cafe|"
+    r"Bistro|Eatery|Diner|Hotel|Resort|Inn|Suites|B&B)"
+)
+_RATING = r"\d(?:\.\d)?[ \t]*(?:/[ \t]*\d+|stars?\b|★)"
+
+# Match types in priority order as (name, pattern, confidence). Every pattern
+# stays within a single line so the combined scan is linear in the text size.
+_PLACE_PATTERNS = [
+    ('action', rf"\b(?:Visit|Explore|Check out|Go to|See|Head to|Stop by|Enjoy|Experience)[ \t]+(?:the[ \t]+)?(?P<action_name>{_NAME})", 0.6),
+    ('venue', rf"\b(?:at|to|in)[ \t]+(?:the[ \t]+)?(?P<venue_name>{_NAME})", 0.7),
+    ('time', rf"\b\d{{1,2}}(?::\d{{2}})?[ \t]*(?:AM|PM|am|pm):[ \t]*(?P<time_name>{_NAME})", 0.5),
+    ('bold', r"\*\*(?P<bold_name>[^*\n]{4,100}?)\*\*", 0.9),
+    ('quoted', r'"(?P<quoted_name>[^"\n]{4,100}?)"', 0.7),
+    ('rated', rf"(?P<rated_name>{_NAME})[ \t]*(?:\([ \t]*|-[ \t]*){_RATING}", 0.85),
+    ('landmark', rf"(?P<landmark_name>(?:{_WORD}[ \t]+(?:{_CONNECTOR}[ \t]+)?){{0,5}}{_LANDMARK}\b(?:[ \t]+of[ \t]+{_WORD}(?:[ \t]+{_WORD}){{0,3}})?)", 0.8),
+    ('italic', r"(?<!\*)\*(?P<italic_name>[^*\n]{4,100}?)\*(?!\*)", 0.5),
+]
+_PLACE_REGEX = re.compile('|'.join(f"(?P<{name}>{pattern})" for name, pattern, _ in _PLACE_PATTERNS))
+_PLACE_CONFIDENCE = {name: confidence for name, _, confidence in _PLACE_PATTERNS}
+_RATING_AFTER = re.compile(rf"(?:\*{{1,2}}|\")?[ \t]*(?:\([ \t]*|-[ \t]*){_RATING}")
+
+def extract_place_spans(itinerary_text, section_starts=None):
+    """Extract candidate places from itinerary text in a single pass.
+    
+    All patterns are precompiled into one regular expression and the text is
+    scanned once. Returns a list of ``PlaceMatch(name, start, end, match_type,
+    confidence)`` in order of first appearance, one per distinct place name
+    (compared case-insensitively) carrying the highest confidence seen for it.
+    A place directly followed by a rating is reported with the rating
+    confidence.
+    
+    ``section_starts`` are the sorted start offsets of sections (e.g. days)
+    that are deduplicated separately, so a place mentioned in two sections
+    is reported once in each.
+    """
+    matches = []
+    seen = {}
+    
+    for match in _PLACE_REGEX.finditer(itinerary_text or ''):
+        match_type = match.lastgroup
+        name_group = f"{match_type}_name"
+        raw = match.group(name_group)
+        place = raw.strip().rstrip('.,;:').strip()
         
-        # Quoted places
-        r'"([\w\s\',-&]+?)"',
+        # Filter out short words and non-place words
+        if len(place) <= 3 or place.lower() in NON_PLACE_WORDS:
+            continue
         
-        # Bold places in markdown
-        r'\*\*([\w\s\',-&]+?)\*\*',
+        confidence = _PLACE_CONFIDENCE[match_type]
+        if confidence < _PLACE_CONFIDENCE['rated'] and _RATING_AFTER.match(itinerary_text, match.end(name_group)):
+            match_type, confidence = 'rated', _PLACE_CONFIDENCE['rated']
         
-        # Places after "at" or "to" or "in"
-        r"(?:at|to|in) the ([\w\s',-&]+?)(?:\.|\,|\s|$)"
-    ]
+        # The name starts after any whitespace the group captured
+        start = match.start(name_group) + len(raw) - len(raw.lstrip())
+        key = place.lower()
+        if section_starts:
+            key = (bisect.bisect_right(section_starts, start), key)
+        index = seen.get(key)
+        if index is None:
+            seen[key] = len(matches)
+            matches.append(PlaceMatch(place, start, start + len(place), match_type, confidence))
+        elif confidence > matches[index].confidence:
+            matches[index] = matches[index]._replace(match_type=match_type, confidence=confidence)
     
-    for pattern in patterns:
-        try:
-            matches = re.finditer(pattern, itinerary_text)
-            for match in matches:
-                place = match.group(1).strip()
-                # Filter out short words and non-place words
-                if len(place) > 3 and not any(word.lower() == place.lower() for word in non_place_words):
-                    # Remove any ending punctuation
-                    place = place.rstrip('.,;:')
-                    places.append(place)
-        except Exception as e:
-            print(f"Error in pattern matching: {e}")
-    
-    # Extract locations that are in quotes or marked in some way
-    quote_patterns = [r'"([^"]+)"', r"'([^']+)'", r"\*\*([^*]+)\*\*", r"\*([^*]+)\*"]
-    for pattern in quote_patterns:
-        try:
-            matches = re.finditer(pattern, itinerary_text)
-            for match in matches:
-                place = match.group(1).strip()
-                if len(place) > 3 and not any(word.lower() == place.lower() for word in non_place_words):
-                    place = place.rstrip('.,;:')
-                    places.append(place)
-        except Exception as e:
-            print(f"Error in quote pattern matching: {e}")
-    
-    # Find locations with ratings pattern
-    ratings_pattern = r'([\w\s\']+)(?:\s*-\s*|\s*\(\s*)(?:\d(?:\.\d)?\s*\/\s*\d|\d(?:\.\d)?\s*stars?|\d(?:\.\d)?★)'
-    try:
-        ratings_matches = re.finditer(ratings_pattern, itinerary_text)
-        for match in ratings_matches:
-            place = match.group(1).strip()
-            if len(place) > 3 and not any(word.lower() == place.lower() for word in non_place_words):
-                place = place.rstrip('.,;:')
-                places.append(place)
-    except Exception as e:
-        print(f"Error in ratings pattern matching: {e}")
+    return matches
+
+@timed("parse.extract_places")
+def extract_places_from_itinerary(itinerary_text):
+    """Extract place names from the itinerary text."""
+    return [match.name for match in extract_place_spans(itinerary_text)]
+
+@timed("parse.extract_places_by_day")
+def extract_places_by_day(itinerary_text):
+    """Extract place names from a whole itinerary, grouped by day number.
     
-    # Look for locations that might be hotels or restaurants
-    hotel_patterns = [r"([\w\s',\-&]+? (?:Hotel|Resort|Inn|Suites|B&B))", r"Stay at ([\w\s',\-&]+?)(?:\.|\,|\s|$)"]
-    restaurant_patterns = [r"([\w\s',\-&]+? (?:Restaurant|Café|Bistro|Eatery|Diner))", r"Eat at ([\w\s',\-&]+?)(?:\.|\,|\s|$)"]
+    The text is scanned once and each place is assigned to the day whose
+    section it appears in, using the same day boundaries as
+    ``parse_itinerary_to_days``. Places are deduplicated within each day, so
+    a place visited on two days is listed under both.
+    """
+    day_sections = _day_sections(itinerary_text)
+    starts = [start for _, start in day_sections]
+    places_by_day = {day_number: [] for day_number, _ in day_sections} or {1: []}
     
-    for pattern in hotel_patterns + restaurant_patterns:
-        try:
-            matches = re.finditer(pattern, itinerary_text)
-            for match in matches:
-                place = match.group(1).strip()
-                if len(place) > 3 and not any(word.lower() == place.lower() for word in non_place_words):
-                    place = place.rstrip('.,;:')
-                    places.append(place)
-        except Exception as e:
-            print(f"Error in hotel/restaurant pattern matching: {e}")
-    
-    # Remove duplicates while preserving order
-    unique_places = []
-    for place in places:
-        if place not in unique_places:
-            unique_places.append(place)
+    for match in extract_place_spans(itinerary_text, starts):
+        index = bisect.bisect_right(starts, match.start) - 1
+        day_number = day_sections[index][0] if index >= 0 else (day_sections[0][0] if day_sections else 1)
+        places_by_day[day_number].append(match.name)
     
-    return unique_places
+    return places_by_day
+
+_DAY_PATTERN = re.compile(r'(?:#{1,3}\s*)?Day\s*(\d+)')
 
+def _day_sections(itinerary_text):
+    """Return ``(day_number, start_position)`` for each day header, in text order."""
+    return [(int(match.group(1)), match.start()) for match in _DAY_PATTERN.finditer(itinerary_text)]
+
+@timed("parse.itinerary_to_days")
 def parse_itinerary_to_days(itinerary_text):
     """Parse the itinerary text into days with activities."""
     days = {}
     
     # Split by markdown day headers or "Day X" patterns
-    day_pattern = r'(?:#{1,3}\s*)?Day\s*(\d+)'
-    day_matches = re.finditer(day_pattern, itinerary_text)
-    
-    day_positions = []
-    for match in day_matches:
-        day_number = int(match.group(1))
-        start_pos = match.start()
-        day_positions.append((day_number, start_pos))
-    
-    # Sort by position in text
-    day_positions.sort(key=lambda x: x[1])
+    day_positions = _day_sections(itinerary_text)
     
     if day_positions:
         # Extract content for each day
@@ -260,6 +562,56 @@ def parse_itinerary_to_days(itinerary_text):
     
     return days
 
+def parse_structured_itinerary(data):
+    """Validate and normalize a structured itinerary returned by the LLM.
+    
+    Expects ``{"days": [{"day_number": int, "slots": [{"time_of_day": str,
+    "activity": str, "place_name": str, "rating": number}]}]}``. Returns the
+    list of days sorted by day number, with stripped strings and ratings of
+    0 (unknown) turned into None. Raises ValueError if the data doesn't match.
+    """
+    if not isinstance(data, dict) or not isinstance(data.get('days'), list) or not data['days']:
+        raise ValueError("Structured itinerary has no days")
+    
+    days = []
+    for day in data['days']:
+        if not isinstance(day, dict) or not isinstance(day.get('slots'), list):
+            raise ValueError(f"Invalid day in structured itinerary: {day!r}")
+        try:
+            day_number = int(day.get('day_number'))
+        except (TypeError, ValueError):
+            raise ValueError(f"Invalid day number: {day.get('day_number')!r}")
+        
+        slots = []
+        for slot in day['slots']:
+            if not isinstance(slot, dict) or not isinstance(slot.get('activity'), str):
+                raise ValueError(f"Invalid slot in day {day_number}: {slot!r}")
+            rating = slot.get('rating')
+            if rating is not None and not isinstance(rating, (int, float)):
+                raise ValueError(f"Invalid rating in day {day_number}: {rating!r}")
+            slots.append({
+                'time_of_day': str(slot.get('time_of_day') or '').strip(),
+                'activity': slot['activity'].strip(),
+                'place_name': str(slot.get('place_name') or '').strip(),
+                'rating': rating or None,
+            })
+        days.append({'day_number': day_number, 'slots': slots})
+    
+    return sorted(days, key=lambda day: day['day_number'])
+
+def render_itinerary_day(day):
+    """Render one structured itinerary day as the Markdown used by the UI."""
+    lines = [f"# Day {day['day_number']}"]
+    for slot in day['slots']:
+        line = f"- {slot['time_of_day']}: " if slot['time_of_day'] else "- "
+        line += slot['activity']
+        if slot['place_name'] and slot['place_name'].lower() not in slot['activity'].lower():
+            line += f" at **{slot['place_name']}**"
+        if slot['rating']:
+            line += f" ({slot['rating']}/5)"
+        lines.append(line)
+    return "\n".join(lines)
+
 def create_map_with_markers(places, destination):
     """Create a folium map with markers for all places."""
     # Try to get coordinates for the destination